@@ -0,0 +1,287 @@
+"""
+Coroutine based counterparts of SeleniumFactory, Wrapper and SauceRest, to drive many remote sessions from a single
+thread: AsyncSeleniumFactory starts sessions, AsyncWrapper sends WebDriver commands and job updates, all as
+coroutines on an event_loop.EventLoop whose sockets wait in one poll() call instead of one thread each.
+
+    loop = EventLoop()
+    factory = AsyncSeleniumFactory(loop)
+
+    def test(index):
+        driver = yield factory.create_web_driver(job_name="test %d" % index)
+        try:
+            yield driver.get("http://example.com/")
+            title = yield driver.title()
+            ...
+            yield driver.job_passed()
+        finally:
+            yield driver.quit()
+
+    loop.run_until_complete([test(i) for i in range(24)])
+"""
+
+import os
+import json
+import time
+import string
+
+import instrumentation
+import sauce_rest
+from event_loop import EventLoop, Return
+from parse_sauce_URL import ParseSauceURL
+from capabilities import compile_capabilities
+from connection_pool import basic_auth
+
+
+class AsyncCommandExecutor:
+    """
+    Sends WebDriver wire protocol commands, by their selenium.webdriver.remote.command.Command names, on the loop.
+    """
+
+    def __init__(self, loop, hub_url):
+        from selenium.webdriver.remote.errorhandler import ErrorHandler
+        from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+        # resolves the host once, and knows the method and path of every command
+        connection = RemoteConnection(hub_url)
+        self.loop = loop
+        self.url = connection._url
+        self.commands = connection._commands
+        self.error_handler = ErrorHandler()
+
+    def execute(self, command, params):
+        """
+        A coroutine that returns the server's response to the command, after raising the selenium exception for an
+        error status.
+        """
+        import urlparse
+        from selenium.webdriver.remote import utils
+        from command_executor import parse_response
+
+        method, path = self.commands[command]
+        url = self.url + string.Template(path).substitute(params)
+        body = utils.dump_json(params) if method in ('POST', 'PUT') else None
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json;charset=UTF-8'}
+        while True:
+            response = yield self.loop.http.request(method, url, body, headers)
+            if not 300 <= response.status < 304:
+                break
+            method, url, body = 'GET', urlparse.urljoin(url, response.getheader('location')), None
+
+        result = parse_response(response.status, response.getheader('content-type'), response.data)
+        self.error_handler.check_response(result)
+        raise Return(result)
+
+
+class AsyncSauceRest:
+    def __init__(self, user, key, loop):
+        self.user = user
+        self.key = key
+        self.loop = loop
+
+    def build_url(self, version, suffix):
+        return sauce_rest.url % (version, self.user, suffix)
+
+    def update(self, job_id, attributes):
+        """
+        A coroutine that updates a Sauce Job with the data contained in the attributes dict
+        """
+        return self.invoke('PUT', self.build_url("v1", "jobs/" + job_id), json.dumps(attributes),
+                           {'content-type': 'application/json'})
+
+    def get(self, job_id):
+        """
+        A coroutine that retrieves the details for a Sauce job in JSON format
+        """
+        return self.invoke('GET', self.build_url("v1", "jobs/" + job_id))
+
+    def invoke(self, method, the_url, data=None, headers=None):
+        """
+        A coroutine that returns the response body.  Raises urllib2.HTTPError for error responses, like SauceRest.
+        """
+        headers = dict(headers or {})
+        headers['Authorization'] = basic_auth(self.user, self.key)
+        start = time.time()
+        response = yield self.loop.http.request(method, the_url, data, headers)
+        if instrumentation.enabled:
+            instrumentation.observe(instrumentation.SAUCE_REST, method, start)
+        if response.status >= 400:
+            raise sauce_rest.http_error(the_url, response.status, response.reason, response.headers, response.data)
+        raise Return(response.data)
+
+
+class AsyncElement:
+    def __init__(self, wrapper, id):
+        self.wrapper = wrapper
+        self.id = id
+
+    def execute(self, command, params=None):
+        return self.wrapper.execute(command, dict(params or {}, id=self.id))
+
+    def click(self):
+        return self.execute('clickElement')
+
+    def text(self):
+        return self.execute('getElementText')
+
+    def send_keys(self, text):
+        return self.execute('sendKeysToElement', {'value': list(text)})
+
+    def get_attribute(self, name):
+        return self.execute('getElementAttribute', {'name': name})
+
+    def find_element(self, by, value):
+        return self.execute('findChildElement', {'using': by, 'value': value})
+
+    def find_elements(self, by, value):
+        return self.execute('findChildElements', {'using': by, 'value': value})
+
+
+class AsyncWrapper:
+    """
+    A remote session driven by coroutines: every method returns a coroutine for the caller to yield.
+    """
+
+    def __init__(self, loop, executor, session_id, capabilities, parse, job_name=None, requested_capabilities=None):
+        self.loop = loop
+        self.executor = executor
+        self.session_id = session_id
+        self.capabilities = capabilities
+        self.parse = parse
+        self.requested_capabilities = requested_capabilities or {}
+        self.username = parse.get_user_name()
+        self.accessKey = parse.get_access_key()
+        self.jobName = job_name if job_name is not None else parse.get_job_name()
+        self.sauce_rest = AsyncSauceRest(self.username, self.accessKey, loop)
+
+    def id(self):
+        return self.session_id
+
+    def dump_session_id(self):
+        print "\rSauceOnDemandSessionID=%s job-name=%s" % (self.id(), self.jobName)
+
+    def execute(self, command, params=None):
+        """
+        A coroutine that sends a WebDriver command and returns its value, with elements as AsyncElements.
+        """
+        params = self._wrap(dict(params or {}, sessionId=self.session_id))
+        start = time.time()
+        response = yield self.executor.execute(command, params)
+        if instrumentation.enabled:
+            instrumentation.observe(instrumentation.WEBDRIVER, command, start)
+        raise Return(self._unwrap(response.get('value')))
+
+    def get(self, url):
+        return self.execute('get', {'url': url})
+
+    def title(self):
+        return self.execute('getTitle')
+
+    def current_url(self):
+        return self.execute('getCurrentUrl')
+
+    def execute_script(self, script, *args):
+        return self.execute('executeScript', {'script': script, 'args': list(args)})
+
+    def execute_async_script(self, script, *args):
+        return self.execute('executeAsyncScript', {'script': script, 'args': list(args)})
+
+    def find_element(self, by, value):
+        return self.execute('findElement', {'using': by, 'value': value})
+
+    def find_elements(self, by, value):
+        return self.execute('findElements', {'using': by, 'value': value})
+
+    def get_screenshot_as_base64(self):
+        return self.execute('screenshot')
+
+    def quit(self):
+        return self.execute('quit')
+
+    def set_build_number(self, build_number):
+        return self.update_job({'build': build_number})
+
+    def set_tags(self, tags):
+        return self.update_job({'tags': tags})
+
+    def set_custom_data(self, custom_data):
+        return self.update_job({'custom-data': custom_data})
+
+    def set_job_name(self, job_name):
+        self.jobName = job_name
+        return self.update_job({'name': job_name})
+
+    def job_passed(self):
+        return self.update_job({'passed': True})
+
+    def job_failed(self):
+        return self.update_job({'passed': False})
+
+    def update_job(self, attributes):
+        return self.sauce_rest.update(self.id(), attributes)
+
+    def _wrap(self, value):
+        if isinstance(value, AsyncElement):
+            return {'ELEMENT': value.id}
+        if isinstance(value, dict):
+            return dict((key, self._wrap(item)) for key, item in value.items())
+        if isinstance(value, list):
+            return [self._wrap(item) for item in value]
+        return value
+
+    def _unwrap(self, value):
+        if isinstance(value, dict) and 'ELEMENT' in value:
+            return AsyncElement(self, value['ELEMENT'])
+        if isinstance(value, list):
+            return [self._unwrap(item) for item in value]
+        return value
+
+
+class AsyncSeleniumFactory:
+    def __init__(self, loop=None):
+        self.loop = loop if loop is not None else EventLoop()
+        self._executors = {}
+
+    def create_web_driver(self, job_name=None, show_session_id=False):
+        """
+         A coroutine like SeleniumFactory.create_web_driver, for remote sessions only: starts a session for the
+         'SELENIUM_DRIVER' environment variable, loads 'SELENIUM_STARTING_URL' and returns an AsyncWrapper.
+        """
+        if 'SELENIUM_DRIVER' not in os.environ:
+            raise EnvironmentError("AsyncSeleniumFactory needs the 'SELENIUM_DRIVER' environment variable")
+        starting_url = os.environ.get('SELENIUM_STARTING_URL', "http://saucelabs.com")
+
+        wrapper = yield self.start_remote_web_driver(ParseSauceURL(os.environ["SELENIUM_DRIVER"]), job_name=job_name)
+        if show_session_id:
+            wrapper.dump_session_id()
+        yield wrapper.get(starting_url)
+        raise Return(wrapper)
+
+    def start_remote_web_driver(self, parse, job_name=None):
+        """
+         A coroutine that starts a new remote session for the given ParseSauceURL and returns it wrapped, without
+         loading the starting url.
+        """
+        SELENIUM_HOST = os.environ.get('SELENIUM_HOST', 'ondemand.saucelabs.com')
+        SELENIUM_PORT = os.environ.get('SELENIUM_PORT', '80')
+
+        profile = compile_capabilities(parse.url)
+        if job_name is not None:
+            desired_capabilities = profile.capabilities(name=job_name)
+        else:
+            desired_capabilities = profile.capabilities()
+
+        hub_url = "http://%s:%s@%s:%s/wd/hub" % (parse.get_user_name(),
+                                                 parse.get_access_key(),
+                                                 SELENIUM_HOST,
+                                                 SELENIUM_PORT)
+        executor = self._executors.get(hub_url)
+        if executor is None:
+            executor = self._executors[hub_url] = AsyncCommandExecutor(self.loop, hub_url)
+
+        start = time.time()
+        response = yield executor.execute('newSession', {'desiredCapabilities': desired_capabilities})
+        if instrumentation.enabled:
+            instrumentation.observe(instrumentation.SESSION, 'start', start)
+
+        raise Return(AsyncWrapper(self.loop, executor, response['sessionId'], response['value'], parse,
+                                  job_name=job_name, requested_capabilities=desired_capabilities))
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import threading
+import unittest
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import sauce_rest
+from event_loop import EventLoop, Return
+from async_factory import AsyncSeleniumFactory, AsyncElement
+
+DRIVER_URL = 'sauce-ondemand:?username=user&access-key=key&os=Linux&browser=firefox&browser-version=30'
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Just enough of a WebDriver hub and of the Sauce REST API, answering after 'delay' seconds.
+    """
+    protocol_version = 'HTTP/1.1'
+    delay = 0.2
+    lock = threading.Lock()
+    sessions = 0
+    connections = set()
+    updates = []
+
+    def do_GET(self):
+        self.handle_command(None)
+
+    def do_POST(self):
+        self.handle_command(json.loads(self.rfile.read(int(self.headers.getheader('content-length')))))
+
+    def do_DELETE(self):
+        self.handle_command(None)
+
+    def do_PUT(self):
+        body = json.loads(self.rfile.read(int(self.headers.getheader('content-length'))))
+        with Handler.lock:
+            Handler.updates.append((self.path, body))
+        self.respond(200, '{}')
+
+    def handle_command(self, params):
+        time.sleep(Handler.delay)
+        with Handler.lock:
+            Handler.connections.add(self.client_address)
+            if self.path == '/wd/hub/session':
+                Handler.sessions += 1
+                session_id = 'session%d' % Handler.sessions
+                return self.respond(303, '', {'Location': '/wd/hub/session/' + session_id})
+        path = self.path.split('/')[5:]
+        if path == []:
+            value = {'browserName': 'firefox'}
+        elif path == ['title']:
+            value = 'Title of ' + self.path.split('/')[4]
+        elif path == ['element']:
+            if params['value'] == 'missing':
+                return self.respond(500, json.dumps({'status': 7, 'value': {'message': 'no such element'}}))
+            value = {'ELEMENT': params['value']}
+        elif path == ['element', 'main', 'text']:
+            value = 'text of main'
+        else:
+            value = None
+        self.respond(200, json.dumps({'status': 0, 'sessionId': self.path.split('/')[4], 'value': value}))
+
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestAsyncSeleniumFactory(unittest.TestCase):
+    def setUp(self):
+        Handler.sessions = 0
+        Handler.connections = set()
+        Handler.updates = []
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.environ = dict(os.environ)
+        os.environ.update({'SELENIUM_DRIVER': DRIVER_URL, 'SELENIUM_HOST': '127.0.0.1',
+                           'SELENIUM_PORT': str(self.server.server_port),
+                           'SELENIUM_STARTING_URL': 'http://example.com/'})
+        self.url = sauce_rest.url
+        sauce_rest.url = 'http://127.0.0.1:%d' % self.server.server_port + '/rest/%s/%s/%s'
+        self.loop = EventLoop(pool_size=16)
+        self.factory = AsyncSeleniumFactory(self.loop)
+
+    def tearDown(self):
+        self.loop.http.close()
+        sauce_rest.url = self.url
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_test(self, index):
+        driver = yield self.factory.create_web_driver(job_name='test %d' % index)
+        try:
+            title = yield driver.title()
+            element = yield driver.find_element('id', 'main')
+            text = yield element.text()
+            yield driver.job_passed()
+        finally:
+            yield driver.quit()
+        raise Return((driver.id(), title, text))
+
+    def test_sessions_run_concurrently_on_one_thread(self):
+        count = 12
+        start = time.time()
+        results = self.loop.run_until_complete([self.run_test(i) for i in range(count)])
+        # five hub round trips of 0.2s per session, overlapping
+        self.assertTrue(time.time() - start < 3, time.time() - start)
+        self.assertEqual(count, len(set(session_id for session_id, _, _ in results)))
+        for session_id, title, text in results:
+            self.assertEqual('Title of ' + session_id, title)
+            self.assertEqual('text of main', text)
+        self.assertEqual(count, len(Handler.updates))
+        self.assertEqual({'passed': True}, Handler.updates[0][1])
+        # keep-alive connections are reused across sessions
+        self.assertTrue(len(Handler.connections) <= 16, len(Handler.connections))
+
+    def test_errors_are_raised_in_the_coroutine(self):
+        from selenium.common.exceptions import NoSuchElementException
+
+        def find_missing():
+            driver = yield self.factory.create_web_driver()
+            try:
+                yield driver.find_element('id', 'missing')
+            except NoSuchElementException:
+                element = yield driver.find_element('id', 'main')
+                raise Return(element)
+
+        element = self.loop.run_until_complete(find_missing())
+        self.assertTrue(isinstance(element, AsyncElement))
+        self.assertEqual('main', element.id)
+
+
+if __name__ == "__main__":
+    unittest.main()
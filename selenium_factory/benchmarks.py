@@ -0,0 +1,278 @@
+"""
+Offline benchmarks of the factory's own overhead, run against a stub_server instead of Sauce:
+
+    session_create          SeleniumFactory.create_web_drivers, per session
+    wrapper_delegation      what a call through Wrapper adds to the same call on the driver
+    webdriver_command       a WebDriver command through Wrapper, round trip to the stub
+    sauce_rest_update       SauceRest.update, one after another
+    sauce_rest_concurrent   SauceRest.update from several threads, per update
+    parse_sauce_url         ParseSauceURL of a new url
+    parse_sauce_url_cached  ParseSauceURL of a url seen before
+    import_<module>         importing a module in a fresh interpreter
+
+Every result is in seconds per operation, so lower is better.  Results can be saved as JSON and later runs compared
+against them, failing when a benchmark got slower by more than the tolerance:
+
+    python -m selenium_factory.benchmarks --save baseline.json
+    python -m selenium_factory.benchmarks --baseline baseline.json --tolerance 0.5
+"""
+
+import os
+import sys
+import json
+import timeit
+import subprocess
+
+from stub_server import StubServer, DRIVER_URL
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules a test worker imports on startup
+WORKER_MODULES = ('selenium_factory.selenium_factory', 'selenium_factory.session_pool',
+                  'selenium_factory.capabilities', 'selenium_factory.sauce_rest')
+
+IMPORT_PROBE = """
+import sys, time, json
+start = time.time()
+__import__(sys.argv[1])
+elapsed = time.time() - start
+print json.dumps({'elapsed': elapsed, 'modules': [name for name, module in sys.modules.items() if module]})
+"""
+
+# seconds per operation below which differences are timer noise
+MIN_SECONDS = 1e-7
+
+# operations per benchmark; quick runs, for tests, do a tenth of them
+ITERATIONS = {
+    'session_create': 32,
+    'wrapper_delegation': 100000,
+    'webdriver_command': 500,
+    'sauce_rest_update': 500,
+    'sauce_rest_concurrent': 1000,
+    'parse_sauce_url': 20000,
+    'parse_sauce_url_cached': 100000,
+    'import': 5,
+}
+
+
+def measure_import(module, runs=3):
+    """
+    Imports the module in fresh interpreters and returns the best import time and the modules it loaded.
+    """
+    best = None
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_PROBE, module], cwd=PACKAGE_ROOT)
+        result = json.loads(output)
+        if best is None or result['elapsed'] < best['elapsed']:
+            best = result
+    return best['elapsed'], best['modules']
+
+
+def _per_operation(function, operations, repeat=3):
+    # best of 'repeat' runs, the least disturbed by the rest of the machine
+    return min(timeit.Timer(function).repeat(repeat, 1)) / operations
+
+
+class _LocalDriver:
+    """
+    A driver that answers without any I/O, to time what the Wrapper itself costs.
+    """
+    session_id = 'local'
+
+    def execute_script(self, script, *args):
+        return None
+
+
+def bench_session_create(server, count):
+    from selenium_factory import SeleniumFactory
+
+    factory = SeleniumFactory()
+    drivers = []
+
+    def create():
+        for result in factory.create_web_drivers(count, max_workers=8):
+            if not result.ok:
+                raise result.error
+            drivers.append(result.driver)
+
+    try:
+        return _per_operation(create, count, repeat=1)
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+
+def bench_wrapper_delegation(iterations):
+    from selenium_factory import Wrapper
+    from parse_sauce_URL import ParseSauceURL
+
+    driver = _LocalDriver()
+    wrapper = Wrapper(driver, ParseSauceURL(DRIVER_URL))
+
+    def direct():
+        for _ in xrange(iterations):
+            driver.execute_script('return 1')
+
+    def wrapped():
+        for _ in xrange(iterations):
+            wrapper.execute_script('return 1')
+
+    return max(0.0, _per_operation(wrapped, iterations) - _per_operation(direct, iterations))
+
+
+def bench_webdriver_command(server, iterations):
+    from selenium_factory import SeleniumFactory
+
+    driver = SeleniumFactory().create_web_driver()
+
+    def commands():
+        for _ in xrange(iterations):
+            driver.title
+
+    try:
+        return _per_operation(commands, iterations)
+    finally:
+        driver.quit()
+
+
+def bench_sauce_rest_update(server, iterations, workers=1):
+    from multiprocessing.pool import ThreadPool
+    from selenium_factory import SeleniumFactory
+    from sauce_rest import SauceRest
+
+    driver = SeleniumFactory().create_web_driver()
+    rest = SauceRest(driver.username, driver.accessKey)
+    job_id = driver.id()
+
+    def update(i):
+        rest.update(job_id, {'custom-data': {'iteration': i}})
+
+    def updates():
+        if workers == 1:
+            for i in xrange(iterations):
+                update(i)
+            return
+        pool = ThreadPool(workers)
+        try:
+            pool.map(update, xrange(iterations))
+        finally:
+            pool.close()
+            pool.join()
+
+    try:
+        return _per_operation(updates, iterations)
+    finally:
+        driver.quit()
+
+
+def bench_parse_sauce_url(iterations, cached):
+    import parse_sauce_URL
+    from parse_sauce_URL import ParseSauceURL
+
+    best = None
+    for run in range(3):
+        if cached:
+            urls = [DRIVER_URL] * iterations
+            ParseSauceURL(DRIVER_URL)
+        else:
+            # parsed urls are interned, every run needs new ones
+            urls = [DRIVER_URL + '&job-name=run%d%%20job%d' % (run, i) for i in xrange(iterations)]
+        start = timeit.default_timer()
+        for url in urls:
+            ParseSauceURL(url)
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+        if not cached:
+            with parse_sauce_URL._parsed_lock:
+                for url in urls:
+                    parse_sauce_URL._parsed.pop(url, None)
+    return best / iterations
+
+
+def run_benchmarks(latency=0.0, session_latency=None, quick=False, imports=True):
+    """
+    Runs every benchmark against a new StubServer with the given latencies and returns a dict of benchmark name ->
+    seconds per operation.
+    """
+    iterations = dict((name, max(1, count // 10 if quick else count)) for name, count in ITERATIONS.items())
+    results = {}
+    server = StubServer(latency=latency, session_latency=session_latency).start()
+    try:
+        with server.installed():
+            results['session_create'] = bench_session_create(server, iterations['session_create'])
+            results['webdriver_command'] = bench_webdriver_command(server, iterations['webdriver_command'])
+            results['sauce_rest_update'] = bench_sauce_rest_update(server, iterations['sauce_rest_update'])
+            results['sauce_rest_concurrent'] = bench_sauce_rest_update(server, iterations['sauce_rest_concurrent'],
+                                                                       workers=8)
+    finally:
+        server.stop()
+
+    results['wrapper_delegation'] = bench_wrapper_delegation(iterations['wrapper_delegation'])
+    results['parse_sauce_url'] = bench_parse_sauce_url(iterations['parse_sauce_url'], cached=False)
+    results['parse_sauce_url_cached'] = bench_parse_sauce_url(iterations['parse_sauce_url_cached'], cached=True)
+    if imports:
+        for module in WORKER_MODULES:
+            results['import_' + module.split('.')[-1]] = measure_import(module, runs=iterations['import'])[0]
+    return results
+
+
+def regressions(results, baseline, tolerance=0.5):
+    """
+    Returns a message for every benchmark of the baseline that is more than 'tolerance' (a fraction) slower in the
+    results.
+    """
+    messages = []
+    for name in sorted(baseline):
+        # a baseline below the timer noise, such as a wrapper_delegation of 0, is compared as MIN_SECONDS
+        expected = max(baseline[name], MIN_SECONDS)
+        if name in results and results[name] > expected * (1 + tolerance):
+            messages.append("%s: %s per operation, baseline %s%s (+%.0f%%)" % (
+                name, _format(results[name]), '' if baseline[name] >= MIN_SECONDS else '< ', _format(expected),
+                100.0 * (results[name] / expected - 1)))
+    return messages
+
+
+def _format(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '%.2f%s' % (seconds * scale, unit)
+    return '%.3fus' % (seconds * 1e6)
+
+
+def report(results):
+    lines = []
+    for name in sorted(results):
+        seconds = results[name]
+        rate = ('%12.0f/s' % (1 / seconds)) if seconds and not name.startswith('import_') else ''
+        lines.append("%-28s %12s %14s" % (name, _format(seconds), rate))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('--latency', type='float', default=0.0, help="seconds the stub waits before every response")
+    parser.add_option('--session-latency', type='float', help="seconds the stub waits before new sessions")
+    parser.add_option('--quick', action='store_true', help="a tenth of the iterations")
+    parser.add_option('--save', metavar='FILE', help="write the results as JSON")
+    parser.add_option('--baseline', metavar='FILE', help="fail on regressions against saved results")
+    parser.add_option('--tolerance', type='float', default=0.5, help="slowdown allowed, default 0.5 (50%)")
+    options, _ = parser.parse_args(argv)
+
+    results = run_benchmarks(options.latency, options.session_latency, quick=options.quick)
+    print report(results)
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as f:
+            slower = regressions(results, json.load(f), options.tolerance)
+        for message in slower:
+            print "REGRESSION %s" % message
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
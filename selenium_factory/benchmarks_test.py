@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import unittest
+
+from stub_server import StubServer
+from benchmarks import run_benchmarks, regressions, ITERATIONS
+
+# results saved by 'python -m selenium_factory.benchmarks --save', to fail on regressions against
+BENCHMARK_BASELINE = os.environ.get('BENCHMARK_BASELINE')
+BENCHMARK_TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', '0.5'))
+
+
+class TestStubServer(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_session(self):
+        from selenium.common.exceptions import NoSuchElementException
+        from selenium_factory import SeleniumFactory
+        from sauce_rest import SauceRest
+
+        with self.server.installed():
+            driver = SeleniumFactory().create_web_driver(job_name='stub test')
+            self.assertEqual(self.server.url + '/start', driver.current_url)
+            self.assertEqual('Stub page %s/start' % self.server.url, driver.title)
+            self.assertEqual('Text of element 1', driver.find_element_by_id('main').text)
+            self.assertRaises(NoSuchElementException, driver.find_element_by_id, 'missing')
+
+            driver.set_build_number('42')
+            driver.job_passed()
+            driver.flush()
+            job = json.loads(SauceRest(driver.username, driver.accessKey).get(driver.id()))
+            self.assertEqual(('stub test', '42', True, 'in progress'),
+                             (job['name'], job['build'], job['passed'], job['status']))
+            driver.quit()
+
+        self.assertEqual('complete', self.server.jobs[driver.id()]['status'])
+        self.assertEqual({}, self.server.sessions)
+
+    def test_latency(self):
+        from selenium_factory import SeleniumFactory
+
+        self.server.latency = 0.05
+        with self.server.installed():
+            driver = SeleniumFactory().create_web_driver()
+            start = time.time()
+            driver.title
+            self.assertTrue(time.time() - start >= 0.05)
+            driver.quit()
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run_benchmarks(self):
+        results = run_benchmarks(quick=True, imports=False)
+        self.assertEqual(set(ITERATIONS) - set(['import']), set(results))
+        for name, seconds in results.items():
+            self.assertTrue(seconds >= 0, name)
+        self.assertTrue(results['parse_sauce_url_cached'] < results['parse_sauce_url'])
+
+        if BENCHMARK_BASELINE:
+            with open(BENCHMARK_BASELINE) as f:
+                slower = regressions(results, json.load(f), BENCHMARK_TOLERANCE)
+            self.assertEqual([], slower, '\n'.join(slower))
+
+    def test_regressions(self):
+        baseline = {'webdriver_command': 0.001, 'parse_sauce_url': 0.00002, 'gone': 1.0}
+        results = {'webdriver_command': 0.0016, 'parse_sauce_url': 0.000025}
+        self.assertEqual(['webdriver_command: 1.60ms per operation, baseline 1.00ms (+60%)'],
+                         regressions(results, baseline, tolerance=0.5))
+        self.assertEqual([], regressions(results, baseline, tolerance=0.75))
+
+        # wrapper_delegation can measure 0
+        self.assertEqual([], regressions({'wrapper_delegation': 1e-7}, {'wrapper_delegation': 0.0}))
+        self.assertEqual(['wrapper_delegation: 2.00us per operation, baseline < 0.100us (+1900%)'],
+                         regressions({'wrapper_delegation': 2e-6}, {'wrapper_delegation': 0.0}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,275 @@
+"""
+Runs a test suite across every browser of the 'SAUCE_ONDEMAND_BROWSERS' matrix set by the Jenkins/Bamboo plugins,
+with one worker process per browser/OS combination, and merges the results into one report.
+
+Each worker gets 'SELENIUM_DRIVER' (and the single browser variables the plugins set) pointing at its browser, so
+the tests keep using SeleniumFactory unchanged.  '--shards N' splits each browser's tests across N sessions of about
+equal duration (see durations); the duration of every unittest test is then recorded in the duration history, as it
+is whenever 'SELENIUM_DURATION_HISTORY' names one.
+
+    python -m selenium_factory.browser_matrix tests.test_login tests.test_checkout
+    python -m selenium_factory.browser_matrix --shards 4 tests.test_login tests.test_checkout
+    python -m selenium_factory.browser_matrix --pytest tests/
+"""
+
+import os
+import sys
+import json
+import time
+import urllib
+
+from parse_sauce_URL import ParseSauceURL
+
+
+def parse_browsers(value=None):
+    """
+    Parses the 'SAUCE_ONDEMAND_BROWSERS' json into a list of ParseSauceURL, one per browser/OS combination.  Entries
+    without a 'url' are completed with the 'SAUCE_USER_NAME'/'SAUCE_API_KEY' credentials, and urls without a platform
+    get the one of their entry.
+    """
+    if value is None:
+        value = os.environ.get('SAUCE_ONDEMAND_BROWSERS')
+    if not value:
+        return []
+
+    browsers = []
+    for entry in json.loads(value):
+        driver_url = entry.get('url')
+        if not driver_url:
+            fields = [('username', os.environ.get('SAUCE_USER_NAME', '')),
+                      ('access-key', os.environ.get('SAUCE_API_KEY', '')),
+                      ('os', entry.get('os', '')),
+                      ('browser', entry.get('browser', '')),
+                      ('browser-version', entry.get('browser-version', ''))]
+            if entry.get('platform'):
+                fields.append(('platform', entry['platform']))
+            driver_url = 'sauce-ondemand:?' + '&'.join('%s=%s' % (key, urllib.quote(str(field), safe=' '))
+                                                       for key, field in fields)
+        elif entry.get('platform') and not ParseSauceURL(driver_url).get_platform():
+            driver_url += '&platform=%s' % urllib.quote(str(entry['platform']), safe=' ')
+        browsers.append(ParseSauceURL(driver_url))
+    return browsers
+
+
+def browser_label(parse):
+    return ' '.join(part for part in (parse.get_browser(), parse.get_browser_version(), parse.get_os()) if part)
+
+
+def _browser_environment(parse):
+    environment = {'SELENIUM_DRIVER': parse.url,
+                   'SELENIUM_BROWSER': parse.get_browser(),
+                   'SELENIUM_VERSION': parse.get_browser_version()}
+    # the OS is not a platform: without one, capabilities maps the OS instead (see _set_browser_environment)
+    if parse.get_platform():
+        environment['SELENIUM_PLATFORM'] = parse.get_platform()
+    return environment
+
+
+def _set_browser_environment(parse):
+    environment = _browser_environment(parse)
+    os.environ.update(environment)
+    if 'SELENIUM_PLATFORM' not in environment:
+        # inherited from the parent, it is the platform of another browser
+        os.environ.pop('SELENIUM_PLATFORM', None)
+
+
+def _run_unittest(args):
+    driver_url, test_names, record = args
+    import unittest
+    from StringIO import StringIO
+    import durations
+
+    class TimingResult(unittest.TextTestResult):
+        def __init__(self, *args, **kwargs):
+            super(TimingResult, self).__init__(*args, **kwargs)
+            self.timings = []
+
+        def startTest(self, test):
+            self.started = time.time()
+            durations.start_test(test.id())
+            super(TimingResult, self).startTest(test)
+
+        def stopTest(self, test):
+            super(TimingResult, self).stopTest(test)
+            # with the jobs of the sessions the test started
+            self.timings.append((test.id(), time.time() - self.started, durations.stop_test()))
+
+    parse = ParseSauceURL(driver_url)
+    _set_browser_environment(parse)
+    stream = StringIO()
+    start = time.time()
+    suite = unittest.TestLoader().loadTestsFromNames(test_names)
+    result = unittest.TextTestRunner(stream=stream, verbosity=1, resultclass=TimingResult).run(suite)
+    duration = time.time() - start
+
+    failed = set(test.id() for test, trace in result.failures + result.errors)
+    skipped = set(test.id() for test, reason in getattr(result, 'skipped', []))
+    if record:
+        try:
+            durations.get_duration_history().record_many(
+                [(test_id, test_duration, job_ids, test_id not in failed)
+                 for test_id, test_duration, job_ids in result.timings if test_id not in skipped],
+                browser=browser_label(parse))
+        except Exception, e:
+            # the results matter more than the history
+            stream.write("Could not record the test durations: %s\n" % e)
+
+    return {'browser': browser_label(parse),
+            'tests_run': result.testsRun,
+            'failures': [(test.id(), trace) for test, trace in result.failures],
+            'errors': [(test.id(), trace) for test, trace in result.errors],
+            'skipped': len(skipped),
+            'duration': duration,
+            'output': stream.getvalue()}
+
+
+def _run_pytest(args):
+    driver_url, pytest_args, _ = args
+    import tempfile
+    import pytest
+    from xml.etree import ElementTree
+
+    parse = ParseSauceURL(driver_url)
+    _set_browser_environment(parse)
+    handle, junit_xml = tempfile.mkstemp(suffix='.xml')
+    os.close(handle)
+    start = time.time()
+    try:
+        pytest.main(list(pytest_args) + ['-q', '--junitxml=%s' % junit_xml])
+        tree = ElementTree.parse(junit_xml)
+    finally:
+        os.remove(junit_xml)
+
+    summary = {'browser': browser_label(parse), 'tests_run': 0, 'failures': [], 'errors': [], 'skipped': 0,
+               'duration': time.time() - start, 'output': ''}
+    for case in tree.iter('testcase'):
+        summary['tests_run'] += 1
+        test_id = '%s.%s' % (case.get('classname'), case.get('name'))
+        for kind, key in (('failure', 'failures'), ('error', 'errors')):
+            for element in case.findall(kind):
+                summary[key].append((test_id, element.text or element.get('message', '')))
+        summary['skipped'] += len(case.findall('skipped'))
+    return summary
+
+
+def test_ids(test_names):
+    """
+    Expands unittest names (modules, classes or methods) into the ids of their single tests.
+    """
+    import unittest
+
+    def expand(suite):
+        for test in suite:
+            if isinstance(test, unittest.TestSuite):
+                for test_id in expand(test):
+                    yield test_id
+            else:
+                yield test.id()
+
+    return list(expand(unittest.TestLoader().loadTestsFromNames(test_names)))
+
+
+def _merge(results):
+    # the results of the shards of one browser; they ran side by side
+    merged = {'browser': results[0]['browser'], 'tests_run': 0, 'failures': [], 'errors': [], 'skipped': 0,
+              'duration': max(result['duration'] for result in results), 'output': '',
+              'shards': [result['duration'] for result in results]}
+    for result in results:
+        merged['tests_run'] += result['tests_run']
+        merged['failures'] += result['failures']
+        merged['errors'] += result['errors']
+        merged['skipped'] += result['skipped']
+        merged['output'] += result['output']
+    return merged
+
+
+class MatrixResult:
+    def __init__(self, results):
+        self.results = results
+
+    def was_successful(self):
+        return all(not result['failures'] and not result['errors'] for result in self.results)
+
+    def report(self):
+        lines = []
+        for result in self.results:
+            status = 'OK' if not result['failures'] and not result['errors'] else 'FAILED'
+            lines.append("%-40s %s  (%d tests, %d failures, %d errors, %d skipped in %.1fs)" % (
+                result['browser'], status, result['tests_run'], len(result['failures']), len(result['errors']),
+                result['skipped'], result['duration']))
+            if len(result.get('shards', ())) > 1:
+                lines.append("%-40s shards: %s" % ('', ' '.join('%.1fs' % shard for shard in result['shards'])))
+        for result in self.results:
+            for kind in ('failures', 'errors'):
+                for test_id, trace in result[kind]:
+                    lines.append('=' * 70)
+                    lines.append("%s: %s [%s]" % (kind[:-1].upper(), test_id, result['browser']))
+                    lines.append('-' * 70)
+                    lines.append(trace.rstrip())
+        return '\n'.join(lines)
+
+
+def run_matrix(tests, browsers=None, processes=None, use_pytest=False, shards=1):
+    """
+    Runs the tests (unittest names, or pytest arguments with use_pytest) once per browser of the matrix on a process
+    pool, one process per browser unless 'processes' is given, and returns the merged MatrixResult.  With 'shards',
+    the unittest tests of each browser are split across that many processes by their recorded durations.  Durations
+    are recorded only then, or when 'SELENIUM_DURATION_HISTORY' is set, so plain runs leave no database behind.
+    """
+    from multiprocessing import Pool
+
+    if browsers is None:
+        browsers = parse_browsers()
+    if not browsers:
+        raise ValueError("No browsers to run on, set 'SAUCE_ONDEMAND_BROWSERS'")
+
+    if shards > 1:
+        if use_pytest:
+            raise ValueError("Sharding needs unittest test names")
+        from durations import get_duration_history, shard
+
+        ids = test_ids(tests)
+        history = get_duration_history()
+        # (browser index, test ids)
+        tasks = []
+        for i, parse in enumerate(browsers):
+            groups = shard(ids, shards, history.estimates(ids, browser=browser_label(parse)))
+            tasks.extend((i, group) for group in groups if group)
+    else:
+        tasks = [(i, list(tests)) for i in range(len(browsers))]
+
+    pool = Pool(processes or len(tasks), maxtasksperchild=1)
+    try:
+        worker = _run_pytest if use_pytest else _run_unittest
+        # map_async().get() with a timeout keeps the pool interruptible with ctrl-c
+        record = shards > 1 or bool(os.environ.get('SELENIUM_DURATION_HISTORY'))
+        results = pool.map_async(worker, [(browsers[i].url, names, record) for i, names in tasks]).get(sys.maxint)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    if shards > 1:
+        by_browser = {}
+        for (i, names), result in zip(tasks, results):
+            by_browser.setdefault(i, []).append(result)
+        results = [_merge(by_browser[i]) for i in sorted(by_browser)]
+    return MatrixResult(results)
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    use_pytest = '--pytest' in argv
+    if use_pytest:
+        argv.remove('--pytest')
+    shards = 1
+    if '--shards' in argv:
+        i = argv.index('--shards')
+        shards = int(argv[i + 1])
+        del argv[i:i + 2]
+    result = run_matrix(argv, use_pytest=use_pytest, shards=shards)
+    print result.report()
+    return 0 if result.was_successful() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
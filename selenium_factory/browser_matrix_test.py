@@ -0,0 +1,124 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from browser_matrix import parse_browsers, run_matrix, _browser_environment
+
+BROWSERS = json.dumps([
+    {"platform": "LINUX", "os": "Linux", "browser": "firefox", "browser-version": "30",
+     "url": "sauce-ondemand:?os=Linux&browser=firefox&browser-version=30&username=foo&access-key=bar"},
+    {"platform": "VISTA", "os": "Windows 2008", "browser": "safari", "browser-version": "5"},
+])
+
+
+class BrowserProbe(unittest.TestCase):
+    """
+    Run by the matrix workers below; fails on safari so the merged report has something to show.
+    """
+
+    def test_browser(self):
+        self.assertNotEqual('safari', os.environ.get('SELENIUM_BROWSER'))
+
+    def test_version(self):
+        # a second test for the shards to split
+        self.assertNotEqual('4', os.environ.get('SELENIUM_VERSION'))
+
+
+class PlatformProbe(unittest.TestCase):
+    """
+    Run by test_workers_do_not_inherit_the_platform.
+    """
+    platforms = {'firefox': 'LINUX', 'chrome': None}
+
+    def test_platform(self):
+        browser = os.environ.get('SELENIUM_BROWSER')
+        if browser not in self.platforms:
+            self.skipTest("not in a matrix worker")
+        self.assertEqual(self.platforms[browser], os.environ.get('SELENIUM_PLATFORM'))
+
+
+class TestBrowserMatrix(unittest.TestCase):
+    def setUp(self):
+        os.environ['SAUCE_USER_NAME'] = 'foo'
+        os.environ['SAUCE_API_KEY'] = 'bar'
+        self.directory = tempfile.mkdtemp()
+        os.environ['SELENIUM_DURATION_HISTORY'] = os.path.join(self.directory, 'durations.db')
+
+    def tearDown(self):
+        del os.environ['SAUCE_USER_NAME']
+        del os.environ['SAUCE_API_KEY']
+        del os.environ['SELENIUM_DURATION_HISTORY']
+        shutil.rmtree(self.directory)
+
+    def test_parse_browsers(self):
+        browsers = parse_browsers(BROWSERS)
+        self.assertEqual(['firefox', 'safari'], [parse.get_browser() for parse in browsers])
+        self.assertEqual('Windows 2008', browsers[1].get_os())
+        self.assertEqual('foo', browsers[1].get_user_name())
+        self.assertEqual('bar', browsers[1].get_access_key())
+
+    def test_browser_environment(self):
+        # the url of the first entry has no platform, its entry has
+        firefox, safari = parse_browsers(BROWSERS)
+        self.assertEqual('LINUX', firefox.get_platform())
+        environment = _browser_environment(firefox)
+        self.assertEqual('firefox', environment['SELENIUM_BROWSER'])
+        self.assertEqual('LINUX', environment['SELENIUM_PLATFORM'])
+        self.assertEqual('VISTA', _browser_environment(safari)['SELENIUM_PLATFORM'])
+
+        # the OS is not a platform
+        chrome, = parse_browsers(json.dumps([{"os": "Windows 2008", "browser": "chrome"}]))
+        self.assertFalse('SELENIUM_PLATFORM' in _browser_environment(chrome))
+
+    def test_workers_do_not_inherit_the_platform(self):
+        # what the plugin exports for the first browser of the matrix
+        os.environ['SELENIUM_PLATFORM'] = 'XP'
+        try:
+            browsers = parse_browsers(json.dumps([json.loads(BROWSERS)[0],
+                                                  {"os": "Windows 2008", "browser": "chrome", "browser-version": ""}]))
+            result = run_matrix(['browser_matrix_test.PlatformProbe'], browsers)
+        finally:
+            del os.environ['SELENIUM_PLATFORM']
+        self.assertTrue(result.was_successful(), result.report())
+        self.assertEqual([1, 1], [browser['tests_run'] for browser in result.results])
+
+    def test_run_matrix(self):
+        result = run_matrix(['browser_matrix_test.BrowserProbe'], parse_browsers(BROWSERS))
+        self.assertFalse(result.was_successful())
+        self.assertEqual([2, 2], [browser['tests_run'] for browser in result.results])
+        self.assertEqual([0, 1], [len(browser['failures']) for browser in result.results])
+        self.assertTrue('safari 5 Windows 2008' in result.report())
+
+    def test_run_matrix_without_history(self):
+        from durations import DEFAULT_FILE
+
+        del os.environ['SELENIUM_DURATION_HISTORY']
+        cwd = os.getcwd()
+        os.chdir(self.directory)
+        try:
+            result = run_matrix(['browser_matrix_test.BrowserProbe'], parse_browsers(BROWSERS))
+        finally:
+            os.chdir(cwd)
+            os.environ['SELENIUM_DURATION_HISTORY'] = os.path.join(self.directory, 'durations.db')
+        self.assertEqual([2, 2], [browser['tests_run'] for browser in result.results])
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertFalse(os.path.exists(DEFAULT_FILE))
+
+    def test_run_matrix_shards(self):
+        from durations import get_duration_history
+
+        result = run_matrix(['browser_matrix_test.BrowserProbe'], parse_browsers(BROWSERS), shards=2)
+        self.assertEqual([2, 2], [browser['tests_run'] for browser in result.results])
+        self.assertEqual([2, 2], [len(browser['shards']) for browser in result.results])
+        self.assertEqual([0, 1], [len(browser['failures']) for browser in result.results])
+        self.assertTrue('shards:' in result.report())
+
+        estimates = get_duration_history().estimates(['browser_matrix_test.BrowserProbe.test_browser'],
+                                                     browser='safari 5 Windows 2008')
+        self.assertEqual(['browser_matrix_test.BrowserProbe.test_browser'], estimates.keys())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Compiles the desired capabilities of a remote web driver session out of a 'SELENIUM_DRIVER' url and the environment
+variables set by the CI plugins.
+
+The result is an immutable CapabilityProfile, memoized per driver url and snapshot of the relevant environment
+variables, which hands out a fresh dict for every session.  The shared webdriver.DesiredCapabilities dicts are copied,
+never modified, so profiles can be compiled and used from several threads at once.
+"""
+
+import os
+import threading
+
+from parse_sauce_URL import ParseSauceURL
+
+# parse.get_browser() -> name of the webdriver.DesiredCapabilities attribute, FIREFOX otherwise
+BROWSERS = {
+    'android': 'ANDROID',
+    'googlechrome': 'CHROME',
+    'chrome': 'CHROME',
+    'firefox': 'FIREFOX',
+    'htmlunit': 'HTMLUNIT',
+    'iexplore': 'INTERNETEXPLORER',
+    'internet explorer': 'INTERNETEXPLORER',
+    'iphone': 'IPHONE',
+    'iPad': 'IPAD',
+    'opera': 'OPERA',
+    'safari': 'SAFARI',
+    'htmlunitjs': 'HTMLUNITWITHJS',
+    'phantomjs': 'PHANTOMJS',
+}
+
+# work around for name issues in Selenium 2: (substring of parse.get_os(), platform)
+PLATFORMS = (
+    ('Windows 2003', 'XP'),
+    ('Windows 2008', 'VISTA'),
+    ('Linux', 'LINUX'),
+)
+
+UNSET = object()
+
+# additional flags, https://docs.saucelabs.com/reference/test-configuration/
+# (environment variable, capability, default when the variable is not set or UNSET to leave the capability out)
+ENVIRONMENT_CAPABILITIES = (
+    ('SELENIUM_RECORD_VIDEO', 'record-video', UNSET),
+    ('SELENIUM_VIDEO_UPLOAD_ON_PASS', 'video-upload-on-pass', False),
+    ('SELENIUM_CAPTURE_HTML', 'capture-html', False),
+    ('SAUCE_TUNNEL_ID', 'tunnel-identifier', None),
+    ('SELENIUM_RECORD_SCREENSHOTS', 'record-screenshots', True),
+)
+
+# every environment variable the compiled capabilities depend on
+ENVIRONMENT = (
+    'SELENIUM_PLATFORM',
+    'SELENIUM_MAX_DURATION',
+    'SELENIUM_SCREEN_RESOLUTION',
+    'SELENIUM_IDLE_TIMEOUT',
+    'SELENIUM_DISABLE_POPUP_HANDLER',
+    'SELENIUM_TIMEZONE',
+    'SELENIUM_NO_NATIVE_EVENTS',
+) + tuple(variable for variable, _, _ in ENVIRONMENT_CAPABILITIES)
+
+
+class CapabilityProfile(object):
+    __slots__ = ('_items',)
+
+    def __init__(self, capabilities):
+        object.__setattr__(self, '_items', tuple(sorted(capabilities.items())))
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("CapabilityProfile is immutable")
+
+    def __getitem__(self, key):
+        for name, value in self._items:
+            if name == key:
+                return value
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def capabilities(self, **overrides):
+        """
+        Returns a new desired capabilities dict for one session, e.g. profile.capabilities(name=job_name).
+        """
+        capabilities = dict(self._items)
+        capabilities.update(overrides)
+        return capabilities
+
+
+def _default(value, default):
+    return value if value is not None else default
+
+
+def _compile(parse, environment):
+    from selenium.webdriver import DesiredCapabilities
+
+    capabilities = dict(getattr(DesiredCapabilities, BROWSERS.get(parse.get_browser(), 'FIREFOX')))
+    capabilities['version'] = parse.get_browser_version()
+
+    if parse.get_platform() != "":
+        capabilities['platform'] = parse.get_platform()
+    elif environment['SELENIUM_PLATFORM'] is not None:
+        capabilities['platform'] = environment['SELENIUM_PLATFORM']
+    else:
+        capabilities['platform'] = parse.get_os()
+        for os_name, platform in PLATFORMS:
+            if os_name in parse.get_os():
+                capabilities['platform'] = platform
+                break
+
+    capabilities['name'] = parse.get_job_name()
+
+    # make sure the test doesn't run forever if the test crashes
+    capabilities['max-duration'] = _default(environment['SELENIUM_MAX_DURATION'], 300)
+    if parse.get_max_duration() != 0:
+        capabilities['max-duration'] = parse.get_max_duration()
+    capabilities['command-timeout'] = capabilities['max-duration']
+
+    if environment['SELENIUM_SCREEN_RESOLUTION'] is not None:
+        capabilities['screen-resolution'] = environment['SELENIUM_SCREEN_RESOLUTION']
+    elif parse.get_screen_resolution() != '1024x768':
+        capabilities['screen-resolution'] = parse.get_screen_resolution()
+
+    capabilities['idle-timeout'] = _default(environment['SELENIUM_IDLE_TIMEOUT'], 30)
+    if parse.get_idle_timeout() != 0:
+        capabilities['idle-timeout'] = parse.get_idle_timeout()
+
+    disable_popup_handler_flag = environment['SELENIUM_DISABLE_POPUP_HANDLER']
+    if disable_popup_handler_flag is not None and disable_popup_handler_flag.lower() in ('true', '1'):
+        capabilities['disable-popup-handler'] = True
+
+    for variable, capability, default in ENVIRONMENT_CAPABILITIES:
+        if environment[variable] is not None:
+            capabilities[capability] = environment[variable]
+        elif default is not UNSET:
+            capabilities[capability] = default
+
+    # support timezone
+    if parse.get_timezone() != "":
+        capabilities['time-zone'] = parse.get_timezone()
+    else:
+        capabilities['time-zone'] = _default(environment['SELENIUM_TIMEZONE'], 'Pacific')
+
+    if environment['SELENIUM_NO_NATIVE_EVENTS'] is not None:
+        capabilities['nativeEvents'] = False
+
+    return CapabilityProfile(capabilities)
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def compile_capabilities(driver_url):
+    """
+    Returns the CapabilityProfile of a 'SELENIUM_DRIVER' url under the current environment.
+    """
+    snapshot = tuple(os.environ.get(variable) for variable in ENVIRONMENT)
+    key = (driver_url, snapshot)
+    profile = _profiles.get(key)
+    if profile is None:
+        profile = _compile(ParseSauceURL(driver_url), dict(zip(ENVIRONMENT, snapshot)))
+        with _profiles_lock:
+            profile = _profiles.setdefault(key, profile)
+    return profile
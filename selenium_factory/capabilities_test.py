@@ -0,0 +1,50 @@
+import os
+import unittest
+
+from selenium.webdriver import DesiredCapabilities
+
+from capabilities import compile_capabilities
+
+DRIVER_URL = "sauce-ondemand:?username=foobar&access-key=1234&job-name=simple test&os=Windows 2008" \
+             "&browser=iexplore&browser-version=9&max-duration=300&idle-timeout=90"
+
+
+class TestCompileCapabilities(unittest.TestCase):
+    def tearDown(self):
+        os.environ.pop('SAUCE_TUNNEL_ID', None)
+
+    def test_capabilities(self):
+        capabilities = compile_capabilities(DRIVER_URL).capabilities()
+        self.assertEqual('internet explorer', capabilities['browserName'])
+        self.assertEqual('9', capabilities['version'])
+        self.assertEqual('VISTA', capabilities['platform'])
+        self.assertEqual('simple test', capabilities['name'])
+        self.assertEqual(300, capabilities['max-duration'])
+        self.assertEqual(300, capabilities['command-timeout'])
+        self.assertEqual(90, capabilities['idle-timeout'])
+        self.assertEqual(None, capabilities['tunnel-identifier'])
+        self.assertFalse('record-video' in capabilities)
+
+    def test_profiles_are_memoized_and_copied(self):
+        profile = compile_capabilities(DRIVER_URL)
+        self.assertTrue(profile is compile_capabilities(DRIVER_URL))
+
+        capabilities = profile.capabilities(name='other test')
+        capabilities['platform'] = 'changed'
+        self.assertEqual('other test', capabilities['name'])
+        self.assertEqual('simple test', profile['name'])
+        self.assertEqual('VISTA', profile.capabilities()['platform'])
+        self.assertEqual('', DesiredCapabilities.INTERNETEXPLORER['version'])
+        self.assertEqual('WINDOWS', DesiredCapabilities.INTERNETEXPLORER['platform'])
+        self.assertRaises(AttributeError, setattr, profile, '_items', ())
+
+    def test_environment_changes_recompile(self):
+        profile = compile_capabilities(DRIVER_URL)
+        os.environ['SAUCE_TUNNEL_ID'] = 'tunnel-1'
+        tunneled = compile_capabilities(DRIVER_URL)
+        self.assertFalse(profile is tunneled)
+        self.assertEqual('tunnel-1', tunneled['tunnel-identifier'])
+
+
+if __name__ == "__main__":
+    unittest.main()
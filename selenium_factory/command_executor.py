@@ -0,0 +1,96 @@
+"""
+A command executor for webdriver.Remote that sends the WebDriver commands of every session over a shared pool of
+keep-alive connections (see connection_pool), instead of the new HTTP connection per command of the selenium 2
+RemoteConnection.  The Basic auth header is computed once, and the socket timeout is configurable.  Every command is
+timed by its name (e.g. 'findElement' or 'clickElement') when instrumentation is on.
+
+AttachedRemote drives a session that is already running, e.g. one found in the session_registry.
+"""
+
+import time
+import urlparse
+
+from selenium.webdriver.remote import utils
+from selenium.webdriver.remote.errorhandler import ErrorCode
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+from selenium.webdriver.remote.webdriver import WebDriver as Remote
+
+import instrumentation
+from connection_pool import get_pool, basic_auth
+
+DEFAULT_POOL_SIZE = 8
+
+
+def parse_response(status, content_type, data):
+    """
+    Turns an HTTP response of a WebDriver server into the response dict of a command, like RemoteConnection._request.
+    """
+    if 399 < status < 500:
+        return {'status': status, 'value': data}
+
+    body = data.decode('utf-8').replace('\x00', '').strip()
+    if any(part.strip().startswith('image/png') for part in (content_type or '').split(';')):
+        return {'status': 0, 'value': body}
+    try:
+        data = utils.load_json(body)
+    except ValueError:
+        return {'status': ErrorCode.SUCCESS if 199 < status < 300 else ErrorCode.UNKNOWN_ERROR, 'value': body}
+
+    assert type(data) is dict, 'Invalid server response body: %s' % body
+    assert 'status' in data, 'Invalid server response; no status: %s' % body
+    # some drivers return no 'value' when they should return null
+    data.setdefault('value', None)
+    return data
+
+
+class PooledRemoteConnection(RemoteConnection):
+    def __init__(self, remote_server_addr, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        RemoteConnection.__init__(self, remote_server_addr)
+        parts = urlparse.urlsplit(self._url)
+        self._pool = get_pool(parts.scheme, parts.hostname, parts.port, size=pool_size, timeout=timeout)
+        self._headers = {'Accept': 'application/json',
+                         'Content-Type': 'application/json;charset=UTF-8',
+                         'Connection': 'keep-alive'}
+        if parts.username:
+            self._headers['Authorization'] = basic_auth(parts.username, parts.password or '')
+        # when the session last sent a command, for the session registry's idle-timeout
+        self.last_used = None
+
+    def execute(self, command, params):
+        # every command of the session comes here, those of its WebElements included
+        start = time.time()
+        try:
+            return RemoteConnection.execute(self, command, params)
+        finally:
+            self.last_used = time.time()
+            if instrumentation.enabled:
+                instrumentation.registry.observe(instrumentation.WEBDRIVER, command, self.last_used - start)
+
+    def _request(self, method, url, body=None):
+        """
+        Sends the request on a pooled connection and returns the server's parsed JSON response, like
+        RemoteConnection._request.
+        """
+        parts = urlparse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        if method not in ('POST', 'PUT'):
+            body = None
+        response = self._pool.request(method, path, body, self._headers, gzip=False)
+
+        if 300 <= response.status < 304:
+            return self._request('GET', response.getheader('location'))
+        return parse_response(response.status, response.getheader('Content-Type'), response.data)
+
+
+class AttachedRemote(Remote):
+    """
+    A webdriver.Remote for an existing session: it adopts 'session_id' instead of starting a new session.
+    """
+
+    def __init__(self, command_executor, session_id, capabilities):
+        self.attach_to = session_id
+        Remote.__init__(self, command_executor=command_executor, desired_capabilities=capabilities)
+
+    def start_session(self, desired_capabilities, browser_profile=None):
+        self.session_id = self.attach_to
+        self.capabilities = desired_capabilities
@@ -0,0 +1,173 @@
+"""
+This class keeps a thread-safe pool of keep-alive HTTP(S) connections to a single host, so that the REST calls of a
+worker process reuse a few sockets instead of opening a new TCP+TLS connection for every call.
+"""
+
+import threading
+import contextlib
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 30
+
+_auth_headers = {}
+
+
+def basic_auth(username, password):
+    """
+    Returns the Basic Authorization header for the credentials, computed once per process.
+    """
+    header = _auth_headers.get((username, password))
+    if header is None:
+        import base64
+        header = _auth_headers[(username, password)] = "Basic %s" % base64.b64encode('%s:%s' % (username, password))
+    return header
+
+
+class Response:
+    def __init__(self, status, reason, msg, data):
+        self.status = status
+        self.reason = reason
+        self.msg = msg
+        self.data = data
+
+    def getheader(self, name, default=None):
+        return self.msg.getheader(name, default)
+
+
+def _nothing_received(error):
+    # the BadStatusLine of a connection closed before the status line; older Pythons pass the empty line
+    return not error.line or error.line in ("''", '""') or error.line.startswith('No status line received')
+
+
+class ConnectionPool:
+    def __init__(self, scheme, host, port=None, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def request(self, method, path, body=None, headers=None, gzip=True):
+        """
+        Sends a request on a pooled connection and returns the fully read Response, see _send for retries.
+        """
+        headers = dict(headers or {})
+        if gzip:
+            headers.setdefault('Accept-Encoding', 'gzip')
+
+        connection, response = self._send(method, path, body, headers)
+        try:
+            data = response.read()
+        except Exception:
+            connection.close()
+            raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._put(connection)
+
+        if response.getheader('content-encoding', '').lower() == 'gzip':
+            import zlib
+            data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+        return Response(response.status, response.reason, response.msg, data)
+
+    @contextlib.contextmanager
+    def stream(self, method, path, body=None, headers=None):
+        """
+        Sends a request on a pooled connection and yields the unread httplib response, for bodies too large to hold
+        in memory.  The connection goes back to the pool only if the body was read to the end.
+        """
+        connection, response = self._send(method, path, body, headers or {})
+        try:
+            yield response
+        finally:
+            if response.isclosed() and not response.will_close:
+                self._put(connection)
+            else:
+                connection.close()
+
+    def _send(self, method, path, body, headers):
+        """
+        Sends the request and returns the connection and its response, with the headers read.  A reused connection
+        that the server closed while it sat in the pool fails before a single byte of response arrives; only then is
+        the request sent again, on a new connection.  Anything else, timeouts in particular, may have reached a server
+        that acts on it, and is raised rather than repeated.
+        """
+        import errno
+        import socket
+        import httplib
+
+        while True:
+            connection, reused = self._get()
+            stale = False
+            try:
+                try:
+                    connection.request(method, path, body, headers)
+                except socket.timeout:
+                    raise
+                except socket.error, e:
+                    stale = e.errno in (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+                    raise
+                try:
+                    return connection, connection.getresponse()
+                except httplib.BadStatusLine, e:
+                    stale = _nothing_received(e)
+                    raise
+            except Exception:
+                connection.close()
+                if reused and stale:
+                    continue
+                raise
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _get(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        import httplib
+        if self.scheme == 'https':
+            return httplib.HTTPSConnection(self.host, self.port, timeout=self.timeout), False
+        return httplib.HTTPConnection(self.host, self.port, timeout=self.timeout), False
+
+    def _put(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(scheme, host, port=None, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    """
+    Returns the process wide ConnectionPool for the host, creating it on first use.
+    """
+    key = (scheme, host, port, timeout)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(scheme, host, port, size=size, timeout=timeout)
+    return pool
+
+
+def close_pools(host, port=None):
+    """
+    Closes the idle connections of the process wide pools for the host, and port if given; for servers that went away.
+    """
+    with _pools_lock:
+        pools = [pool for (scheme, pool_host, pool_port, timeout), pool in _pools.items()
+                 if pool_host == host and port in (None, pool_port)]
+    for pool in pools:
+        pool.close()
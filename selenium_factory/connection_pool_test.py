@@ -0,0 +1,95 @@
+import gzip
+import time
+import socket
+import threading
+import unittest
+from StringIO import StringIO
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from connection_pool import ConnectionPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connections = set()
+    posts = 0
+
+    def do_POST(self):
+        # answers after the client's timeout
+        Handler.posts += 1
+        self.rfile.read(int(self.headers.getheader('content-length')))
+        time.sleep(0.5)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        Handler.connections.add(self.client_address)
+        if self.path == '/close':
+            # closes the connection without saying so, like a server dropping idle keep-alive connections
+            self.close_connection = 1
+        body = '{"path": "%s"}' % self.path
+        self.send_response(200)
+        if 'gzip' in self.headers.getheader('accept-encoding', ''):
+            buf = StringIO()
+            f = gzip.GzipFile(fileobj=buf, mode='wb')
+            f.write(body)
+            f.close()
+            body = buf.getvalue()
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        Handler.connections = set()
+        Handler.posts = 0
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.pool = ConnectionPool('http', '127.0.0.1', self.server.server_port, size=2, timeout=0.2)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for i in range(5):
+            response = self.pool.request('GET', '/jobs/%d' % i)
+            self.assertEqual(200, response.status)
+            self.assertEqual('{"path": "/jobs/%d"}' % i, response.data)
+        self.assertEqual(1, len(Handler.connections))
+
+    def test_plain_response(self):
+        response = self.pool.request('GET', '/jobs', gzip=False)
+        self.assertEqual('{"path": "/jobs"}', response.data)
+        self.assertEqual(None, response.getheader('content-encoding'))
+
+    def test_closed_connection_is_replaced(self):
+        self.pool.request('GET', '/close')
+        time.sleep(0.1)
+        self.assertEqual('{"path": "/jobs"}', self.pool.request('GET', '/jobs').data)
+        self.assertEqual(2, len(Handler.connections))
+
+    def test_timeout_is_not_retried(self):
+        # on a reused connection, which used to be retried on any socket error
+        self.pool.request('GET', '/jobs')
+        self.assertRaises(socket.timeout, self.pool.request, 'POST', '/session', '{}')
+        time.sleep(0.3)
+        self.assertEqual(1, Handler.posts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Runs a batch of element lookups and property reads in the browser with a single execute_script call, instead of one
+WebDriver round trip per find_element or attribute read.
+
+A query is a tuple (by, value[, read[, all]]) or a Query; 'by' is one of the selenium By strategies, 'read' one of
+
+    element             the element itself (a WebElement), the default
+    text                its visible text
+    displayed           whether it is visible
+    exists / count      whether it exists / how many elements match
+    tag                 its tag name
+    attribute:<name>    an attribute, e.g. 'attribute:href'
+    property:<name>     a DOM property, e.g. 'property:checked'
+    value               shorthand for 'property:value'
+
+Each result is None when nothing matches, or a list with one entry per matching element when 'all' is set.
+"""
+
+READS = ('element', 'text', 'displayed', 'exists', 'count', 'tag', 'value')
+
+# find(query) and read(element, what), shared with the scripts of dom_waits
+FIND_SCRIPT = """
+function find(query) {
+    var root = query.parent || document, value = query.value, nodes = [], i;
+    switch (query.by) {
+    case 'css selector':
+        return root.querySelectorAll(value);
+    case 'id':
+        return root.querySelectorAll('[id="' + value.replace(/(["\\\\])/g, '\\\\$1') + '"]');
+    case 'name':
+        return root.querySelectorAll('[name="' + value.replace(/(["\\\\])/g, '\\\\$1') + '"]');
+    case 'class name':
+        return root.getElementsByClassName(value);
+    case 'tag name':
+        return root.getElementsByTagName(value);
+    case 'xpath':
+        var snapshot = document.evaluate(value, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (i = 0; i < snapshot.snapshotLength; i++) {
+            nodes.push(snapshot.snapshotItem(i));
+        }
+        return nodes;
+    case 'link text':
+    case 'partial link text':
+        var links = root.getElementsByTagName('a');
+        for (i = 0; i < links.length; i++) {
+            var text = (links[i].innerText || links[i].textContent || '').replace(/^\\s+|\\s+$/g, '');
+            if (query.by === 'link text' ? text === value : text.indexOf(value) !== -1) {
+                nodes.push(links[i]);
+            }
+        }
+        return nodes;
+    }
+    throw new Error('Unsupported locator strategy: ' + query.by);
+}
+
+function read(element, what) {
+    if (what === 'element') {
+        return element;
+    } else if (what === 'text') {
+        return (element.innerText || element.textContent || '').replace(/^\\s+|\\s+$/g, '');
+    } else if (what === 'displayed') {
+        var style = window.getComputedStyle(element);
+        return style.display !== 'none' && style.visibility !== 'hidden' &&
+            !!(element.offsetWidth || element.offsetHeight || element.getClientRects().length);
+    } else if (what === 'tag') {
+        return element.tagName.toLowerCase();
+    } else if (what.indexOf('attribute:') === 0) {
+        return element.getAttribute(what.substring(10));
+    } else if (what.indexOf('property:') === 0) {
+        var property = element[what.substring(9)];
+        return property === undefined ? null : property;
+    }
+    throw new Error('Unsupported read: ' + what);
+}
+"""
+
+BATCH_SCRIPT = FIND_SCRIPT + """
+var queries = arguments[0], results = [];
+
+for (var q = 0; q < queries.length; q++) {
+    var query = queries[q], nodes = find(query), result = null;
+    if (query.read === 'count') {
+        result = nodes.length;
+    } else if (query.read === 'exists') {
+        result = nodes.length > 0;
+    } else if (query.all) {
+        result = [];
+        for (var n = 0; n < nodes.length; n++) {
+            result.push(read(nodes[n], query.read));
+        }
+    } else if (nodes.length) {
+        result = read(nodes[0], query.read);
+    }
+    results.push(result);
+}
+return results;
+"""
+
+
+class Query:
+    def __init__(self, by, value, read='element', all=False, parent=None):
+        if read == 'value':
+            read = 'property:value'
+        if read not in READS and not read.startswith(('attribute:', 'property:')):
+            raise ValueError("Unsupported read: %r" % read)
+        self.by = by
+        self.value = value
+        self.read = read
+        self.all = all
+        self.parent = parent
+
+    def to_json(self):
+        query = {'by': self.by, 'value': self.value, 'read': self.read, 'all': self.all}
+        if self.parent is not None:
+            query['parent'] = self.parent
+        return query
+
+
+def as_query(query):
+    if isinstance(query, Query):
+        return query
+    return Query(*query)
+
+
+def run_batch(driver, queries):
+    """
+    Runs the queries in one execute_script call on the driver and returns their results, in order.
+    """
+    queries = [as_query(query).to_json() for query in queries]
+    if not queries:
+        return []
+    return driver.execute_script(BATCH_SCRIPT, queries)
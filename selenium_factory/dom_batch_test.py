@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+from distutils.spawn import find_executable
+
+from dom_batch import BATCH_SCRIPT, Query, run_batch
+
+NODE = find_executable('node') or find_executable('nodejs')
+PHANTOMJS = find_executable('phantomjs')
+
+# runs BATCH_SCRIPT in node the way WebDriver runs scripts, as the body of a function called with the arguments,
+# against a document that answers every lookup from ELEMENTS, keyed by the selector (or class or tag name) asked for
+NODE_HARNESS = """
+var specs = %(elements)s;
+
+function element(spec) {
+    var node = {tagName: spec.tag.toUpperCase(), textContent: spec.text || '', getAttribute: function (name) {
+        return spec.attributes && spec.attributes.hasOwnProperty(name) ? spec.attributes[name] : null;
+    }};
+    for (var property in spec.properties || {}) {
+        node[property] = spec.properties[property];
+    }
+    return node;
+}
+
+global.document = {
+    querySelectorAll: function (selector) { return (specs[selector] || []).map(element); },
+    getElementsByClassName: function (name) { return this.querySelectorAll('.' + name); },
+    getElementsByTagName: function (name) { return this.querySelectorAll(name); }
+};
+global.window = {};
+
+var batch = new Function(%(script)s);
+try {
+    console.log(JSON.stringify({results: batch.apply(null, [%(queries)s])}));
+} catch (e) {
+    console.log(JSON.stringify({error: e.message}));
+}
+"""
+
+ELEMENTS = {
+    '#price': [{'tag': 'span', 'text': '  12.99\n'}],
+    '.item': [{'tag': 'li', 'text': 'Book'}, {'tag': 'li', 'text': 'Pen'}],
+    '[id="qty"]': [{'tag': 'input', 'properties': {'value': '2', 'checked': False}}],
+    '[id="say \\"hi\\""]': [{'tag': 'p', 'text': 'quoted'}],
+    'a': [{'tag': 'a', 'text': ' Cart ', 'attributes': {'href': '/cart'}},
+          {'tag': 'a', 'text': 'Checkout', 'attributes': {'href': '/checkout'}}],
+}
+
+PAGE = """<html><head><title>Batch</title></head><body>
+<span id="price">  12.99
+</span>
+<ul><li class="item">Book</li><li class="item" style="display: none">Pen</li></ul>
+<input id="qty" name="qty" value="2" type="checkbox" checked>
+<a href="/cart"> Cart </a><a href="/checkout">Checkout</a>
+</body></html>"""
+
+
+@unittest.skipIf(NODE is None, "needs node")
+class TestBatchScriptInNode(unittest.TestCase):
+    def run_script(self, queries):
+        queries = [query if isinstance(query, dict) else Query(*query).to_json() for query in queries]
+        source = NODE_HARNESS % {'elements': json.dumps(ELEMENTS), 'script': json.dumps(BATCH_SCRIPT),
+                                 'queries': json.dumps(queries)}
+        process = subprocess.Popen([NODE], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate(source)
+        self.assertEqual(0, process.returncode, errors)
+        return json.loads(output)
+
+    def test_reads(self):
+        output = self.run_script([('css selector', '#price', 'text'),
+                                  ('class name', 'item', 'text', True),
+                                  ('id', 'qty', 'value'),
+                                  ('id', 'qty', 'property:checked'),
+                                  ('id', 'say "hi"', 'tag'),
+                                  ('partial link text', 'Check', 'attribute:href'),
+                                  ('link text', 'Cart', 'attribute:href', True)])
+        self.assertEqual({'results': ['12.99', ['Book', 'Pen'], '2', False, 'p', '/checkout', ['/cart']]}, output)
+
+    def test_nothing_found(self):
+        output = self.run_script([('css selector', '#missing', 'text'),
+                                  ('css selector', '#missing', 'text', True),
+                                  ('css selector', '#missing', 'count'),
+                                  ('css selector', '#missing', 'exists'),
+                                  ('css selector', '.item', 'count'),
+                                  ('id', 'qty', 'attribute:title'),
+                                  ('id', 'qty', 'property:form')])
+        self.assertEqual({'results': [None, [], 0, False, 2, None, None]}, output)
+
+    def test_errors(self):
+        self.assertEqual({'error': 'Unsupported locator strategy: -ios uiautomation'},
+                         self.run_script([('css selector', '#price', 'text'), ('-ios uiautomation', 'x', 'text')]))
+        # a read the Query validation lets through, but the script does not know
+        query = Query('css selector', '#price', 'text').to_json()
+        query['read'] = 'colour'
+        self.assertEqual({'error': 'Unsupported read: colour'}, self.run_script([query]))
+
+
+@unittest.skipIf(PHANTOMJS is None, "needs phantomjs")
+class TestBatchScriptInPhantomJS(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from selenium.webdriver import PhantomJS
+
+        cls.directory = tempfile.mkdtemp()
+        page = os.path.join(cls.directory, 'page.html')
+        with open(page, 'w') as f:
+            f.write(PAGE)
+        cls.driver = PhantomJS(PHANTOMJS)
+        cls.driver.get('file://' + page)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.driver.quit()
+        shutil.rmtree(cls.directory)
+
+    def test_reads(self):
+        price, items, displayed, qty, checked, cart, links = run_batch(self.driver, [
+            ('id', 'price', 'text'),
+            ('class name', 'item', 'text', True),
+            ('css selector', '.item', 'displayed', True),
+            ('name', 'qty', 'value'),
+            ('xpath', '//input[@id="qty"]', 'property:checked'),
+            ('link text', 'Cart', 'element'),
+            ('tag name', 'a', 'attribute:href', True)])
+        self.assertEqual('12.99', price)
+        self.assertEqual(['Book', 'Pen'], items)
+        self.assertEqual([True, False], displayed)
+        self.assertEqual('2', qty)
+        self.assertEqual(True, checked)
+        self.assertEqual('a', cart.tag_name)
+        self.assertEqual(['/cart', '/checkout'], links)
+
+    def test_nothing_found(self):
+        self.assertEqual([None, [], 0, False, None],
+                         run_batch(self.driver, [('id', 'missing', 'text'),
+                                                 ('id', 'missing', 'element', True),
+                                                 ('id', 'missing', 'count'),
+                                                 ('id', 'missing', 'exists'),
+                                                 ('id', 'price', 'attribute:title')]))
+
+    def test_errors(self):
+        from selenium.common.exceptions import WebDriverException
+
+        try:
+            run_batch(self.driver, [('-ios uiautomation', 'x', 'text')])
+        except WebDriverException, e:
+            self.assertTrue('Unsupported locator strategy: -ios uiautomation' in str(e), str(e))
+        else:
+            self.fail("The unsupported strategy was not reported")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""
+Waits for an element or a condition inside the browser with a single execute_async_script call, instead of polling
+find_element from the client with one WebDriver round trip per attempt.
+
+The condition is checked right away, then again on every DOM mutation (MutationObserver), readyState change and
+load event, with a slow in-browser poll as a fallback for changes no event reports, until it holds or the timeout
+expires.
+"""
+
+from dom_batch import FIND_SCRIPT
+
+# seconds added to the script timeout of the session so the in-browser timeout always fires first
+SCRIPT_TIMEOUT_MARGIN = 5
+
+# in-browser fallback poll, in milliseconds
+POLL_INTERVAL = 250
+
+# the async script timeout of a new session in the JSON wire protocol, put back after a wait when the test set none
+DEFAULT_SCRIPT_TIMEOUT = 0
+
+WAIT_SCRIPT = FIND_SCRIPT + """
+var spec = arguments[0], done = arguments[arguments.length - 1];
+var finished = false, observer = null, timer = null, poller = null;
+
+function check() {
+    if (spec.kind === 'element') {
+        var nodes = find(spec);
+        for (var i = 0; i < nodes.length; i++) {
+            if (!spec.visible || read(nodes[i], 'displayed')) {
+                return nodes[i];
+            }
+        }
+        return null;
+    } else if (spec.kind === 'ready_state') {
+        var states = ['loading', 'interactive', 'complete'];
+        return states.indexOf(document.readyState) >= states.indexOf(spec.state) ? document.readyState : null;
+    }
+    return (new Function(spec.condition))();
+}
+
+function finish(state, value) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    clearTimeout(timer);
+    clearInterval(poller);
+    document.removeEventListener('readystatechange', changed, true);
+    window.removeEventListener('load', changed, true);
+    done([state, value]);
+}
+
+function changed() {
+    try {
+        var value = check();
+        if (value) {
+            finish('ok', value);
+        }
+    } catch (e) {
+        finish('error', String(e));
+    }
+}
+
+changed();
+if (!finished) {
+    if (window.MutationObserver) {
+        observer = new MutationObserver(changed);
+        observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    }
+    document.addEventListener('readystatechange', changed, true);
+    window.addEventListener('load', changed, true);
+    poller = setInterval(changed, spec.poll);
+    timer = setTimeout(function () { finish('timeout', null); }, spec.timeout);
+}
+"""
+
+
+def wait(driver, spec, timeout):
+    """
+    Runs a wait described by 'spec' for up to 'timeout' seconds and returns the value that satisfied it.  The script
+    timeout of the session must allow for it while it runs, see SCRIPT_TIMEOUT_MARGIN.
+    """
+    spec = dict(spec, timeout=int(timeout * 1000), poll=POLL_INTERVAL)
+    state, value = driver.execute_async_script(WAIT_SCRIPT, spec)
+    if state == 'ok':
+        return value
+
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    if state == 'timeout':
+        raise TimeoutException("Timed out after %ss waiting for %s" % (timeout, describe(spec)))
+    raise WebDriverException("Waiting for %s failed: %s" % (describe(spec), value))
+
+
+def describe(spec):
+    if spec['kind'] == 'element':
+        return "%selement %s=%r" % ('visible ' if spec.get('visible') else '', spec['by'], spec['value'])
+    if spec['kind'] == 'ready_state':
+        return "document.readyState %r" % spec['state']
+    return "condition %r" % spec['condition']
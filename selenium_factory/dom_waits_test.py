@@ -0,0 +1,132 @@
+import json
+import unittest
+import subprocess
+from distutils.spawn import find_executable
+
+from dom_waits import WAIT_SCRIPT
+
+NODE = find_executable('node') or find_executable('nodejs')
+
+# runs WAIT_SCRIPT in node like execute_async_script, against a document whose elements, readyState and window.flag
+# the 'changes' of the setup alter after a delay, notifying the mutation observers or the readystatechange listeners
+# only when a change says so; prints the result with the observers and listeners the script left behind
+NODE_HARNESS = """
+var setup = %(setup)s, listeners = {}, observers = [];
+
+function element(spec) {
+    return {tagName: spec.tag.toUpperCase(), textContent: spec.text || ''};
+}
+
+function notify(type) {
+    (listeners[type] || []).slice().forEach(function (listener) { listener(); });
+}
+
+global.document = {
+    readyState: setup.readyState,
+    querySelectorAll: function (selector) { return (setup.elements[selector] || []).map(element); },
+    addEventListener: function (type, listener) { (listeners[type] = listeners[type] || []).push(listener); },
+    removeEventListener: function (type, listener) {
+        listeners[type] = (listeners[type] || []).filter(function (other) { return other !== listener; });
+    }
+};
+// as in a browser, window is the global object
+global.window = global;
+window.addEventListener = document.addEventListener;
+window.removeEventListener = document.removeEventListener;
+if (setup.observer) {
+    window.MutationObserver = function (callback) {
+        this.observe = function () { observers.push(callback); };
+        this.disconnect = function () { observers.splice(observers.indexOf(callback), 1); };
+    };
+}
+
+setup.changes.forEach(function (change) {
+    setTimeout(function () {
+        for (var selector in change.elements || {}) {
+            setup.elements[selector] = change.elements[selector];
+        }
+        if (change.flag) {
+            window.flag = change.flag;
+        }
+        if (change.readyState) {
+            document.readyState = change.readyState;
+            notify('readystatechange');
+        }
+        if (change.mutation) {
+            observers.slice().forEach(function (callback) { callback([]); });
+        }
+    }, change.after);
+});
+
+// a script that leaves a timer behind keeps node running
+setTimeout(function () { console.log(JSON.stringify({hung: true})); process.exit(1); }, 3000).unref();
+
+var started = Date.now();
+new Function(%(script)s).apply(null, [%(spec)s, function (result) {
+    var left = 0;
+    for (var type in listeners) {
+        left += listeners[type].length;
+    }
+    console.log(JSON.stringify({result: result, elapsed: Date.now() - started, observers: observers.length,
+                                listeners: left}));
+}]);
+"""
+
+CART = {'#cart': [{'tag': 'div', 'text': 'Cart'}]}
+
+
+@unittest.skipIf(NODE is None, "needs node")
+class TestWaitScriptInNode(unittest.TestCase):
+    def run_script(self, spec, elements=None, changes=(), ready_state='complete', observer=True):
+        setup = {'elements': elements or {}, 'changes': list(changes), 'readyState': ready_state,
+                 'observer': observer}
+        spec = dict({'timeout': 2000, 'poll': 10000}, **spec)
+        source = NODE_HARNESS % {'setup': json.dumps(setup), 'script': json.dumps(WAIT_SCRIPT),
+                                 'spec': json.dumps(spec)}
+        process = subprocess.Popen([NODE], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate(source)
+        self.assertEqual(0, process.returncode, output + errors)
+        output = json.loads(output)
+        # whatever ended the wait, it cleaned up after itself
+        self.assertEqual(0, output['observers'])
+        self.assertEqual(0, output['listeners'])
+        return output
+
+    def test_found_right_away(self):
+        output = self.run_script({'kind': 'element', 'by': 'css selector', 'value': '#cart'}, elements=CART)
+        self.assertEqual(['ok', {'tagName': 'DIV', 'textContent': 'Cart'}], output['result'])
+
+    def test_mutation_observer(self):
+        # the poll is 10s away: only the observer can see the element in time
+        output = self.run_script({'kind': 'element', 'by': 'css selector', 'value': '#cart'},
+                                 changes=[{'after': 50, 'elements': CART, 'mutation': True}])
+        self.assertEqual('ok', output['result'][0])
+        self.assertTrue(output['elapsed'] < 1000, output)
+
+    def test_ready_state(self):
+        output = self.run_script({'kind': 'ready_state', 'state': 'complete'}, ready_state='loading', observer=False,
+                                 changes=[{'after': 20, 'readyState': 'interactive'},
+                                          {'after': 50, 'readyState': 'complete'}])
+        self.assertEqual(['ok', 'complete'], output['result'])
+        self.assertEqual(['ok', 'loading'],
+                         self.run_script({'kind': 'ready_state', 'state': 'loading'}, ready_state='loading')['result'])
+
+    def test_poll_fallback(self):
+        # a change no event reports, without a MutationObserver
+        output = self.run_script({'kind': 'condition', 'condition': 'return window.flag', 'poll': 20},
+                                 observer=False, changes=[{'after': 50, 'flag': 'ready'}])
+        self.assertEqual(['ok', 'ready'], output['result'])
+
+    def test_timeout(self):
+        output = self.run_script({'kind': 'element', 'by': 'css selector', 'value': '#cart', 'timeout': 100,
+                                  'poll': 20})
+        self.assertEqual(['timeout', None], output['result'])
+        self.assertTrue(output['elapsed'] >= 100, output)
+
+    def test_error(self):
+        output = self.run_script({'kind': 'condition', 'condition': "throw new Error('no jQuery')"})
+        self.assertEqual(['error', 'Error: no jQuery'], output['result'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+A history of test durations, kept in a local SQLite database, and a sharder that uses it to split a suite across
+parallel sessions so that the shards finish at about the same time.
+
+Tests run through browser_matrix are timed and recorded automatically, together with the Sauce job ids of the
+sessions they started (SeleniumFactory reports each new session to the running test, see note_job).  Other runners
+can record durations with DurationHistory.record or Wrapper.record_test.
+
+shard() assigns the tests, longest first, to the least loaded shard (longest processing time first scheduling),
+using the recent mean duration of each test; tests without history are assumed to take the median of the others.
+"""
+
+import os
+import time
+import heapq
+import threading
+import contextlib
+
+DEFAULT_FILE = '.selenium_durations.db'
+
+# seconds assumed for every test when none has a history yet
+DEFAULT_ESTIMATE = 30.0
+
+# runs of a test that its estimate is the mean of
+RECENT_RUNS = 5
+
+# test ids per query, below SQLite's limit of 999 parameters
+QUERY_CHUNK = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS durations (
+    test_id TEXT NOT NULL,
+    browser TEXT NOT NULL,
+    duration REAL NOT NULL,
+    job_ids TEXT NOT NULL,
+    passed INTEGER,
+    recorded_at REAL NOT NULL
+)
+"""
+
+INDEX = "CREATE INDEX IF NOT EXISTS durations_test ON durations (test_id, browser, recorded_at)"
+
+
+class DurationHistory:
+    def __init__(self, path):
+        self.path = path
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+            db.execute(INDEX)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        import sqlite3
+
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute('BEGIN')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def record(self, test_id, duration, job_ids=(), passed=None, browser=''):
+        self.record_many([(test_id, duration, job_ids, passed)], browser=browser)
+
+    def record_many(self, runs, browser=''):
+        """
+        Records (test id, duration, job ids, passed) tuples in one transaction, keeping the last RECENT_RUNS runs of
+        each test on the browser.
+        """
+        now = time.time()
+        runs = list(runs)
+        with self._transaction() as db:
+            db.executemany("INSERT INTO durations (test_id, browser, duration, job_ids, passed, recorded_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?)",
+                           [(test_id, browser, duration, ' '.join(job_ids),
+                             None if passed is None else int(passed), now)
+                            for test_id, duration, job_ids, passed in runs])
+            db.executemany("DELETE FROM durations WHERE test_id = ? AND browser = ? AND rowid NOT IN ("
+                           "SELECT rowid FROM durations WHERE test_id = ? AND browser = ? "
+                           "ORDER BY recorded_at DESC, rowid DESC LIMIT ?)",
+                           [(test_id, browser, test_id, browser, RECENT_RUNS)
+                            for test_id in set(run[0] for run in runs)])
+
+    def estimates(self, test_ids, browser=''):
+        """
+        Returns a dict of test id -> mean duration of its last RECENT_RUNS runs on the browser, or on any browser
+        when it never ran on this one, for the tests with a history.
+        """
+        wanted = list(set(test_ids))
+        # (recorded at, rowid, test id, run browser, duration), the last RECENT_RUNS of every test and browser
+        rows = []
+        with self._transaction() as db:
+            for i in range(0, len(wanted), QUERY_CHUNK):
+                chunk = wanted[i:i + QUERY_CHUNK]
+                rows.extend(db.execute(
+                    "SELECT recorded_at, rowid, test_id, browser, duration FROM durations AS run "
+                    "WHERE test_id IN (%s) AND rowid IN ("
+                    "SELECT rowid FROM durations WHERE test_id = run.test_id AND browser = run.browser "
+                    "ORDER BY recorded_at DESC, rowid DESC LIMIT ?)" % ', '.join('?' * len(chunk)),
+                    chunk + [RECENT_RUNS]))
+
+        runs = {}
+        for _, _, test_id, run_browser, duration in sorted(rows, reverse=True):
+            recent = runs.setdefault((test_id, run_browser == browser), [])
+            if len(recent) < RECENT_RUNS:
+                recent.append(duration)
+
+        found = {}
+        for test_id in wanted:
+            recent = runs.get((test_id, True)) or runs.get((test_id, False))
+            if recent:
+                found[test_id] = sum(recent) / len(recent)
+        return found
+
+
+_histories = {}
+_histories_lock = threading.Lock()
+
+
+def get_duration_history(path=None):
+    """
+    Returns the process wide DurationHistory for the database at 'path', by default the one named by the
+    'SELENIUM_DURATION_HISTORY' environment variable, or DEFAULT_FILE in the working directory.
+    """
+    path = path or os.environ.get('SELENIUM_DURATION_HISTORY') or os.path.abspath(DEFAULT_FILE)
+    with _histories_lock:
+        history = _histories.get(path)
+        if history is None:
+            history = _histories[path] = DurationHistory(path)
+        return history
+
+
+def shard(test_ids, shards, estimates=None, default=None):
+    """
+    Splits the tests into 'shards' lists of about equal estimated duration, with the longest processing time first
+    rule; each list keeps the original order of its tests.  'estimates' maps test ids to seconds (see
+    DurationHistory.estimates); the others count for 'default', by default the median of the known estimates.
+    """
+    test_ids = list(test_ids)
+    estimates = estimates or {}
+    if default is None:
+        known = sorted(estimates[test_id] for test_id in test_ids if test_id in estimates)
+        default = known[len(known) // 2] if known else DEFAULT_ESTIMATE
+
+    order = dict((test_id, i) for i, test_id in enumerate(test_ids))
+    longest_first = sorted(test_ids, key=lambda test_id: (-estimates.get(test_id, default), order[test_id]))
+
+    # (estimated total, shard number)
+    loads = [(0.0, i) for i in range(max(1, shards))]
+    assigned = [[] for _ in loads]
+    for test_id in longest_first:
+        total, i = heapq.heappop(loads)
+        assigned[i].append(test_id)
+        heapq.heappush(loads, (total + estimates.get(test_id, default), i))
+    return [sorted(tests, key=order.get) for tests in assigned]
+
+
+# the test running in this process, when its runner sets it (see browser_matrix), and the Sauce jobs it started
+_current = {'test_id': None, 'job_ids': []}
+_current_lock = threading.Lock()
+
+
+def start_test(test_id):
+    with _current_lock:
+        _current['test_id'] = test_id
+        _current['job_ids'] = []
+
+
+def stop_test():
+    """
+    Returns the job ids noted since start_test.
+    """
+    with _current_lock:
+        job_ids = _current['job_ids']
+        _current['test_id'] = None
+        _current['job_ids'] = []
+    return job_ids
+
+
+def note_job(job_id):
+    """
+    Called for every session SeleniumFactory starts, to attribute its job to the running test.
+    """
+    with _current_lock:
+        if _current['test_id'] is not None:
+            _current['job_ids'].append(job_id)
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import durations
+from durations import DurationHistory, shard, start_test, stop_test, note_job
+
+
+class TestDurationHistory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.history = DurationHistory(os.path.join(self.directory, 'durations.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_estimates_recent_runs(self):
+        self.history.record('a', 100.0)
+        for duration in (10.0, 12.0, 8.0, 10.0, 10.0):
+            self.history.record('a', duration, job_ids=['job'], passed=True)
+        self.history.record('b', 5.0, passed=False)
+        self.assertEqual({'a': 10.0, 'b': 5.0}, self.history.estimates(['a', 'b', 'c']))
+
+    def test_keeps_recent_runs(self):
+        for duration in range(10):
+            self.history.record('a', float(duration), browser='firefox')
+        self.history.record('a', 1.0, browser='safari')
+        with self.history._transaction() as db:
+            counts = dict(db.execute("SELECT browser, COUNT(*) FROM durations GROUP BY browser"))
+        self.assertEqual({'firefox': durations.RECENT_RUNS, 'safari': 1}, counts)
+        self.assertEqual({'a': 7.0}, self.history.estimates(['a'], browser='firefox'))
+
+    def test_estimates_many_tests(self):
+        test_ids = ['test_%04d' % i for i in range(durations.QUERY_CHUNK * 2 + 1)]
+        self.history.record_many([(test_id, float(i), (), True) for i, test_id in enumerate(test_ids)])
+        estimates = self.history.estimates(test_ids + ['unknown'])
+        self.assertEqual(len(test_ids), len(estimates))
+        self.assertEqual(float(len(test_ids) - 1), estimates[test_ids[-1]])
+
+    def test_estimates_prefer_browser(self):
+        self.history.record('a', 10.0, browser='firefox')
+        self.history.record('a', 30.0, browser='safari')
+        self.assertEqual({'a': 30.0}, self.history.estimates(['a'], browser='safari'))
+        self.assertEqual({'a': 10.0}, self.history.estimates(['a'], browser='firefox'))
+        # a browser the test never ran on falls back to the others
+        self.assertEqual({'a': 20.0}, self.history.estimates(['a'], browser='chrome'))
+
+
+class TestShard(unittest.TestCase):
+    def test_longest_first_balance(self):
+        estimates = dict(('test_%02d' % i, float(duration))
+                         for i, duration in enumerate([61, 7, 33, 48, 12, 90, 25, 18, 3, 54, 41, 29, 16, 70, 9, 38]))
+        groups = shard(sorted(estimates), 4, estimates)
+
+        self.assertEqual(sorted(estimates), sorted(sum(groups, [])))
+        totals = [sum(estimates[test_id] for test_id in group) for group in groups]
+        self.assertTrue(max(totals) <= min(totals) * 1.05, totals)
+        for group in groups:
+            self.assertEqual(sorted(group), group)
+
+    def test_unknown_tests_take_the_median(self):
+        # 'new' counts for 20s, the median
+        groups = shard(['slow', 'new', 'fast', 'medium'], 2, {'slow': 30.0, 'medium': 20.0, 'fast': 10.0})
+        self.assertEqual([['slow', 'fast'], ['new', 'medium']], groups)
+        # or for the given default
+        groups = shard(['slow', 'new', 'fast', 'medium'], 2, {'slow': 30.0, 'medium': 20.0, 'fast': 10.0}, 30.0)
+        self.assertEqual([['slow', 'medium'], ['new', 'fast']], groups)
+
+    def test_no_history(self):
+        self.assertEqual([['a', 'c'], ['b']], shard(['a', 'b', 'c'], 2))
+        self.assertEqual([['a'], [], []], shard(['a'], 3))
+
+
+class TestJobAttribution(unittest.TestCase):
+    def test_note_job(self):
+        note_job('outside')
+        start_test('test_a')
+        note_job('job-1')
+        note_job('job-2')
+        self.assertEqual(['job-1', 'job-2'], stop_test())
+        self.assertEqual([], stop_test())
+        self.assertEqual(None, durations._current['test_id'])
+
+
+if __name__ == "__main__":
+    unittest.main()
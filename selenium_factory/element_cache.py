@@ -0,0 +1,149 @@
+"""
+An opt-in cache of element references for a Wrapper, keyed by (locator strategy, value, parent), so that repeated
+lookups of the same locators within one page view don't cost a WebDriver round trip each.  Only find_element lookups
+are cached, which raise when nothing matches: find_elements is always sent, since its result grows as the page
+renders and waits poll it for that.
+
+The cache is cleared on navigation (get, back, forward, refresh), window and frame switches, and whenever a cached
+element turns out to be stale; the command that hit the stale reference is then retried once on a fresh lookup.
+"""
+
+from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.webdriver.common.by import By
+
+# find_element_by_<suffix> -> locator strategy
+STRATEGIES = {
+    'id': By.ID,
+    'name': By.NAME,
+    'xpath': By.XPATH,
+    'link_text': By.LINK_TEXT,
+    'partial_link_text': By.PARTIAL_LINK_TEXT,
+    'tag_name': By.TAG_NAME,
+    'class_name': By.CLASS_NAME,
+    'css_selector': By.CSS_SELECTOR,
+}
+
+# driver attributes after which cached references may belong to another document
+INVALIDATING = frozenset(['get', 'refresh', 'back', 'forward', 'close', 'switch_to', 'switch_to_window',
+                          'switch_to_frame', 'switch_to_default_content'])
+
+# the last item of a key: None for find_element, ALL for find_elements, or the index into a find_elements result
+ALL = 'all'
+
+
+class CachedElement(WebElement):
+    """
+    A WebElement that remembers how it was found, so it can be found again when its reference went stale.
+    """
+
+    def __init__(self, cache, key, element):
+        WebElement.__init__(self, element.parent, element.id)
+        self.cache = cache
+        self.key = key
+
+    def _execute(self, command, params=None):
+        try:
+            return WebElement._execute(self, command, dict(params or {}))
+        except StaleElementReferenceException:
+            self.cache.refresh(self)
+            return WebElement._execute(self, command, dict(params or {}))
+
+    def find_element(self, by=By.ID, value=None):
+        return self.cache.find_element(by, value, parent=self)
+
+    def find_elements(self, by=By.ID, value=None):
+        return self.cache.find_elements(by, value, parent=self)
+
+
+class ElementCache:
+    def __init__(self, driver):
+        self.driver = driver
+        self.elements = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations,
+                'size': len(self.elements)}
+
+    def invalidate(self):
+        self.elements = {}
+        self.invalidations += 1
+
+    def find_element(self, by=By.ID, value=None, parent=None):
+        return self._get((by, value, parent.key if parent is not None else None, None))
+
+    def find_elements(self, by=By.ID, value=None, parent=None):
+        # the elements can still be found again when they go stale, see _fetch
+        self.misses += 1
+        return self._fetch((by, value, parent.key if parent is not None else None, ALL))
+
+    def intercept(self, attr):
+        """
+        Called for every attribute of the driver read through the Wrapper: returns the cached version of the
+        find_element* methods, clears the cache for the commands that leave the current document and returns None
+        for everything else.
+        """
+        if attr in INVALIDATING:
+            self.invalidate()
+            return None
+        if attr == 'find_element':
+            return self.find_element
+        if attr == 'find_elements':
+            return self.find_elements
+
+        prefix, _, suffix = attr.partition('_by_')
+        by = STRATEGIES.get(suffix)
+        if by is None:
+            return None
+        if prefix == 'find_element':
+            return lambda value: self.find_element(by, value)
+        if prefix == 'find_elements':
+            return lambda value: self.find_elements(by, value)
+        return None
+
+    def refresh(self, element):
+        """
+        Looks a stale element up again, in place, after clearing the cache.
+        """
+        self.invalidate()
+        self.misses += 1
+        fresh = self._fetch(element.key)
+        element._id = fresh.id
+        self.elements[element.key] = element
+
+    def _get(self, key):
+        cached = self.elements.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        found = self._fetch(key)
+        self.elements[key] = found
+        return found
+
+    def _fetch(self, key):
+        by, value, parent_key, index = key
+        if parent_key is None:
+            find_one, find_all = self.driver.find_element, self.driver.find_elements
+        else:
+            parent = self._get(parent_key)
+            find_one = lambda by, value: WebElement.find_element(parent, by, value)
+            find_all = lambda by, value: WebElement.find_elements(parent, by, value)
+
+        if index is None:
+            return CachedElement(self, key, find_one(by, value))
+
+        elements = find_all(by, value)
+        if index == ALL:
+            found = []
+            for i, element in enumerate(elements):
+                cached = CachedElement(self, key[:3] + (i,), element)
+                self.elements[cached.key] = cached
+                found.append(cached)
+            return found
+        if index >= len(elements):
+            raise NoSuchElementException("Element %d of %s=%r is gone" % (index, by, value))
+        return CachedElement(self, key, elements[index])
@@ -0,0 +1,99 @@
+import unittest
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.remote.webelement import WebElement
+
+from parse_sauce_URL import ParseSauceURL
+from selenium_factory import Wrapper
+
+
+class FakeDriver(object):
+    """
+    Finds one element per locator; every navigation renders new element ids and makes the old ones stale.
+    """
+    session_id = 'session-1'
+
+    def __init__(self):
+        self.page = 0
+        self.items = 2
+        self.lookups = []
+
+    def get(self, url):
+        self.page += 1
+
+    def find_element(self, by='id', value=None):
+        self.lookups.append((by, value))
+        return WebElement(self, '%s-%s-%d' % (by, value, self.page))
+
+    def find_elements(self, by='id', value=None):
+        self.lookups.append((by, value))
+        return [WebElement(self, '%s-%s-%d-%d' % (by, value, i, self.page)) for i in range(self.items)]
+
+    def find_element_by_id(self, id_):
+        return self.find_element('id', id_)
+
+    def execute(self, command, params):
+        if not params['id'].endswith('-%d' % self.page):
+            raise StaleElementReferenceException("stale element reference")
+        if command == 'findChildElement':
+            self.lookups.append((params['using'], params['value']))
+            return {'value': WebElement(self, '%s-child-%d' % (params['id'], self.page))}
+        return {'value': 'text of %s' % params['id']}
+
+
+class TestElementCache(unittest.TestCase):
+    def setUp(self):
+        self.driver = FakeDriver()
+        self.wrapper = Wrapper(self.driver, ParseSauceURL("sauce-ondemand:?username=foo&access-key=bar"))
+        self.cache = self.wrapper.enable_element_cache()
+
+    def test_disabled_by_default(self):
+        wrapper = Wrapper(self.driver, ParseSauceURL("sauce-ondemand:?username=foo&access-key=bar"))
+        wrapper.find_element_by_id('cart')
+        wrapper.find_element_by_id('cart')
+        self.assertEqual(2, len(self.driver.lookups))
+
+    def test_repeated_lookups_hit_the_cache(self):
+        first = self.wrapper.find_element_by_id('cart')
+        self.assertTrue(first is self.wrapper.find_element('id', 'cart'))
+        self.assertEqual([('id', 'cart')], self.driver.lookups)
+        self.assertEqual({'hits': 1, 'misses': 1, 'invalidations': 0, 'size': 1}, self.cache.stats())
+
+    def test_find_elements_is_not_cached(self):
+        # content that an AJAX call renders after the first lookup
+        self.driver.items = 0
+        self.assertEqual([], self.wrapper.find_elements_by_css_selector('.item'))
+        self.driver.items = 3
+        items = self.wrapper.find_elements_by_css_selector('.item')
+        self.assertEqual(3, len(items))
+        self.assertEqual([('css selector', '.item')] * 2, self.driver.lookups)
+
+        # its elements are still found again once stale
+        self.driver.page += 1
+        self.assertEqual('text of css selector-.item-1-1', items[1].text)
+
+    def test_child_lookups_are_cached(self):
+        cart = self.wrapper.find_element_by_id('cart')
+        total = cart.find_element_by_class_name('total')
+        self.assertTrue(total is cart.find_element_by_class_name('total'))
+        self.assertEqual(2, len(self.driver.lookups))
+
+    def test_navigation_invalidates(self):
+        self.wrapper.find_element_by_id('cart')
+        self.wrapper.get("http://example.com/next")
+        self.wrapper.find_element_by_id('cart')
+        self.assertEqual(2, len(self.driver.lookups))
+        self.assertEqual(1, self.cache.invalidations)
+
+    def test_stale_elements_are_found_again(self):
+        cart = self.wrapper.find_element_by_id('cart')
+        self.assertEqual('text of id-cart-0', cart.text)
+        # a page change the cache didn't see, e.g. a click that navigated
+        self.driver.page += 1
+        self.assertEqual('text of id-cart-1', cart.text)
+        self.assertEqual(2, len(self.driver.lookups))
+        self.assertTrue(cart is self.wrapper.find_element_by_id('cart'))
+
+
+if __name__ == "__main__":
+    unittest.main()
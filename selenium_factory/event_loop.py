@@ -0,0 +1,587 @@
+"""
+A small single-threaded event loop for generator based coroutines, with a non-blocking keep-alive HTTP client, so
+that one thread can wait on the requests of many remote sessions at once (see async_factory).
+
+A coroutine is a generator that yields a Future, another coroutine or a list of them to wait for their results, and
+returns a value by raising Return(value).  Tasks can be cancelled: CancelledError is raised in the coroutine where
+it waits, and in the coroutines it waits for.
+
+    def status(loop, url):
+        response = yield loop.http.request('GET', url)
+        raise Return(response.status)
+
+    loop = EventLoop()
+    loop.run_until_complete(status(loop, 'http://saucelabs.com/'))
+"""
+
+import os
+import sys
+import time
+import heapq
+import errno
+import types
+import select
+import socket
+import logging
+import itertools
+import collections
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+
+# bytes asked from a socket at a time
+RECV_SIZE = 64 * 1024
+
+# errors of a kept-alive connection the server closed while it was idle
+STALE_ERRORS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+
+class CancelledError(Exception):
+    pass
+
+
+class Return(Exception):
+    def __init__(self, value=None):
+        Exception.__init__(self, value)
+        self.value = value
+
+
+class Future:
+    def __init__(self):
+        self.done = False
+        self._result = None
+        self._error = None
+        self._callbacks = []
+
+    def set_result(self, value):
+        if not self.done:
+            self._result = value
+            self._finish()
+
+    def set_exception(self, error, traceback=None):
+        if not self.done:
+            self._error = (type(error), error, traceback)
+            self._finish()
+
+    def cancel(self):
+        """
+        Fails the future with CancelledError unless it is done; returns whether it did.
+        """
+        if self.done:
+            return False
+        self.set_exception(CancelledError())
+        return True
+
+    def result(self):
+        if not self.done:
+            raise RuntimeError("The result is not ready yet")
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
+
+    def add_done_callback(self, callback):
+        if self.done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def _finish(self):
+        self.done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class Task(Future):
+    """
+    Runs a coroutine on the loop; its result is the coroutine's.
+    """
+
+    def __init__(self, loop, coroutine):
+        Future.__init__(self)
+        self.loop = loop
+        self.coroutine = coroutine
+        # the future the coroutine waits for, None while its next step is scheduled
+        self._waiting = None
+        self._must_cancel = False
+        loop.call_soon(self._step, None, None)
+
+    def cancel(self):
+        """
+        Raises CancelledError in the coroutine where it waits, and cancels what it waits for.  The coroutine may
+        catch it; the task fails with it otherwise.
+        """
+        if self.done:
+            return False
+        waiting, self._waiting = self._waiting, None
+        if waiting is None:
+            self._must_cancel = True
+        else:
+            waiting.cancel()
+            self.loop.call_soon(self._step, None, (CancelledError, CancelledError(), None))
+        return True
+
+    def _step(self, value, error):
+        if self._must_cancel:
+            self._must_cancel = False
+            value, error = None, (CancelledError, CancelledError(), None)
+        try:
+            if error is not None:
+                yielded = self.coroutine.throw(*error)
+            else:
+                yielded = self.coroutine.send(value)
+        except Return, e:
+            self.set_result(e.value)
+        except StopIteration:
+            self.set_result(None)
+        except Exception, e:
+            self.set_exception(e, sys.exc_info()[2])
+        else:
+            try:
+                future = self.loop.ensure_future(yielded)
+            except TypeError, e:
+                self.loop.call_soon(self._step, None, (TypeError, e, None))
+            else:
+                self._waiting = future
+                future.add_done_callback(self._wakeup)
+
+    def _wakeup(self, future):
+        # a future the task stopped waiting for, when it was cancelled
+        if future is not self._waiting:
+            return
+        self._waiting = None
+        # resumed from the loop rather than here, so that long chains of finished futures don't recurse
+        self.loop.call_soon(self._step, future._result, future._error)
+
+
+class _GatheringFuture(Future):
+    def __init__(self, futures):
+        Future.__init__(self)
+        self.futures = futures
+
+    def cancel(self):
+        if self.done:
+            return False
+        for future in self.futures:
+            future.cancel()
+        return Future.cancel(self)
+
+
+class Timer:
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop:
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, timeout=None):
+        self._ready = collections.deque()
+        self._timers = []
+        self._sequence = itertools.count()
+        self._readers = {}
+        self._writers = {}
+        self.http = HTTPClient(self, size=pool_size, timeout=timeout)
+
+    def call_soon(self, callback, *args):
+        self._ready.append((callback, args))
+
+    def call_later(self, delay, callback, *args):
+        timer = Timer(time.time() + delay, callback, args)
+        heapq.heappush(self._timers, (timer.when, next(self._sequence), timer))
+        return timer
+
+    def ensure_future(self, value):
+        """
+        Returns the Future for a Future, a coroutine or a list of them.
+        """
+        if isinstance(value, Future):
+            return value
+        if isinstance(value, types.GeneratorType):
+            return Task(self, value)
+        if isinstance(value, (list, tuple)):
+            return self.gather(value)
+        raise TypeError("Cannot wait for %r" % (value,))
+
+    def gather(self, values):
+        """
+        Returns a Future of the list of results of the futures or coroutines.  It fails as soon as one of them does,
+        cancelling the others, and cancelling it cancels them all.
+        """
+        futures = [self.ensure_future(value) for value in values]
+        gathered = _GatheringFuture(futures)
+        remaining = [len(futures)]
+
+        def finished(future):
+            if gathered.done:
+                return
+            if future._error is not None:
+                gathered.set_exception(future._error[1], future._error[2])
+                for other in futures:
+                    other.cancel()
+                return
+            remaining[0] -= 1
+            if not remaining[0]:
+                gathered.set_result([f._result for f in futures])
+
+        if not futures:
+            gathered.set_result([])
+        for future in futures:
+            future.add_done_callback(finished)
+        return gathered
+
+    def sleep(self, seconds):
+        future = Future()
+        self.call_later(seconds, future.set_result, None)
+        return future
+
+    def wait_readable(self, sock, timeout=None):
+        return self._wait(self._readers, sock, timeout)
+
+    def wait_writable(self, sock, timeout=None):
+        return self._wait(self._writers, sock, timeout)
+
+    def _wait(self, waiting, sock, timeout):
+        future = Future()
+        fileno = sock.fileno()
+        timer = None
+        if timeout is not None:
+            timer = self.call_later(timeout, future.set_exception, socket.timeout('timed out'))
+        waiting[fileno] = (future, timer)
+
+        def finished(future):
+            # ready, timed out or cancelled
+            if waiting.get(fileno, (None,))[0] is future:
+                del waiting[fileno]
+            if timer is not None:
+                timer.cancel()
+
+        future.add_done_callback(finished)
+        return future
+
+    def run_until_complete(self, value):
+        future = self.ensure_future(value)
+        while not future.done:
+            self._run_once()
+        return future.result()
+
+    def _run_once(self):
+        if self._ready:
+            timeout = 0
+        elif self._timers:
+            timeout = max(0, self._timers[0][0] - time.time())
+        elif self._readers or self._writers:
+            timeout = None
+        else:
+            raise RuntimeError("Nothing left to run: a coroutine waits for a Future nobody will complete")
+
+        if self._readers or self._writers:
+            try:
+                readable, writable = self._select(timeout)
+            except (select.error, IOError), e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                readable, writable = [], []
+            for fileno in readable:
+                self._ready_io(self._readers, fileno)
+            for fileno in writable:
+                self._ready_io(self._writers, fileno)
+        elif timeout:
+            time.sleep(timeout)
+
+        now = time.time()
+        while self._timers and self._timers[0][0] <= now:
+            timer = heapq.heappop(self._timers)[2]
+            if not timer.cancelled:
+                self._ready.append((timer.callback, timer.args))
+
+        for _ in range(len(self._ready)):
+            callback, args = self._ready.popleft()
+            try:
+                callback(*args)
+            except Exception:
+                LOGGER.exception("Error in event loop callback %r", callback)
+
+    def _select(self, timeout):
+        """
+        Returns the readable and writable file descriptors, with poll() where there is one: select() is limited to
+        descriptors below FD_SETSIZE.
+        """
+        if not hasattr(select, 'poll'):
+            readable, writable, _ = select.select(self._readers.keys(), self._writers.keys(), [], timeout)
+            return readable, writable
+
+        poll = select.poll()
+        events = collections.defaultdict(int)
+        for fileno in self._readers:
+            events[fileno] |= select.POLLIN
+        for fileno in self._writers:
+            events[fileno] |= select.POLLOUT
+        for fileno, mask in events.items():
+            poll.register(fileno, mask)
+        readable, writable = [], []
+        # errors and hang-ups wake both sides, which then see them on their next call
+        failed = select.POLLERR | select.POLLHUP | select.POLLNVAL
+        for fileno, event in poll.poll(None if timeout is None else timeout * 1000):
+            if event & (select.POLLIN | failed) and fileno in self._readers:
+                readable.append(fileno)
+            if event & (select.POLLOUT | failed) and fileno in self._writers:
+                writable.append(fileno)
+        return readable, writable
+
+    def _ready_io(self, waiting, fileno):
+        entry = waiting.get(fileno)
+        if entry is not None:
+            entry[0].set_result(None)
+
+
+class Response:
+    def __init__(self, status, reason, headers, data):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.data = data
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+
+class Connection:
+    """
+    A non-blocking socket with a read buffer.
+    """
+
+    def __init__(self, loop, sock, timeout):
+        self.loop = loop
+        self.sock = sock
+        self.timeout = timeout
+        self.buffer = ''
+        # bytes received since the last request was sent
+        self.received = 0
+
+    def close(self):
+        self.sock.close()
+
+    def send_all(self, data):
+        import ssl
+
+        self.received = 0
+        while data:
+            try:
+                sent = self.sock.send(data)
+            except ssl.SSLWantReadError:
+                yield self.loop.wait_readable(self.sock, self.timeout)
+            except ssl.SSLWantWriteError:
+                yield self.loop.wait_writable(self.sock, self.timeout)
+            except socket.error, e:
+                if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                yield self.loop.wait_writable(self.sock, self.timeout)
+            else:
+                data = data[sent:]
+
+    def recv(self):
+        """
+        Returns the next bytes from the socket, or '' when the server closed the connection.
+        """
+        import ssl
+
+        while True:
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except ssl.SSLWantReadError:
+                yield self.loop.wait_readable(self.sock, self.timeout)
+            except ssl.SSLWantWriteError:
+                yield self.loop.wait_writable(self.sock, self.timeout)
+            except socket.error, e:
+                if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                yield self.loop.wait_readable(self.sock, self.timeout)
+            else:
+                self.received += len(data)
+                raise Return(data)
+
+    def read_until(self, separator):
+        while separator not in self.buffer:
+            chunk = yield self.recv()
+            if not chunk:
+                raise socket.error(errno.ECONNRESET, "Connection closed by the server")
+            self.buffer += chunk
+        data, _, self.buffer = self.buffer.partition(separator)
+        raise Return(data)
+
+    def read_exactly(self, size):
+        chunks = [self.buffer]
+        received = len(self.buffer)
+        while received < size:
+            chunk = yield self.recv()
+            if not chunk:
+                raise socket.error(errno.ECONNRESET, "Connection closed by the server")
+            chunks.append(chunk)
+            received += len(chunk)
+        data = ''.join(chunks)
+        self.buffer = data[size:]
+        raise Return(data[:size])
+
+    def read_to_close(self):
+        chunks = [self.buffer]
+        while True:
+            chunk = yield self.recv()
+            if not chunk:
+                self.buffer = ''
+                raise Return(''.join(chunks))
+            chunks.append(chunk)
+
+
+class HTTPClient:
+    """
+    Sends HTTP/1.1 requests on the loop over keep-alive connections, keeping up to 'size' idle connections per host.
+    'timeout' limits, in seconds, each wait for a socket; None waits for ever, like the WebDriver client.
+    """
+
+    def __init__(self, loop, size=DEFAULT_POOL_SIZE, timeout=None):
+        self.loop = loop
+        self.size = size
+        self.timeout = timeout
+        self._idle = {}
+        self._addresses = {}
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        A coroutine that sends the request and returns the fully read Response.  Credentials in the url are sent as
+        Basic auth.  Like connection_pool, a request is only sent again, on a new connection, when a reused connection
+        turns out closed before a byte of response arrived; timeouts and cancellations are raised.
+        """
+        import urlparse
+        from connection_pool import basic_auth
+
+        parts = urlparse.urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+
+        request_headers = {'Host': parts.hostname if parts.port is None else '%s:%d' % (parts.hostname, port),
+                           'Connection': 'keep-alive'}
+        if parts.username:
+            request_headers['Authorization'] = basic_auth(parts.username, parts.password or '')
+        if body is not None:
+            request_headers['Content-Length'] = str(len(body))
+        request_headers.update(headers or {})
+        path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        data = '%s %s HTTP/1.1\r\n%s\r\n\r\n%s' % (method, path,
+                                                  '\r\n'.join('%s: %s' % item for item in request_headers.items()),
+                                                  body or '')
+
+        while True:
+            idle = self._idle.get(key)
+            reused = bool(idle)
+            connection = idle.pop() if reused else (yield self._connect(*key))
+            try:
+                yield connection.send_all(data)
+                response, will_close = yield self._read_response(connection, method)
+            except socket.timeout:
+                connection.close()
+                raise
+            except socket.error, e:
+                connection.close()
+                if reused and not connection.received and e.args[0] in STALE_ERRORS:
+                    continue
+                raise
+            except BaseException:
+                # cancelled, or a malformed response: the connection is in an unknown state
+                connection.close()
+                raise
+
+            if will_close:
+                connection.close()
+            else:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.size:
+                    idle.append(connection)
+                else:
+                    connection.close()
+            raise Return(response)
+
+    def close(self):
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle = {}
+
+    def _connect(self, scheme, host, port):
+        address = self._addresses.get((host, port))
+        if address is None:
+            # resolved once per host, blocking, like selenium's RemoteConnection
+            family, _, _, _, sockaddr = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+            address = self._addresses[(host, port)] = (family, sockaddr)
+        family, sockaddr = address
+
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(0)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        error = sock.connect_ex(sockaddr)
+        if error in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+            try:
+                yield self.loop.wait_writable(sock, self.timeout)
+            except socket.timeout:
+                sock.close()
+                raise
+            error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            sock.close()
+            raise socket.error(error, os.strerror(error))
+
+        if scheme == 'https':
+            import ssl
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host,
+                                                            do_handshake_on_connect=False)
+            while True:
+                try:
+                    sock.do_handshake()
+                    break
+                except ssl.SSLWantReadError:
+                    yield self.loop.wait_readable(sock, self.timeout)
+                except ssl.SSLWantWriteError:
+                    yield self.loop.wait_writable(sock, self.timeout)
+        raise Return(Connection(self.loop, sock, self.timeout))
+
+    def _read_response(self, connection, method):
+        while True:
+            head = yield connection.read_until('\r\n\r\n')
+            lines = head.split('\r\n')
+            version, status, reason = (lines[0].split(' ', 2) + [''])[:3]
+            status = int(status)
+            if status != 100:
+                break
+
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            headers[name] = headers[name] + ', ' + value.strip() if name in headers else value.strip()
+
+        connection_header = headers.get('connection', '').lower()
+        will_close = 'close' in connection_header or (version == 'HTTP/1.0' and 'keep-alive' not in connection_header)
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            data = ''
+        elif 'chunked' in headers.get('transfer-encoding', '').lower():
+            chunks = []
+            while True:
+                size = int((yield connection.read_until('\r\n')).split(';')[0], 16)
+                if not size:
+                    break
+                chunks.append((yield connection.read_exactly(size + 2))[:-2])
+            # trailers, up to the empty line
+            while (yield connection.read_until('\r\n')):
+                pass
+            data = ''.join(chunks)
+        elif 'content-length' in headers:
+            data = yield connection.read_exactly(int(headers['content-length']))
+        else:
+            data = yield connection.read_to_close()
+            will_close = True
+        raise Return((Response(status, reason, headers, data), will_close))
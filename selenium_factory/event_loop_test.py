@@ -0,0 +1,184 @@
+import time
+import socket
+import threading
+import unittest
+
+from event_loop import EventLoop, Return, CancelledError
+
+
+class ScriptedServer:
+    """
+    A raw TCP server that answers the requests on each connection with the next of 'responses', a list of strings
+    to send, None to close the connection, or a number of seconds to stay silent for; a tuple sends its pieces
+    0.05s apart, and closes the connection at a None.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.connections = 0
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.url = 'http://127.0.0.1:%d' % self.sock.getsockname()[1]
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self.sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.sock.accept()
+            except socket.error:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self._serve, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, connection):
+        try:
+            buffer = ''
+            while self.responses:
+                while '\r\n\r\n' not in buffer:
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        return
+                    buffer += chunk
+                head, _, buffer = buffer.partition('\r\n\r\n')
+                self.requests.append(head.split('\r\n')[0])
+                response = self.responses.pop(0)
+                if response is None:
+                    return
+                if isinstance(response, float):
+                    time.sleep(response)
+                    return
+                for piece in (response if isinstance(response, tuple) else (response,)):
+                    if piece is None:
+                        return
+                    connection.sendall(piece)
+                    if isinstance(response, tuple):
+                        time.sleep(0.05)
+        finally:
+            connection.close()
+
+
+OK = 'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'
+
+
+class TestEventLoop(unittest.TestCase):
+    def setUp(self):
+        self.loop = EventLoop(timeout=0.5)
+        self.servers = []
+
+    def tearDown(self):
+        self.loop.http.close()
+        for server in self.servers:
+            server.close()
+
+    def server(self, *responses):
+        server = ScriptedServer(responses)
+        self.servers.append(server)
+        return server
+
+    def test_sleeps_overlap(self):
+        order = []
+
+        def sleeper(name, seconds):
+            yield self.loop.sleep(seconds)
+            order.append(name)
+            raise Return(name)
+
+        start = time.time()
+        self.assertEqual(['slow', 'fast'], self.loop.run_until_complete([sleeper('slow', 0.2), sleeper('fast', 0.1)]))
+        self.assertEqual(['fast', 'slow'], order)
+        self.assertTrue(time.time() - start < 0.3)
+
+    def test_gather_fails_with_the_first_error_and_cancels_the_others(self):
+        cleaned_up = []
+
+        def slow():
+            try:
+                yield self.loop.sleep(5)
+            finally:
+                cleaned_up.append('slow')
+
+        def failing():
+            yield self.loop.sleep(0.01)
+            raise ValueError("failed")
+
+        start = time.time()
+        self.assertRaises(ValueError, self.loop.run_until_complete, [slow(), failing()])
+        self.loop.run_until_complete(self.loop.sleep(0.01))
+        self.assertEqual(['slow'], cleaned_up)
+        self.assertTrue(time.time() - start < 1)
+
+    def test_cancel(self):
+        def waiting():
+            try:
+                yield self.loop.sleep(5)
+            except CancelledError:
+                yield self.loop.sleep(0.01)
+                raise Return('cancelled')
+
+        task = self.loop.ensure_future(waiting())
+        self.loop.call_later(0.01, task.cancel)
+        self.assertEqual('cancelled', self.loop.run_until_complete(task))
+        self.assertFalse(task.cancel())
+
+        # cancelled before it ever ran
+        task = self.loop.ensure_future(waiting())
+        task.cancel()
+        self.assertRaises(CancelledError, self.loop.run_until_complete, task)
+
+    def test_response_in_pieces(self):
+        server = self.server(('HTTP/1.1 200 OK\r\nTransfer-Enc', 'oding: chunked\r\n\r\n5\r\nhel',
+                              'lo\r\n6\r\n world\r\n0\r\n', '\r\n'), OK)
+        response = self.loop.run_until_complete(self.loop.http.request('GET', server.url + '/chunked'))
+        self.assertEqual((200, 'hello world'), (response.status, response.data))
+        # the connection was kept
+        self.assertEqual('ok', self.loop.run_until_complete(self.loop.http.request('GET', server.url)).data)
+        self.assertEqual(1, server.connections)
+
+    def test_stale_connection_is_replaced(self):
+        server = self.server(OK, None, OK)
+        self.loop.run_until_complete(self.loop.http.request('GET', server.url))
+        time.sleep(0.05)
+        response = self.loop.run_until_complete(self.loop.http.request('POST', server.url, '{}'))
+        self.assertEqual('ok', response.data)
+        self.assertEqual(2, server.connections)
+
+    def test_connection_closed_mid_response_is_not_retried(self):
+        server = self.server(OK, ('HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\npartial', None), OK)
+        self.loop.run_until_complete(self.loop.http.request('GET', server.url))
+        self.assertRaises(socket.error, self.loop.run_until_complete,
+                          self.loop.http.request('POST', server.url + '/session', '{}'))
+        self.assertEqual(2, len(server.requests))
+
+    def test_timeout_is_not_retried(self):
+        server = self.server(OK, 2.0, OK)
+        self.loop.run_until_complete(self.loop.http.request('GET', server.url))
+        self.assertRaises(socket.timeout, self.loop.run_until_complete,
+                          self.loop.http.request('POST', server.url + '/session', '{}'))
+        self.assertEqual(2, len(server.requests))
+        self.assertEqual({}, self.loop._readers)
+
+    def test_cancelled_request_closes_its_connection(self):
+        server = self.server(2.0)
+
+        def failing():
+            yield self.loop.sleep(0.05)
+            raise ValueError("failed")
+
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          [self.loop.http.request('GET', server.url), failing()])
+        self.loop.run_until_complete(self.loop.sleep(0.01))
+        self.assertEqual({}, self.loop._readers)
+        self.assertEqual({}, self.loop.http._idle)
+
+
+if __name__ == "__main__":
+    unittest.main()
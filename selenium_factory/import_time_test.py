@@ -0,0 +1,29 @@
+import os
+import unittest
+
+from benchmarks import measure_import, WORKER_MODULES
+
+# what the modules a test worker imports on startup must not drag in until it is needed
+DEFERRED = ('selenium', 'httplib', 'urllib2', 'ssl', 'socket', 'hmac', 'hashlib')
+
+# seconds, for the import of one module in a fresh interpreter
+IMPORT_TIME_BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', '0.25'))
+
+
+class TestImportTime(unittest.TestCase):
+    def test_heavy_imports_are_deferred(self):
+        for module in WORKER_MODULES:
+            _, modules = measure_import(module, runs=1)
+            loaded = sorted(name for name in modules if name.split('.')[0] in DEFERRED)
+            self.assertEqual([], loaded, "%s imports %s at load time" % (module, ', '.join(loaded)))
+
+    def test_import_time(self):
+        for module in WORKER_MODULES:
+            elapsed, _ = measure_import(module)
+            self.assertLess(elapsed, IMPORT_TIME_BUDGET,
+                            "importing %s took %.3fs, budget is %.3fs" % (module, elapsed, IMPORT_TIME_BUDGET))
+
+
+if __name__ == "__main__":
+    for module in WORKER_MODULES:
+        print "%-40s %.4fs" % (module, measure_import(module)[0])
@@ -0,0 +1,138 @@
+"""
+Optional latency instrumentation: wall clock time of every WebDriver command a remote session sends, by the name of
+the wire protocol command (see command_executor), of session creation in SeleniumFactory and of every SauceRest call,
+aggregated into histograms that can be exported as JSON or in the Prometheus text format.
+
+It is off unless enable() is called or the 'SELENIUM_FACTORY_METRICS' environment variable names a directory, where
+each process writes metrics-<pid>.json and metrics-<pid>.prom when it exits.  When off, the only cost is checking
+the module level 'enabled' flag.
+"""
+
+import os
+import time
+import bisect
+import threading
+
+# upper bounds in seconds, from local commands to Sauce session startup
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120)
+
+# kinds of timings
+WEBDRIVER = 'webdriver'
+SESSION = 'session'
+SAUCE_REST = 'sauce_rest'
+
+enabled = False
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], self.cumulative()))}
+
+    def cumulative(self):
+        total, cumulative = 0, []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get((kind, name))
+            if histogram is None:
+                histogram = self.histograms[(kind, name)] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+
+    def to_json(self):
+        import json
+
+        with self._lock:
+            data = {}
+            for (kind, name), histogram in sorted(self.histograms.items()):
+                data.setdefault(kind, {})[name] = histogram.to_dict()
+        return json.dumps(data, indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        lines = ['# HELP selenium_factory_seconds Wall clock time of WebDriver commands, sessions and Sauce REST calls.',
+                 '# TYPE selenium_factory_seconds histogram']
+        with self._lock:
+            for (kind, name), histogram in sorted(self.histograms.items()):
+                labels = 'kind="%s",name="%s"' % (kind, name.replace('\\', '\\\\').replace('"', '\\"'))
+                for bound, count in zip([repr(float(bound)) for bound in BUCKETS] + ['+Inf'],
+                                        histogram.cumulative()):
+                    lines.append('selenium_factory_seconds_bucket{%s,le="%s"} %d' % (labels, bound, count))
+                lines.append('selenium_factory_seconds_sum{%s} %r' % (labels, histogram.sum))
+                lines.append('selenium_factory_seconds_count{%s} %d' % (labels, histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, directory):
+        """
+        Writes metrics-<pid>.json and metrics-<pid>.prom into the directory.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        prefix = os.path.join(directory, 'metrics-%d' % os.getpid())
+        with open(prefix + '.json', 'w') as f:
+            f.write(self.to_json())
+        with open(prefix + '.prom', 'w') as f:
+            f.write(self.to_prometheus())
+
+
+registry = Registry()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def observe(kind, name, start):
+    """
+    Records the time elapsed since 'start' (a time.time() value).
+    """
+    registry.observe(kind, name, time.time() - start)
+
+
+def timed(kind, name, function):
+    """
+    Wraps the function so that every call to it is recorded.
+    """
+    def timed_function(*args, **kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            registry.observe(kind, name, time.time() - start)
+    return timed_function
+
+
+if os.environ.get('SELENIUM_FACTORY_METRICS'):
+    import atexit
+
+    enable()
+    atexit.register(registry.write, os.environ['SELENIUM_FACTORY_METRICS'])
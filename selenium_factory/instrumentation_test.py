@@ -0,0 +1,72 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+import instrumentation
+from selenium_factory import SeleniumFactory
+from stub_server import StubServer
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        instrumentation.registry.reset()
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.registry.reset()
+        self.server.stop()
+
+    def commands(self):
+        return dict((name, histogram.count) for (kind, name), histogram in instrumentation.registry.histograms.items()
+                    if kind == instrumentation.WEBDRIVER)
+
+    def test_disabled_records_nothing(self):
+        with self.server.installed():
+            driver = SeleniumFactory().create_web_driver()
+            driver.get("http://example.com")
+            driver.quit()
+        self.assertEqual({}, instrumentation.registry.histograms)
+
+    def test_commands_are_recorded(self):
+        instrumentation.enable()
+        with self.server.installed():
+            driver = SeleniumFactory().create_web_driver()
+            driver.get("http://example.com/cart")
+            driver.find_element_by_id('checkout').click()
+            self.assertEqual('Stub page http://example.com/cart', driver.title)
+            driver.batch([('css selector', '#price', 'text')])
+            # the Wrapper's own state is not a command
+            driver.username, driver.jobName, driver.session_id
+            driver.quit()
+
+        # the starting url and the one loaded here
+        self.assertEqual({'newSession': 1, 'get': 2, 'findElement': 1, 'clickElement': 1, 'getTitle': 1,
+                          'executeScript': 1, 'quit': 1}, self.commands())
+        self.assertEqual(1, instrumentation.registry.histograms[(instrumentation.SESSION, 'create')].count)
+
+    def test_exports(self):
+        for seconds in (0.0005, 0.003, 0.003, 2):
+            instrumentation.registry.observe(instrumentation.SAUCE_REST, 'PUT', seconds)
+
+        data = json.loads(instrumentation.registry.to_json())
+        histogram = data['sauce_rest']['PUT']
+        self.assertEqual(4, histogram['count'])
+        self.assertEqual(1, histogram['buckets']['0.001'])
+        self.assertEqual(3, histogram['buckets']['0.005'])
+        self.assertEqual(4, histogram['buckets']['+Inf'])
+
+        prometheus = instrumentation.registry.to_prometheus()
+        self.assertTrue('selenium_factory_seconds_bucket{kind="sauce_rest",name="PUT",le="0.005"} 3\n' in prometheus)
+        self.assertTrue('selenium_factory_seconds_count{kind="sauce_rest",name="PUT"} 4\n' in prometheus)
+
+        directory = tempfile.mkdtemp()
+        try:
+            instrumentation.registry.write(directory)
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
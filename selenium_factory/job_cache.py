@@ -0,0 +1,105 @@
+"""
+An on-disk cache of Sauce job details, keyed by job id, for the bulk job queries of SauceRest.  Completed jobs never
+change, so they are served from the cache without a request; the others are kept with their ETag for conditional
+revalidation.  The cache is an SQLite database that every process on the machine can share.
+"""
+
+import os
+import json
+import tempfile
+import threading
+import contextlib
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'sauce_jobs.db')
+
+# job statuses after which a job never changes again
+COMPLETED = frozenset(['complete', 'error'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    etag TEXT,
+    data TEXT NOT NULL
+)
+"""
+
+
+def is_completed(job):
+    return job.get('status') in COMPLETED
+
+
+class CachedJob:
+    def __init__(self, job, etag=None):
+        self.job = job
+        self.etag = etag
+
+    @property
+    def completed(self):
+        return is_completed(self.job)
+
+
+class JobCache:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        import sqlite3
+
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute('BEGIN')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def get(self, job_id):
+        return self.get_many([job_id]).get(job_id)
+
+    def get_many(self, job_ids):
+        """
+        Returns a dict of job id -> CachedJob for the jobs in the cache.
+        """
+        job_ids = list(job_ids)
+        found = {}
+        with self._transaction() as db:
+            # stay below SQLite's default limit of 999 parameters per statement
+            for i in range(0, len(job_ids), 500):
+                chunk = job_ids[i:i + 500]
+                for job_id, etag, data in db.execute("SELECT job_id, etag, data FROM jobs WHERE job_id IN (%s)" %
+                                                     ', '.join('?' * len(chunk)), chunk):
+                    found[job_id] = CachedJob(json.loads(data), etag)
+        return found
+
+    def put(self, job, etag=None):
+        self.put_many([CachedJob(job, etag)])
+
+    def put_many(self, cached_jobs):
+        with self._transaction() as db:
+            db.executemany("INSERT OR REPLACE INTO jobs (job_id, etag, data) VALUES (?, ?, ?)",
+                           [(cached.job['id'], cached.etag, json.dumps(cached.job))
+                            for cached in cached_jobs])
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_job_cache(path=None):
+    """
+    Returns the process wide JobCache for the database at 'path', by default the one named by the 'SAUCE_JOB_CACHE'
+    environment variable, or DEFAULT_PATH.
+    """
+    path = path or os.environ.get('SAUCE_JOB_CACHE') or DEFAULT_PATH
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = JobCache(path)
+        return cache
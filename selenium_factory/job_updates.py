@@ -0,0 +1,134 @@
+"""
+This class coalesces the Sauce job updates made through a Wrapper (build number, tags, custom data, name and status)
+into one pending attribute dict per job, and sends them from a background thread as a single REST call.
+
+Pending updates are sent when their short delay expires, when the session quits or is flushed explicitly, and are
+drained when the process exits.  Failed calls are retried with a backoff.
+"""
+
+import time
+import atexit
+import logging
+import threading
+
+from sauce_rest import SauceRest
+
+LOGGER = logging.getLogger(__name__)
+
+
+class JobUpdater:
+    def __init__(self, delay=2.0, retries=3, backoff=1.0):
+        self.delay = delay
+        self.retries = retries
+        self.backoff = backoff
+
+        self._pending = {}
+        self._in_flight = set()
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def schedule(self, user, key, job_id, attributes):
+        """
+        Merges the attributes into the pending update of the job.  Later values win.
+        """
+        with self._condition:
+            update = self._pending.get(job_id)
+            if update is None:
+                update = self._pending[job_id] = {'user': user, 'key': key, 'attributes': {},
+                                                  'due': time.time() + self.delay, 'attempts': 0}
+            update['attributes'].update(attributes)
+            self._start()
+            self._condition.notify_all()
+
+    def flush(self, job_id=None, wait=True, timeout=None):
+        """
+        Sends the pending update of the job (or of every job) right away, and waits for it to be sent unless 'wait'
+        is False.  Returns False if the wait timed out.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._condition:
+            for pending_id, update in self._pending.items():
+                if job_id is None or pending_id == job_id:
+                    update['due'] = 0
+            self._condition.notify_all()
+
+            while wait and self._outstanding(job_id):
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def drain(self, timeout=30):
+        """
+        Sends every pending update before the process exits.
+        """
+        return self.flush(timeout=timeout)
+
+    def _outstanding(self, job_id):
+        if job_id is None:
+            return bool(self._pending or self._in_flight)
+        return job_id in self._pending or job_id in self._in_flight
+
+    def _start(self):
+        # must be called with self._condition held
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run)
+            self._worker.daemon = True
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._pending:
+                        # nothing left to send, schedule() starts a new worker when needed
+                        self._worker = None
+                        return
+                    now = time.time()
+                    due = [job_id for job_id, update in self._pending.items() if update['due'] <= now]
+                    if due:
+                        break
+                    timeout = min(update['due'] for update in self._pending.values()) - now
+                    self._condition.wait(timeout)
+                updates = [(job_id, self._pending.pop(job_id)) for job_id in due]
+                self._in_flight.update(due)
+
+            for job_id, update in updates:
+                self._send(job_id, update)
+
+    def _send(self, job_id, update):
+        try:
+            SauceRest(update['user'], update['key']).update(job_id, update['attributes'])
+        except Exception, e:
+            update['attempts'] += 1
+            if update['attempts'] <= self.retries:
+                with self._condition:
+                    # anything scheduled meanwhile is newer and wins over the attributes that failed
+                    newer = self._pending.get(job_id)
+                    if newer is not None:
+                        update['attributes'].update(newer['attributes'])
+                    update['due'] = time.time() + self.backoff * 2 ** (update['attempts'] - 1)
+                    self._pending[job_id] = update
+            else:
+                LOGGER.warning("Dropping Sauce update of job %s after %d attempts: %s", job_id, update['attempts'], e)
+
+        with self._condition:
+            self._in_flight.discard(job_id)
+            self._condition.notify_all()
+
+
+_job_updater = None
+_job_updater_lock = threading.Lock()
+
+
+def get_job_updater():
+    """
+    Returns the process wide JobUpdater, which is drained when the process exits.
+    """
+    global _job_updater
+    with _job_updater_lock:
+        if _job_updater is None:
+            _job_updater = JobUpdater()
+            atexit.register(_job_updater.drain)
+    return _job_updater
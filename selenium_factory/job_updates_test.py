@@ -0,0 +1,66 @@
+import time
+import unittest
+
+import job_updates
+from job_updates import JobUpdater
+
+
+class FakeSauceRest:
+    calls = []
+    failures = 0
+
+    def __init__(self, user, key):
+        self.user = user
+
+    def update(self, job_id, attributes):
+        if FakeSauceRest.failures:
+            FakeSauceRest.failures -= 1
+            raise IOError("connection reset")
+        FakeSauceRest.calls.append((job_id, dict(attributes)))
+
+
+class TestJobUpdater(unittest.TestCase):
+    def setUp(self):
+        self.sauce_rest = job_updates.SauceRest
+        job_updates.SauceRest = FakeSauceRest
+        FakeSauceRest.calls = []
+        FakeSauceRest.failures = 0
+
+    def tearDown(self):
+        job_updates.SauceRest = self.sauce_rest
+
+    def test_updates_are_coalesced(self):
+        updater = JobUpdater(delay=60)
+        updater.schedule("user", "key", "job-1", {'build': 12})
+        updater.schedule("user", "key", "job-1", {'tags': ['smoke']})
+        updater.schedule("user", "key", "job-1", {'passed': False})
+        updater.schedule("user", "key", "job-1", {'passed': True})
+        self.assertEqual([], FakeSauceRest.calls)
+        self.assertTrue(updater.flush("job-1", timeout=5))
+        self.assertEqual([("job-1", {'build': 12, 'tags': ['smoke'], 'passed': True})], FakeSauceRest.calls)
+
+    def test_updates_are_sent_after_delay(self):
+        updater = JobUpdater(delay=0.05)
+        updater.schedule("user", "key", "job-1", {'passed': True})
+        deadline = time.time() + 5
+        while not FakeSauceRest.calls and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([("job-1", {'passed': True})], FakeSauceRest.calls)
+
+    def test_failed_updates_are_retried(self):
+        FakeSauceRest.failures = 2
+        updater = JobUpdater(delay=0, backoff=0.01)
+        updater.schedule("user", "key", "job-1", {'passed': True})
+        self.assertTrue(updater.drain(timeout=5))
+        self.assertEqual([("job-1", {'passed': True})], FakeSauceRest.calls)
+
+    def test_updates_are_dropped_after_retries(self):
+        FakeSauceRest.failures = 10
+        updater = JobUpdater(delay=0, retries=1, backoff=0.01)
+        updater.schedule("user", "key", "job-1", {'passed': True})
+        self.assertTrue(updater.drain(timeout=5))
+        self.assertEqual([], FakeSauceRest.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
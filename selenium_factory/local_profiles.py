@@ -0,0 +1,310 @@
+"""
+Profiles for the local browsers SeleniumFactory falls back to when 'SELENIUM_DRIVER' is not set, to make developer
+and CI runs start and load pages faster.  A LocalProfile has these options:
+
+    browser             'firefox', or 'phantomjs' for a browser that is always headless
+    headless            run Firefox in a virtual X display (Xvfb, through the optional pyvirtualdisplay package); the
+                        Firefox versions that selenium's FirefoxDriver supports have no headless mode of their own
+    images              load images; False turns them off
+    media               autoplay audio and video; False turns it off
+    page_load_strategy  'normal', or 'eager' to return from get() once the DOM is ready
+    profile_dir         a pre-built Firefox profile directory to start from instead of an empty one
+    pool_size           keep up to this many local browsers and reuse them on quit; 0, the default, starts a new one
+                        every time.  Reuse is only as isolated as LocalBrowserPool can make it, see there
+    rc_browser          the browser string of local Selenium RC sessions
+
+'SELENIUM_LOCAL_PROFILE' picks one of PROFILES ('default' unless set), and the variables of ENVIRONMENT override
+single options; create_web_driver and create also take a profile name or LocalProfile.
+"""
+
+import os
+import atexit
+import logging
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'browser': 'firefox',
+    'headless': False,
+    'images': True,
+    'media': True,
+    'page_load_strategy': 'normal',
+    'profile_dir': None,
+    'pool_size': 0,
+    'rc_browser': '*firefox',
+}
+
+PROFILES = {
+    'default': {},
+    'fast': {'headless': True, 'images': False, 'media': False, 'page_load_strategy': 'eager'},
+}
+
+
+def _flag(value):
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# (environment variable, option, conversion)
+ENVIRONMENT = (
+    ('SELENIUM_LOCAL_BROWSER', 'browser', str),
+    ('SELENIUM_HEADLESS', 'headless', _flag),
+    ('SELENIUM_IMAGES', 'images', _flag),
+    ('SELENIUM_MEDIA', 'media', _flag),
+    ('SELENIUM_PAGE_LOAD_STRATEGY', 'page_load_strategy', str),
+    ('SELENIUM_PROFILE_DIR', 'profile_dir', str),
+    ('SELENIUM_LOCAL_POOL', 'pool_size', int),
+    ('SELENIUM_RC_BROWSER', 'rc_browser', str),
+)
+
+# page_load_strategy -> value of the legacy FirefoxDriver 'webdriver.load.strategy' preference
+LOAD_STRATEGIES = {'normal': 'conservative', 'eager': 'unstable', 'none': 'fast'}
+
+# size of the virtual display of headless Firefox
+DISPLAY_SIZE = (1280, 1024)
+
+# run in every origin a pooled browser visited before lending it again
+CLEAR_STORAGE_SCRIPT = ("try { window.localStorage.clear(); } catch (e) {}"
+                        "try { window.sessionStorage.clear(); } catch (e) {}")
+
+_display = None
+_display_lock = threading.Lock()
+
+
+def virtual_display():
+    """
+    Returns the X display name of the process wide virtual display, started on first use, or None when
+    pyvirtualdisplay is not installed.
+    """
+    global _display
+    with _display_lock:
+        if _display is None:
+            try:
+                from pyvirtualdisplay import Display
+            except ImportError:
+                LOGGER.warning("Headless Firefox needs pyvirtualdisplay and Xvfb, starting it on the current display")
+                return None
+            display = Display(visible=0, size=DISPLAY_SIZE)
+            # Display.start points this process's DISPLAY at it; only the browsers should use it
+            saved = os.environ.get('DISPLAY')
+            display.start()
+            if saved is None:
+                os.environ.pop('DISPLAY', None)
+            else:
+                os.environ['DISPLAY'] = saved
+            atexit.register(display.stop)
+            _display = display
+        return ':%s' % _display.display
+
+
+def origin(url):
+    """
+    Returns the scheme://host[:port] of an http(s) url, or None for other urls such as about:blank.
+    """
+    import urlparse
+
+    parts = urlparse.urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+    return '%s://%s' % (parts.scheme, parts.netloc.rpartition('@')[2])
+
+
+class LocalProfile:
+    def __init__(self, **options):
+        unknown = set(options) - set(DEFAULTS)
+        if unknown:
+            raise ValueError("Unknown local profile options: %s" % ', '.join(sorted(unknown)))
+        self.options = dict(DEFAULTS, **options)
+        if self.options['browser'] not in ('firefox', 'phantomjs'):
+            raise ValueError("Unsupported local browser: %r" % self.options['browser'])
+        if self.options['page_load_strategy'] not in LOAD_STRATEGIES:
+            raise ValueError("Unsupported page load strategy: %r" % self.options['page_load_strategy'])
+
+    def __getattr__(self, attr):
+        try:
+            return self.__dict__['options'][attr]
+        except KeyError:
+            raise AttributeError(attr)
+
+    def key(self):
+        return tuple(sorted(self.options.items()))
+
+    def capabilities(self):
+        from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+
+        capabilities = getattr(DesiredCapabilities, self.browser.upper()).copy()
+        capabilities['pageLoadStrategy'] = self.page_load_strategy
+        return capabilities
+
+    def firefox_profile(self):
+        from selenium.webdriver.firefox.firefox_profile import FirefoxProfile
+
+        profile = FirefoxProfile(self.profile_dir)
+        if not self.images:
+            profile.set_preference('permissions.default.image', 2)
+        if not self.media:
+            profile.set_preference('media.autoplay.enabled', False)
+            profile.set_preference('media.autoplay.default', 5)
+        profile.set_preference('webdriver.load.strategy', LOAD_STRATEGIES[self.page_load_strategy])
+        return profile
+
+    def start(self):
+        """
+        Starts a local browser with this profile.
+        """
+        from selenium import webdriver
+        from selenium.webdriver.firefox.firefox_binary import FirefoxBinary
+
+        if self.browser == 'phantomjs':
+            return webdriver.PhantomJS(desired_capabilities=self.capabilities(),
+                                       service_args=['--load-images=%s' % ('yes' if self.images else 'no')])
+
+        binary = FirefoxBinary()
+        if self.headless:
+            display = virtual_display()
+            if display is not None:
+                # FirefoxBinary has no public way to set the environment of the browser
+                binary._firefox_env['DISPLAY'] = display
+        return webdriver.Firefox(firefox_profile=self.firefox_profile(), firefox_binary=binary,
+                                 capabilities=self.capabilities())
+
+
+def resolve_profile(profile=None):
+    """
+    Returns the LocalProfile for a LocalProfile, a name of PROFILES or None, with the environment overrides applied
+    to named profiles.
+    """
+    if isinstance(profile, LocalProfile):
+        return profile
+    name = profile or os.environ.get('SELENIUM_LOCAL_PROFILE') or 'default'
+    if name not in PROFILES:
+        raise ValueError("Unknown local profile %r, expected one of %s" % (name, ', '.join(sorted(PROFILES))))
+    options = dict(PROFILES[name])
+    for variable, option, conversion in ENVIRONMENT:
+        if os.environ.get(variable):
+            options[option] = conversion(os.environ[variable])
+    return LocalProfile(**options)
+
+
+class PooledBrowser:
+    """
+    A local browser lent out by a LocalBrowserPool; quit() hands it back instead of closing it.  Keeps track of the
+    origins loaded with get(), for the pool to clear their state.
+    """
+
+    def __init__(self, pool, driver):
+        self.__dict__['pool'] = pool
+        self.__dict__['driver'] = driver
+        self.__dict__['origins'] = set()
+        self.__dict__['returned'] = False
+
+    def __getattr__(self, attr):
+        return getattr(self.driver, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.driver, attr, value)
+
+    def get(self, url):
+        visited = origin(url)
+        if visited is not None:
+            self.origins.add(visited)
+        return self.driver.get(url)
+
+    def quit(self):
+        if not self.returned:
+            self.__dict__['returned'] = True
+            self.pool.release(self.driver, self.origins)
+
+
+class LocalBrowserPool:
+    """
+    Lends out at most 'profile.pool_size' local browsers at a time, reusing the ones handed back so that only the
+    first tests pay for the browser startup.
+
+    Before a browser is lent again, the cookies, localStorage and sessionStorage of every origin it loaded with get(),
+    and of the page it was left on, are cleared, which takes a page load per origin.  Origins only reached through
+    links, redirects or frames keep their state, as do the cache and history: tests that need full isolation should
+    leave the pool off.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(profile.pool_size)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            with self._lock:
+                driver = self._idle.pop() if self._idle else None
+            if driver is None:
+                driver = self.profile.start()
+        except Exception:
+            self._slots.release()
+            raise
+        return PooledBrowser(self, driver)
+
+    def release(self, driver, origins=()):
+        try:
+            self._clear(driver, origins)
+        except Exception:
+            # a broken browser is not worth keeping
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        else:
+            with self._lock:
+                self._idle.append(driver)
+        finally:
+            self._slots.release()
+
+    def _clear(self, driver, origins):
+        origins = set(origins)
+        current = origin(driver.current_url)
+        if current is not None:
+            origins.add(current)
+        # cookies and storage can only be reached from a page of their origin; the current one goes first
+        for visited in sorted(origins, key=lambda visited: (visited != current, visited)):
+            if visited != current:
+                driver.get(visited + '/')
+                current = visited
+            driver.delete_all_cookies()
+            driver.execute_script(CLEAR_STORAGE_SCRIPT)
+        driver.get('about:blank')
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _close_pools():
+    for pool in _pools.values():
+        pool.close()
+
+
+def start_local_web_driver(profile=None):
+    """
+    Returns a local web driver for the profile (see resolve_profile), lent from the process wide pool for the profile
+    when its pool_size is set.
+    """
+    profile = resolve_profile(profile)
+    if not profile.pool_size:
+        return profile.start()
+    with _pools_lock:
+        pool = _pools.get(profile.key())
+        if pool is None:
+            if not _pools:
+                atexit.register(_close_pools)
+            pool = _pools[profile.key()] = LocalBrowserPool(profile)
+    return pool.acquire()
@@ -1,17 +1,38 @@
 # Fork from the https://github.com/smartkiwi/SeleniumFactory-for-Python
 
-import json
+import threading
+from urlparse import unquote
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+class ParseSauceURL(object):
+    """
+    Parses a 'sauce-ondemand:?key=value&...' url in one pass, percent-decoding keys and values.  Typed fields are
+    converted on first use and cached.  Instances are interned per url string, so treat them as read-only.
+    """
+
+    __slots__ = ('url', 'fields', '_typed')
+
+    def __new__(cls, url):
+        parse = _parsed.get(url)
+        if parse is None:
+            parse = object.__new__(cls)
+            parse.url = url
+            parse.fields = {}
+            parse._typed = {}
+            query = url.split(':', 1)[1] if ':' in url else url
+            for field in query.lstrip('?').split('&'):
+                if field:
+                    key, _, value = field.partition('=')
+                    parse.fields[unquote(key)] = unquote(value)
+            with _parsed_lock:
+                parse = _parsed.setdefault(url, parse)
+        return parse
 
-
-class ParseSauceURL:
     def __init__(self, url):
-        self.url = url
-
-        self.fields = {}
-        fields = self.url.split(':')[1][1:].split('&')
-        for field in fields:
-            [key, value] = field.split('=')
-            self.fields[key] = value
+        pass
 
     def get_value(self, key):
         return self.fields.get(key, "")
@@ -43,26 +64,36 @@ class ParseSauceURL:
     def get_firefox_profile_url(self):
         return self.get_value('firefox-profile-url')
 
-    def get_max_duration(self):
+    def _get_typed(self, key, convert, default):
         try:
-            return int(self.get_value('max-duration'))
-        except ValueError, _:
-            return 0
+            return self._typed[key]
+        except KeyError:
+            try:
+                value = convert(self.get_value(key))
+            except ValueError:
+                value = default
+            self._typed[key] = value
+            return value
+
+    def get_max_duration(self):
+        return self._get_typed('max-duration', int, 0)
 
     def get_idle_timeout(self):
-        try:
-            return int(self.get_value('idle-timeout'))
-        except ValueError, _:
-            return 0
+        return self._get_typed('idle-timeout', int, 0)
 
     def get_screen_resolution(self):
-        try:
-            return int(self.get_value('screen-resolution'))
-        except ValueError, _:
-            return "1024x768"
+        return self._get_typed('screen-resolution', _screen_resolution, "1024x768")
 
     def get_user_extensions_url(self):
         return self.get_value('user-extensions-url')
 
     def to_json(self):
-        return json.dumps(self.fields, sort_keys=False)
\ No newline at end of file
+        import json
+        return json.dumps(self.fields, sort_keys=False)
+
+
+def _screen_resolution(value):
+    width, _, height = value.partition('x')
+    if not (width.isdigit() and height.isdigit()):
+        raise ValueError("invalid screen resolution: %r" % value)
+    return value
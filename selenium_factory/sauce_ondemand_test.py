@@ -22,6 +22,7 @@ class TestSauceWrappers(unittest.TestCase):
         os.environ["SELENIUM_STARTING_URL"] = "http://www.amazon.com"
 
     def retrieve_job_details(self, browser):
+        browser.flush()
         sauce_rest = SauceRest(self.username, self.access_key)
         result = sauce_rest.get(browser.id())
         data = json.loads(result)
@@ -2,19 +2,74 @@
 
 """
 This class provides several helper methods to invoke the Sauce REST API.
+
+Calls are sent over a process wide pool of keep-alive connections (see connection_pool), with the Basic auth header
+computed once per user.  Job assets (screenshots, video, logs) are streamed to disk in chunks, resuming partial
+downloads, and many jobs' assets can be downloaded at once on a bounded pool of worker threads.
+
+Bulk job queries page through the jobs of the account lazily and keep job details in an on-disk cache (see
+job_cache), so that completed jobs are only ever fetched once.
 """
 
-import urllib2
+import os
 import json
-import base64
+import time
+
+import instrumentation
+from connection_pool import get_pool, basic_auth, DEFAULT_POOL_SIZE, DEFAULT_TIMEOUT
+
+# 'SAUCE_REST_URL' points the client at another server, such as stub_server
+REST_ROOT = os.environ.get('SAUCE_REST_URL', 'https://saucelabs.com/rest').rstrip('/')
+url = REST_ROOT + '/%s/%s/%s'
+users_url = REST_ROOT + '/%s/users/%s/%s'
+
+# bytes read from the network and written to disk at a time when downloading assets
+CHUNK_SIZE = 64 * 1024
+
+# jobs per page of a bulk query
+PAGE_SIZE = 500
+
+# uncached jobs of a page that are fetched one by one; with more, the whole page is fetched again with full details
+INDIVIDUAL_FETCH_LIMIT = 20
+
+
+class AssetDownload:
+    """
+    The outcome of downloading one asset: the number of bytes transferred (0 when the file was already complete),
+    or the error that stopped it.
+    """
 
-url = 'https://saucelabs.com/rest/%s/%s/%s'
+    def __init__(self, job_id, name, path, size=0, error=None):
+        self.job_id = job_id
+        self.name = name
+        self.path = path
+        self.size = size
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def asset_names(assets):
+    """
+    Returns the file names in a job's asset list (see SauceRest.get_assets), screenshots included.
+    """
+    names = []
+    for value in json.loads(assets).values():
+        for name in (value if isinstance(value, list) else [value]):
+            if isinstance(name, basestring) and name not in names:
+                names.append(name)
+    return names
 
 
 class SauceRest:
-    def __init__(self, user, key):
+    def __init__(self, user, key, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT, job_cache=None):
         self.user = user
         self.key = key
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.job_cache = job_cache
 
     def build_url(self, version, suffix):
         return url % (version, self.user, suffix)
@@ -34,17 +89,263 @@ class SauceRest:
         the_url = self.build_url("v1", "jobs/" + job_id)
         return self.invoke_get(the_url, self.user, self.key)
 
+    def get_job(self, job_id):
+        """
+        Retrieves the details of a Sauce job as a dict, through the job cache
+        """
+        return self.get_jobs([job_id])[0]
+
+    def get_jobs(self, job_ids, max_workers=DEFAULT_POOL_SIZE):
+        """
+        Retrieves the details of many Sauce jobs as dicts, in order.  Completed jobs in the job cache cost no request;
+        the others are fetched, or revalidated with their ETag, on at most 'max_workers' threads.
+        """
+        job_ids = list(job_ids)
+        cache = self._job_cache()
+        cached = cache.get_many(job_ids)
+        self._refresh(cache, cached, self._stale(job_ids, cached), max_workers)
+        return [cached[job_id].job for job_id in job_ids]
+
+    def query_jobs(self, build=None, tags=None, passed=None, start=None, end=None, limit=None, page_size=PAGE_SIZE,
+                   max_workers=DEFAULT_POOL_SIZE):
+        """
+        Yields the jobs of the account as dicts, newest first, requesting pages of job ids as they are consumed.
+        'start' and 'end' (unix times) are applied by Sauce; 'build', 'tags' (a job must have all of them) and
+        'passed' are matched locally, and 'limit' stops after that many matching jobs.
+
+        A page whose jobs are all completed and cached costs only the request for its ids.  A few other jobs are
+        fetched on their own, more than INDIVIDUAL_FETCH_LIMIT by fetching the page again with full details.
+        """
+        import urllib
+        from job_cache import CachedJob
+
+        cache = self._job_cache()
+        params = {'limit': page_size}
+        if start is not None:
+            params['from'] = int(start)
+        if end is not None:
+            params['to'] = int(end)
+        tags = set(tags or ())
+        seen = set()
+        matched = 0
+        skip = 0
+        while True:
+            params['skip'] = skip
+            page = json.loads(self.invoke_get(self.build_url("v1", "jobs?" + urllib.urlencode(sorted(params.items()))),
+                                              self.user, self.key))
+            skip += len(page)
+            # jobs started meanwhile shift the pages, so a job may be listed twice
+            job_ids = [job['id'] for job in page if job['id'] not in seen]
+            seen.update(job_ids)
+
+            cached = cache.get_many(job_ids)
+            stale = self._stale(job_ids, cached)
+            if len(stale) > INDIVIDUAL_FETCH_LIMIT:
+                full = json.loads(self.invoke_get(self.build_url("v1", "jobs?" + urllib.urlencode(
+                    sorted(dict(params, full='true').items()))), self.user, self.key))
+                fresh = [CachedJob(job) for job in full if job['id'] in stale]
+                cache.put_many(fresh)
+                cached.update((entry.job['id'], entry) for entry in fresh)
+                fetched = set(entry.job['id'] for entry in fresh)
+                stale = [job_id for job_id in stale if job_id not in fetched]
+            self._refresh(cache, cached, stale, max_workers)
+
+            for job_id in job_ids:
+                job = cached[job_id].job
+                if build is not None and job.get('build') != build:
+                    continue
+                if passed is not None and job.get('passed') != passed:
+                    continue
+                if not tags <= set(job.get('tags') or ()):
+                    continue
+                yield job
+                matched += 1
+                if limit is not None and matched >= limit:
+                    return
+            if len(page) < page_size:
+                return
+
+    def _job_cache(self):
+        if self.job_cache is None:
+            from job_cache import get_job_cache
+            self.job_cache = get_job_cache()
+        return self.job_cache
+
+    def _stale(self, job_ids, cached):
+        """
+        Returns the job ids, once each, that are not in 'cached' or may still change.
+        """
+        stale = []
+        for job_id in job_ids:
+            if (job_id not in cached or not cached[job_id].completed) and job_id not in stale:
+                stale.append(job_id)
+        return stale
+
+    def _refresh(self, cache, cached, job_ids, max_workers):
+        """
+        Fetches the jobs, revalidating the copies in 'cached', and stores them in the cache and 'cached'.
+        """
+        if not job_ids:
+            return
+        from multiprocessing.pool import ThreadPool
+        from job_cache import CachedJob
+
+        def fetch(job_id):
+            previous = cached.get(job_id)
+            headers = {}
+            if previous is not None and previous.etag:
+                headers['If-None-Match'] = previous.etag
+            response = self.request('GET', self.build_url("v1", "jobs/" + job_id), self.user, self.key,
+                                    headers=headers)
+            if response.status == 304:
+                return previous
+            return CachedJob(json.loads(response.data), response.getheader('etag'))
+
+        pool = ThreadPool(max(1, min(len(job_ids), max_workers)))
+        try:
+            fresh = pool.map(fetch, job_ids)
+        finally:
+            pool.close()
+            pool.join()
+        cache.put_many(fresh)
+        cached.update(zip(job_ids, fresh))
+
+    def get_assets(self, job_id):
+        """
+        Retrieves the list of assets (logs, video, screenshots) of a Sauce job in JSON format
+        """
+        the_url = self.build_url("v1", "jobs/%s/assets" % job_id)
+        return self.invoke_get(the_url, self.user, self.key)
+
+    def download_asset(self, job_id, name, path):
+        """
+        Streams one asset of a job to 'path' and returns the number of bytes transferred.  A partial download left
+        in 'path.part' is resumed, and nothing is transferred when 'path' already holds the whole asset.
+        """
+        import urllib
+        import urlparse
+
+        the_url = self.build_url("v1", "jobs/%s/assets/%s" % (job_id, urllib.quote(name)))
+        parts = urlparse.urlsplit(the_url)
+        pool = get_pool(parts.scheme, parts.hostname, parts.port, size=self.pool_size, timeout=self.timeout)
+
+        partial = path + '.part'
+        target = path if os.path.exists(path) else partial
+        offset = os.path.getsize(target) if os.path.exists(target) else 0
+        headers = {'Authorization': basic_auth(self.user, self.key)}
+        if offset:
+            headers['Range'] = 'bytes=%d-' % offset
+
+        start = time.time()
+        with pool.stream('GET', parts.path, headers=headers) as response:
+            if response.status == 416:
+                # nothing past 'offset': complete, unless the local file is longer than the asset
+                response.read()
+                if response.getheader('content-range', '').rpartition('/')[2] != str(offset):
+                    os.remove(target)
+                    return self.download_asset(job_id, name, path)
+                size = 0
+            elif response.status >= 400:
+                raise http_error(the_url, response.status, response.reason, response.msg, response.read())
+            elif response.status == 200 and target == path and response.getheader('content-length') == str(offset):
+                # the server ignored the range, but the sizes match
+                size = 0
+            else:
+                if response.status == 200:
+                    offset = 0
+                size = 0
+                with open(target, 'ab' if offset else 'wb') as f:
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        size += len(chunk)
+        if instrumentation.enabled:
+            instrumentation.observe(instrumentation.SAUCE_REST, 'download', start)
+
+        if target == partial:
+            os.rename(partial, path)
+        return size
+
+    def download_assets(self, job_ids, directory, names=None, max_workers=DEFAULT_POOL_SIZE):
+        """
+         Downloads the assets of every job into directory/<job id>/ on at most 'max_workers' threads, and returns an
+         AssetDownload for each of them.  'names' limits the download to these asset names when given.  A failed
+         download is reported in its AssetDownload without affecting the others.
+        """
+        from multiprocessing.pool import ThreadPool
+
+        def list_assets(job_id):
+            try:
+                found = asset_names(self.get_assets(job_id))
+            except Exception, e:
+                return [AssetDownload(job_id, None, None, error=e)]
+            job_directory = os.path.join(directory, job_id)
+            if not os.path.isdir(job_directory):
+                os.makedirs(job_directory)
+            return [AssetDownload(job_id, name, os.path.join(job_directory, name))
+                    for name in found if names is None or name in names]
+
+        def download(asset):
+            if asset.ok:
+                try:
+                    asset.size = self.download_asset(asset.job_id, asset.name, asset.path)
+                except Exception, e:
+                    asset.error = e
+            return asset
+
+        pool = ThreadPool(max(1, max_workers))
+        try:
+            assets = [asset for listed in pool.map(list_assets, job_ids) for asset in listed]
+            return pool.map(download, assets)
+        finally:
+            pool.close()
+            pool.join()
+
+    def get_concurrency(self):
+        """
+        Retrieves the concurrency limits of the Sauce account in JSON format
+        """
+        the_url = users_url % ("v1.1", self.user, "concurrency")
+        return self.invoke_get(the_url, self.user, self.key)
+
     def invoke_put(self, the_url, username, password, data):
-        request = urllib2.Request(the_url, data, {'content-type': 'application/json'})
-        base64string = base64.encodestring('%s:%s' % (username, password))[:-1]
-        request.add_header("Authorization", "Basic %s" % base64string)
-        request.get_method = lambda: 'PUT'
-        html_file = urllib2.urlopen(request)
-        return html_file.read()
+        return self.invoke('PUT', the_url, username, password, data, {'content-type': 'application/json'})
 
     def invoke_get(self, the_url, username, password):
-        request = urllib2.Request(the_url)
-        base64string = base64.encodestring('%s:%s' % (username, password))[:-1]
-        request.add_header("Authorization", "Basic %s" % base64string)
-        html_file = urllib2.urlopen(request)
-        return html_file.read()
\ No newline at end of file
+        return self.invoke('GET', the_url, username, password)
+
+    def invoke(self, method, the_url, username, password, data=None, headers=None):
+        """
+        Sends a request on a pooled connection and returns the response body.  Raises urllib2.HTTPError for error
+        responses, like urllib2.urlopen did.
+        """
+        return self.request(method, the_url, username, password, data, headers).data
+
+    def request(self, method, the_url, username, password, data=None, headers=None):
+        """
+        Like invoke, but returns the whole connection_pool.Response.
+        """
+        import urlparse
+
+        parts = urlparse.urlsplit(the_url)
+        pool = get_pool(parts.scheme, parts.hostname, parts.port, size=self.pool_size, timeout=self.timeout)
+
+        headers = dict(headers or {})
+        headers['Authorization'] = basic_auth(username, password)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        start = time.time()
+        response = pool.request(method, path, data, headers)
+        if instrumentation.enabled:
+            instrumentation.observe(instrumentation.SAUCE_REST, method, start)
+
+        if response.status >= 400:
+            raise http_error(the_url, response.status, response.reason, response.msg, response.data)
+        return response
+
+
+def http_error(the_url, status, reason, msg, data):
+    import urllib2
+    from StringIO import StringIO
+    return urllib2.HTTPError(the_url, status, reason, msg, StringIO(data))
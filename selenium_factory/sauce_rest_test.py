@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import urlparse
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import sauce_rest
+from connection_pool import get_pool
+from job_cache import JobCache
+from sauce_rest import SauceRest
+
+ASSETS = {
+    'job1': {'video.flv': 'v' * 200000, 'selenium-server.log': 'log line\n' * 100, '0000screenshot.png': 'png'},
+    'job2': {'selenium-server.log': 'other log\n'},
+}
+
+
+# newest first, like Sauce lists them
+JOBS = [{'id': 'job%03d' % i, 'status': 'in progress' if i >= 48 else 'complete', 'passed': i % 3 != 0,
+         'build': 'build-%d' % (i // 10), 'tags': ['nightly'] if i % 2 else []} for i in reversed(range(50))]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requests = []
+
+    def do_GET(self):
+        if re.match(r'/rest/v1/user/jobs(\?|/job\d{3}$)', self.path):
+            return self.jobs()
+        match = re.match(r'/rest/v1/user/jobs/(\w+)/assets(?:/(.+))?$', self.path)
+        job = ASSETS.get(match.group(1)) if match else None
+        if job is None:
+            return self.respond(404, 'Not found')
+        if match.group(2) is None:
+            assets = {'screenshots': sorted(name for name in job if name.endswith('.png'))}
+            for key, name in (('video', 'video.flv'), ('selenium-log', 'selenium-server.log')):
+                if name in job:
+                    assets[key] = name
+            return self.respond(200, json.dumps(assets))
+
+        data = job[match.group(2)]
+        Handler.requests.append((match.group(2), self.headers.getheader('range')))
+        requested = self.headers.getheader('range')
+        if requested:
+            offset = int(requested[len('bytes='):-1])
+            if offset >= len(data):
+                return self.respond(416, '', {'Content-Range': 'bytes */%d' % len(data)})
+            return self.respond(206, data[offset:], {'Content-Range': 'bytes %d-%d/%d' % (offset, len(data) - 1,
+                                                                                        len(data))})
+        self.respond(200, data)
+
+    def jobs(self):
+        Handler.requests.append(self.path)
+        path, _, query = self.path.partition('?')
+        if query:
+            params = urlparse.parse_qs(query)
+            skip, limit = int(params['skip'][0]), int(params['limit'][0])
+            page = JOBS[skip:skip + limit]
+            return self.respond(200, json.dumps(page if 'full' in params else [{'id': job['id']} for job in page]))
+
+        job = [job for job in JOBS if job['id'] == path.rpartition('/')[2]][0]
+        etag = '"%s-%s"' % (job['id'], job['status'])
+        if self.headers.getheader('if-none-match') == etag:
+            return self.respond(304, '', {'ETag': etag})
+        self.respond(200, json.dumps(job), {'ETag': etag})
+
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestCase(unittest.TestCase):
+    def setUp(self):
+        Handler.requests = []
+        self.server = Server(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = sauce_rest.url
+        sauce_rest.url = 'http://127.0.0.1:%d' % self.server.server_port + '/rest/%s/%s/%s'
+        self.directory = tempfile.mkdtemp()
+        self.rest = SauceRest('user', 'key')
+
+    def tearDown(self):
+        sauce_rest.url = self.url
+        get_pool('http', '127.0.0.1', self.server.server_port, timeout=self.rest.timeout).close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+
+class TestAssets(TestCase):
+    def read(self, job_id, name):
+        with open(os.path.join(self.directory, job_id, name), 'rb') as f:
+            return f.read()
+
+    def test_download_assets(self):
+        results = self.rest.download_assets(['job1', 'job2', 'missing'], self.directory)
+        downloaded = dict(((result.job_id, result.name), result) for result in results if result.ok)
+        self.assertEqual(4, len(downloaded))
+        for job_id, assets in ASSETS.items():
+            for name, data in assets.items():
+                self.assertEqual(data, self.read(job_id, name))
+                self.assertEqual(len(data), downloaded[(job_id, name)].size)
+        self.assertEqual(['missing'], [result.job_id for result in results if not result.ok])
+
+    def test_complete_files_are_skipped(self):
+        self.rest.download_assets(['job2'], self.directory)
+        results = self.rest.download_assets(['job2'], self.directory)
+        self.assertEqual([0], [result.size for result in results])
+        self.assertEqual([('selenium-server.log', None), ('selenium-server.log', 'bytes=10-')], Handler.requests)
+
+    def test_partial_download_is_resumed(self):
+        os.makedirs(os.path.join(self.directory, 'job1'))
+        with open(os.path.join(self.directory, 'job1', 'video.flv.part'), 'wb') as f:
+            f.write('v' * 150000)
+        results = self.rest.download_assets(['job1'], self.directory, names=['video.flv'])
+        self.assertEqual([50000], [result.size for result in results])
+        self.assertEqual(ASSETS['job1']['video.flv'], self.read('job1', 'video.flv'))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'job1', 'video.flv.part')))
+
+
+class TestJobQueries(TestCase):
+    def setUp(self):
+        TestCase.setUp(self)
+        self.rest.job_cache = JobCache(os.path.join(self.directory, 'jobs.db'))
+
+    def test_query_pages_and_filters(self):
+        jobs = list(self.rest.query_jobs(page_size=20))
+        self.assertEqual(JOBS, jobs)
+        self.assertEqual([job for job in JOBS if job['build'] == 'build-2' and 'nightly' in job['tags']],
+                         list(self.rest.query_jobs(build='build-2', tags=['nightly'], page_size=20)))
+        self.assertEqual(5, len(list(self.rest.query_jobs(passed=False, limit=5, page_size=20))))
+
+    def test_completed_jobs_are_fetched_once(self):
+        list(self.rest.query_jobs(page_size=25))
+        # two pages of ids, each fetched again in full, and the empty third page
+        self.assertEqual(5, len(Handler.requests))
+
+        Handler.requests = []
+        self.assertEqual(JOBS, list(self.rest.query_jobs(page_size=25)))
+        self.assertEqual(['/rest/v1/user/jobs/job048', '/rest/v1/user/jobs/job049'],
+                         sorted(path for path in Handler.requests if '?' not in path))
+        self.assertEqual(3, len([path for path in Handler.requests if '?' in path]))
+
+    def test_get_job_revalidates_running_jobs(self):
+        self.assertEqual(JOBS[0], self.rest.get_job('job049'))
+        self.assertEqual(JOBS[0], self.rest.get_job('job049'))
+        self.assertEqual(JOBS[-1], self.rest.get_job('job000'))
+        self.assertEqual(JOBS[-1], self.rest.get_job('job000'))
+        self.assertEqual(['/rest/v1/user/jobs/job049', '/rest/v1/user/jobs/job049', '/rest/v1/user/jobs/job000'],
+                         Handler.requests)
+
+
+if __name__ == "__main__":
+    unittest.main()
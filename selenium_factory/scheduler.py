@@ -0,0 +1,132 @@
+"""
+This class admits new Sauce sessions only up to the account's concurrency limit, so that sessions started beyond it
+wait in a local queue (FIFO, or by priority) instead of timing out in Sauce's queue inside webdriver.Remote().
+
+The limit comes from the constructor, the 'SAUCE_CONCURRENCY' environment variable, or the Sauce concurrency REST
+endpoint when neither is set (or 'SAUCE_CONCURRENCY' is 'auto').  Session starts rejected for lack of capacity are
+retried with a jittered exponential backoff.  Note that the limit is enforced per process.
+"""
+
+import os
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+CAPACITY_ERRORS = ('concurrency', 'capacity', 'too many', 'queue', 'limit reached')
+
+
+def is_capacity_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in CAPACITY_ERRORS)
+
+
+def concurrency_limit(data, user):
+    """
+    Reads the overall concurrency limit of the user out of a Sauce concurrency REST response.
+    """
+    concurrency = data.get('concurrency', data)
+    if user in concurrency:
+        concurrency = concurrency[user]
+    current = concurrency.get('current', {}).get('overall', 0)
+    remaining = concurrency.get('remaining', {}).get('overall', 0)
+    return current + remaining
+
+
+class AdmissionScheduler:
+    def __init__(self, limit=None, retries=5, backoff=2.0, max_backoff=60, fallback_limit=1):
+        if limit is None and os.environ.get('SAUCE_CONCURRENCY', 'auto') != 'auto':
+            limit = int(os.environ['SAUCE_CONCURRENCY'])
+        self.limit = limit
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.fallback_limit = fallback_limit
+
+        self.active = 0
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def admit(self, priority=0, timeout=None, sauce_rest=None):
+        """
+        Blocks until a session slot is free and it is this caller's turn: lower 'priority' values go first, equal
+        priorities in FIFO order.  Returns False if 'timeout' expired first.  Every admission needs a release().
+        """
+        if self.limit is None:
+            self._discover_limit(sauce_rest)
+
+        deadline = time.time() + timeout if timeout is not None else None
+        entry = (priority, next(self._counter))
+        with self._condition:
+            heapq.heappush(self._waiting, entry)
+            try:
+                while self._waiting[0] != entry or self.active >= self.limit:
+                    remaining = deadline - time.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+                heapq.heappop(self._waiting)
+                self.active += 1
+                return True
+            finally:
+                if entry in self._waiting:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def run(self, start, priority=0, sauce_rest=None):
+        """
+        Admits a session and calls 'start' to create it, retrying with a jittered backoff while Sauce rejects it for
+        lack of capacity.  The slot stays taken until release() is called for the session.
+        """
+        self.admit(priority, sauce_rest=sauce_rest)
+        attempt = 0
+        while True:
+            try:
+                return start()
+            except Exception, e:
+                if not is_capacity_error(e) or attempt >= self.retries:
+                    self.release()
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                LOGGER.info("Sauce is out of capacity, retrying session start in %.1fs: %s", delay, e)
+                time.sleep(delay)
+                attempt += 1
+
+    def _discover_limit(self, sauce_rest):
+        import json
+
+        limit = None
+        if sauce_rest is not None:
+            try:
+                limit = concurrency_limit(json.loads(sauce_rest.get_concurrency()), sauce_rest.user)
+            except Exception, e:
+                LOGGER.warning("Could not retrieve the Sauce concurrency limit: %s", e)
+        with self._condition:
+            if self.limit is None:
+                self.limit = limit or self.fallback_limit
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Returns the process wide AdmissionScheduler.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = AdmissionScheduler()
+    return _scheduler
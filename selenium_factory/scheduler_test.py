@@ -0,0 +1,83 @@
+import time
+import threading
+import unittest
+
+from scheduler import AdmissionScheduler, concurrency_limit, is_capacity_error
+
+
+class FakeSauceRest:
+    user = 'foobar'
+
+    def get_concurrency(self):
+        return '{"concurrency": {"foobar": {"current": {"overall": 1, "mac": 0}, ' \
+               '"remaining": {"overall": 2, "mac": 1}}}}'
+
+
+class TestAdmissionScheduler(unittest.TestCase):
+    def test_admits_up_to_limit(self):
+        scheduler = AdmissionScheduler(limit=2)
+        self.assertTrue(scheduler.admit(timeout=0.1))
+        self.assertTrue(scheduler.admit(timeout=0.1))
+        self.assertFalse(scheduler.admit(timeout=0.1))
+        scheduler.release()
+        self.assertTrue(scheduler.admit(timeout=0.1))
+        self.assertEqual(2, scheduler.active)
+
+    def test_waiters_are_admitted_by_priority(self):
+        scheduler = AdmissionScheduler(limit=1)
+        scheduler.admit()
+        order = []
+
+        def wait(name, priority):
+            scheduler.admit(priority)
+            order.append(name)
+            scheduler.release()
+
+        threads = []
+        for name, priority in (('low', 5), ('first', 0), ('second', 0)):
+            thread = threading.Thread(target=wait, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            time.sleep(0.05)
+        scheduler.release()
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(['first', 'second', 'low'], order)
+
+    def test_capacity_errors_are_retried(self):
+        scheduler = AdmissionScheduler(limit=1, backoff=0.01)
+        attempts = []
+
+        def start():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise Exception("Sauce concurrency limit reached")
+            return 'driver'
+
+        self.assertEqual('driver', scheduler.run(start))
+        self.assertEqual(3, len(attempts))
+        self.assertEqual(1, scheduler.active)
+
+    def test_other_errors_release_the_slot(self):
+        scheduler = AdmissionScheduler(limit=1)
+
+        def start():
+            raise ValueError("bad capabilities")
+
+        self.assertRaises(ValueError, scheduler.run, start)
+        self.assertEqual(0, scheduler.active)
+
+    def test_limit_from_sauce(self):
+        scheduler = AdmissionScheduler()
+        scheduler.admit(sauce_rest=FakeSauceRest())
+        self.assertEqual(3, scheduler.limit)
+
+    def test_helpers(self):
+        self.assertEqual(7, concurrency_limit({'concurrency': {'current': {'overall': 3},
+                                                               'remaining': {'overall': 4}}}, 'me'))
+        self.assertTrue(is_capacity_error(Exception("Too many concurrent sessions")))
+        self.assertFalse(is_capacity_error(Exception("element not found")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Records the screenshots of a session into a single zip archive, doing the slow part in the background: the test
+thread only fetches the base64 screenshot from the driver, while a small pool of threads hashes, decodes and writes
+it.  Identical frames, common when capturing on every step, are stored once; the manifest.json written into the
+archive on close lists every frame in capture order with its label, time and the PNG holding it.
+"""
+
+import os
+import json
+import time
+import threading
+
+DEFAULT_DIRECTORY = 'screenshots'
+
+# frames waiting for the background threads before capture() blocks, to bound the memory they hold
+MAX_PENDING = 16
+
+
+def archive_path(directory, session_id):
+    """
+    Returns <directory>/<session id>.zip, or <session id>-<n>.zip if a process that drove the session before (see
+    Wrapper.detach) left an archive.
+    """
+    path = os.path.join(directory, '%s.zip' % session_id)
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, '%s-%d.zip' % (session_id, n))
+        n += 1
+    return path
+
+
+class ScreenshotRecorder:
+    def __init__(self, path, workers=2, max_pending=MAX_PENDING):
+        from multiprocessing.pool import ThreadPool
+
+        self.path = path
+        self.frames = []
+        self.duplicates = 0
+        self._members = {}
+        self._lock = threading.Lock()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._archive = None
+        self._pool = ThreadPool(workers)
+
+    def capture(self, driver, label=None):
+        """
+        Takes a screenshot of the driver and queues it for the archive; returns the frame number.
+        """
+        data = driver.get_screenshot_as_base64()
+        return self.add(data, label)
+
+    def add(self, data, label=None):
+        """
+        Queues a base64 encoded PNG for the archive; returns the frame number.
+        """
+        self._pending.acquire()
+        with self._lock:
+            frame = {'frame': len(self.frames), 'label': label, 'time': time.time()}
+            self.frames.append(frame)
+        self._pool.apply_async(self._store, (frame, data))
+        return frame['frame']
+
+    def close(self):
+        """
+        Waits for the queued frames and completes the archive with its manifest.  Returns the archive path, or None
+        when nothing was captured.
+        """
+        self._pool.close()
+        self._pool.join()
+        with self._lock:
+            if self._archive is None:
+                return None
+            self._archive.writestr('manifest.json', json.dumps({'frames': self.frames, 'duplicates': self.duplicates},
+                                                               indent=2))
+            self._archive.close()
+        return self.path
+
+    def _store(self, frame, data):
+        try:
+            import base64
+            import hashlib
+
+            # identical frames have identical base64 text, so duplicates are found without decoding them
+            digest = hashlib.sha1(data).hexdigest()
+            with self._lock:
+                name = self._members.get(digest)
+                frame['file'] = name or '%s.png' % digest
+                if name is not None:
+                    self.duplicates += 1
+                    return
+                self._members[digest] = frame['file']
+
+            png = base64.b64decode(data)
+            with self._lock:
+                self._open().writestr(frame['file'], png)
+        except Exception, e:
+            with self._lock:
+                frame['error'] = str(e)
+        finally:
+            self._pending.release()
+
+    def _open(self):
+        # must be called with self._lock held
+        if self._archive is None:
+            import zipfile
+
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            # PNGs are compressed already
+            self._archive = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        return self._archive
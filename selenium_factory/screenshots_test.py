@@ -0,0 +1,69 @@
+import os
+import json
+import base64
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+from parse_sauce_URL import ParseSauceURL
+from screenshots import ScreenshotRecorder
+from selenium_factory import Wrapper
+
+FRAMES = ['\x89PNG first', '\x89PNG first', '\x89PNG second', '\x89PNG first']
+
+
+class ScreenshotDriver(object):
+    session_id = 'session-1'
+
+    def __init__(self):
+        self.frames = list(FRAMES)
+        self.quit_called = False
+
+    def get_screenshot_as_base64(self):
+        return base64.b64encode(self.frames.pop(0))
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestScreenshotRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_frames_are_deduplicated(self):
+        recorder = ScreenshotRecorder(os.path.join(self.directory, 'session.zip'))
+        driver = ScreenshotDriver()
+        self.assertEqual([0, 1, 2, 3], [recorder.capture(driver, label='step %d' % i) for i in range(4)])
+        path = recorder.close()
+
+        archive = zipfile.ZipFile(path)
+        manifest = json.loads(archive.read('manifest.json'))
+        self.assertEqual(2, manifest['duplicates'])
+        self.assertEqual(['step 0', 'step 1', 'step 2', 'step 3'], [frame['label'] for frame in manifest['frames']])
+        self.assertEqual(FRAMES, [archive.read(frame['file']) for frame in manifest['frames']])
+        self.assertEqual(3, len(archive.namelist()))
+
+    def test_nothing_captured(self):
+        recorder = ScreenshotRecorder(os.path.join(self.directory, 'session.zip'))
+        self.assertEqual(None, recorder.close())
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'session.zip')))
+
+    def test_wrapper_archive_is_completed_on_quit(self):
+        driver = ScreenshotDriver()
+        wrapper = Wrapper(driver, ParseSauceURL("sauce-ondemand:?username=foo&access-key=bar"))
+        wrapper.capture_screenshot('home', directory=self.directory)
+        wrapper.capture_screenshot('cart', directory=self.directory)
+        wrapper.quit()
+
+        self.assertTrue(driver.quit_called)
+        archive = zipfile.ZipFile(os.path.join(self.directory, 'session-1.zip'))
+        self.assertEqual(['home', 'cart'],
+                         [frame['label'] for frame in json.loads(archive.read('manifest.json'))['frames']])
+
+
+if __name__ == "__main__":
+    unittest.main()
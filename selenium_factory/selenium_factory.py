@@ -9,19 +9,44 @@ the Sauce job.
 """
 
 import os
-import hashlib
-import hmac
-
-from selenium import webdriver
-from selenium import selenium
+import time
 
+import instrumentation
+from dom_batch import run_batch
+from dom_waits import wait, SCRIPT_TIMEOUT_MARGIN, DEFAULT_SCRIPT_TIMEOUT
 from parse_sauce_URL import ParseSauceURL
-from sauce_rest import SauceRest
+from capabilities import compile_capabilities
+
+# selenium, the REST client and everything that starts threads are imported where they are first used, so that
+# importing the factory stays cheap for short lived test worker processes.
+
+
+def _quit_quietly(driver):
+    # ends a session that failed to get ready; the error that stopped it is the one to report
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def _lease_lost(lease):
+    # one process drives a registered session at a time: stop once another one has taken it over
+    from session_registry import SessionUnavailable
+    return SessionUnavailable("Lost the lease on session %s to another process" % lease.session_id)
 
 
 class Wrapper:
-    def __init__(self, selenium, parse, job_name=None):
+    def __init__(self, selenium, parse, job_name=None, requested_capabilities=None, scheduler=None, lease=None):
         self.__dict__['selenium'] = selenium
+        self.__dict__['element_cache'] = None
+        self.__dict__['parse'] = parse
+        self.__dict__['requested_capabilities'] = requested_capabilities or {}
+        self.__dict__['scheduler'] = scheduler
+        self.__dict__['lease'] = lease
+        self.__dict__['screenshots'] = None
+        self.__dict__['script_timeout'] = None
+        self.__dict__['created_at'] = time.time()
+        self.__dict__['last_used'] = self.created_at
         self.username = parse.get_user_name()
         self.accessKey = parse.get_access_key()
         self.jobName = job_name if job_name is not None else parse.get_job_name()
@@ -36,26 +61,123 @@ class Wrapper:
         print "\rSauceOnDemandSessionID=%s job-name=%s" % (self.id(), self.jobName)
 
     def set_build_number(self, build_number):
-        sauce_rest = SauceRest(self.username, self.accessKey)
-        sauce_rest.update(self.id(), {'build': build_number})
+        self.update_job({'build': build_number})
 
     def set_tags(self, tags):
-        sauce_rest = SauceRest(self.username, self.accessKey)
-        sauce_rest.update(self.id(), {'tags': tags})
+        self.update_job({'tags': tags})
 
     def set_custom_data(self, custom_data):
-        sauce_rest = SauceRest(self.username, self.accessKey)
-        sauce_rest.update(self.id(), {'custom-data': custom_data})
+        self.update_job({'custom-data': custom_data})
+
+    def set_job_name(self, job_name):
+        self.jobName = job_name
+        self.update_job({'name': job_name})
 
     def job_passed(self):
-        sauce_rest = SauceRest(self.username, self.accessKey)
-        sauce_rest.update(self.id(), {'passed': True})
+        self.update_job({'passed': True})
 
     def job_failed(self):
-        sauce_rest = SauceRest(self.username, self.accessKey)
-        sauce_rest.update(self.id(), {'passed': False})
+        self.update_job({'passed': False})
+
+    def update_job(self, attributes):
+        """
+        Queues a Sauce job update.  Updates are coalesced and sent in the background, see flush().
+        """
+        from job_updates import get_job_updater
+        get_job_updater().schedule(self.username, self.accessKey, self.id(), attributes)
+
+    def flush(self, wait=True, timeout=None):
+        """
+        Sends the queued Sauce job updates of this session right away.
+        """
+        from job_updates import get_job_updater
+        return get_job_updater().flush(self.id(), wait=wait, timeout=timeout)
+
+    def quit(self):
+        try:
+            if self.lease is not None and self.lease.lost:
+                raise _lease_lost(self.lease)
+            return self.selenium.quit()
+        finally:
+            self.flush(wait=False)
+            lease, self.__dict__['lease'] = self.lease, None
+            if lease is not None:
+                lease.stop()
+                # a lost session belongs to the process that took it over
+                if not lease.lost:
+                    lease.registry.remove(lease.session_id)
+            self._release_slot()
+            self.close_screenshots()
+
+    def detach(self):
+        """
+        Leaves the session running and gives up this process's lease on it in the session registry, so that another
+        worker can take it over with SeleniumFactory.attach.  The Wrapper must not be used afterwards.
+        """
+        lease, self.__dict__['lease'] = self.lease, None
+        if lease is None:
+            raise ValueError("Session %s is not in a session registry" % self.id())
+        self.flush(wait=False)
+        try:
+            if lease.lost:
+                lease.stop()
+                raise _lease_lost(lease)
+            lease.release(last_used=self._last_used())
+        finally:
+            self._release_slot()
+            self.close_screenshots()
+
+    def _last_used(self):
+        # every command of the session goes through its executor, those sent by WebElements included
+        executor = getattr(self.selenium, 'command_executor', None)
+        return max(self.last_used, getattr(executor, 'last_used', None) or 0)
+
+    def _release_slot(self):
+        # give the session slot back to the AdmissionScheduler that admitted it
+        scheduler, self.__dict__['scheduler'] = self.scheduler, None
+        if scheduler is not None:
+            scheduler.release()
+
+    def stop(self):
+        try:
+            return self.selenium.stop()
+        finally:
+            self.flush(wait=False)
+
+    def capture_screenshot(self, label=None, directory=None):
+        """
+        Takes a screenshot for the archive of this session, <directory>/<session id>.zip, and returns its frame number
+        as soon as it is fetched; decoding and writing happen in the background.  The directory defaults to the
+        'SELENIUM_SCREENSHOTS' environment variable, or 'screenshots'.  See screenshots.
+        """
+        recorder = self.screenshots
+        if recorder is None:
+            from screenshots import ScreenshotRecorder, archive_path, DEFAULT_DIRECTORY
+            directory = directory or os.environ.get('SELENIUM_SCREENSHOTS') or DEFAULT_DIRECTORY
+            recorder = self.__dict__['screenshots'] = ScreenshotRecorder(archive_path(directory, self.id()))
+        return recorder.capture(self.selenium, label)
+
+    def close_screenshots(self):
+        """
+        Waits for the screenshots in flight and completes the archive; returns its path, or None.  Called by quit.
+        """
+        recorder, self.__dict__['screenshots'] = self.screenshots, None
+        if recorder is not None:
+            return recorder.close()
+        return None
+
+    def record_test(self, test_id, duration, passed=None, browser=''):
+        """
+        Records the duration of a test that ran on this session, with its job id, in the duration history used to
+        shard suites (see durations).  Runs through browser_matrix are recorded without it.
+        """
+        from durations import get_duration_history
+        get_duration_history().record(test_id, duration, job_ids=[self.id()], passed=passed, browser=browser)
 
     def get_public_job_link(self):
+        import hashlib
+        import hmac
+
         token = hmac.new(
             "{}:{}".format(self.username, self.accessKey),
             self.id(),
@@ -64,17 +186,99 @@ class Wrapper:
 
         return "https://saucelabs.com/jobs/{}?auth={}".format(self.id(), token)
 
+    def batch(self, queries):
+        """
+        Runs a list of element lookups and property reads, e.g. ('css selector', '#price', 'text'), in a single
+        round trip and returns their results in order.  See dom_batch for the supported queries.
+        """
+        return run_batch(self.selenium, queries)
+
+    def wait_for_element(self, by, value, timeout=None, visible=False):
+        """
+        Waits in the browser until an element matches the locator (and is visible, if asked) and returns it, with a
+        single execute_async_script call.  See dom_waits.
+        """
+        return self._wait({'kind': 'element', 'by': by, 'value': value, 'visible': visible}, timeout)
+
+    def wait_for_condition(self, condition, timeout=None):
+        """
+        Waits in the browser until the javascript function body 'condition' returns a truthy value and returns it,
+        e.g. wait_for_condition("return window.jQuery && jQuery.active == 0").
+        """
+        return self._wait({'kind': 'condition', 'condition': condition}, timeout)
+
+    def wait_for_ready_state(self, state='complete', timeout=None):
+        return self._wait({'kind': 'ready_state', 'state': state}, timeout)
+
+    def _wait(self, spec, timeout):
+        # a wait is a single command, so the session's command-timeout bounds it and is the default
+        command_timeout = float(self.requested_capabilities.get('command-timeout') or 0)
+        if command_timeout:
+            limit = max(1, command_timeout - SCRIPT_TIMEOUT_MARGIN)
+            timeout = min(timeout, limit) if timeout is not None else limit
+        elif timeout is None:
+            timeout = 30
+
+        self.selenium.set_script_timeout(timeout + SCRIPT_TIMEOUT_MARGIN)
+        try:
+            return wait(self.selenium, spec, timeout)
+        finally:
+            # the test's own execute_async_script calls keep the timeout it set
+            previous = self.script_timeout
+            self.selenium.set_script_timeout(previous if previous is not None else DEFAULT_SCRIPT_TIMEOUT)
+
+    def set_script_timeout(self, time_to_wait):
+        # remembered for the waits above to put back
+        self.__dict__['script_timeout'] = time_to_wait
+        return self.selenium.set_script_timeout(time_to_wait)
+
+    def enable_element_cache(self):
+        """
+        Caches the find_element lookups made through this wrapper until the next navigation, see element_cache.  The
+        hit and miss counters are available from element_cache.stats().
+        """
+        if self.element_cache is None:
+            from element_cache import ElementCache
+            self.__dict__['element_cache'] = ElementCache(self.selenium)
+        return self.element_cache
+
+    def disable_element_cache(self):
+        self.__dict__['element_cache'] = None
+
     def get_job_link(self):
         return "https://saucelabs.com/jobs/{}".format(self.id())
 
     # automatic delegation:
     def __getattr__(self, attr):
+        lease = self.lease
+        if lease is not None and lease.lost:
+            raise _lease_lost(lease)
+        if self.element_cache is not None:
+            cached = self.element_cache.intercept(attr)
+            if cached is not None:
+                return cached
         return getattr(self.selenium, attr)
 
     def __setattr__(self, attr, value):
         return setattr(self.selenium, attr, value)
 
 
+class SessionResult:
+    """
+    The outcome of starting one of the sessions requested from SeleniumFactory.create_web_drivers: either 'driver' or
+    'error' is set.
+    """
+
+    def __init__(self, index, driver=None, error=None):
+        self.index = index
+        self.driver = driver
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
 class SeleniumFactory:
     """
       Simple interface factory to create Selenium objects, inspired by the SeleniumFactory interface
@@ -91,16 +295,34 @@ class SeleniumFactory:
       instantiate a specific driver, and instead you do {@link DriverManager#getConnection(String)}.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, scheduler=None, registry=None):
+        """
+         Remote sessions are admitted through 'scheduler', an AdmissionScheduler, to stay within the Sauce
+         concurrency limit.  Setting the 'SAUCE_CONCURRENCY' environment variable (to a number or 'auto') uses the
+         process wide one.
 
-    def create(self):
+         Remote sessions are recorded in 'registry', a SessionRegistry, so that other processes can attach to them.
+         Setting the 'SELENIUM_SESSION_REGISTRY' environment variable to the path of its database uses that one.
+        """
+        if scheduler is None and 'SAUCE_CONCURRENCY' in os.environ:
+            from scheduler import get_scheduler
+            scheduler = get_scheduler()
+        if registry is None and os.environ.get('SELENIUM_SESSION_REGISTRY'):
+            from session_registry import get_session_registry
+            registry = get_session_registry()
+        self.scheduler = scheduler
+        self.registry = registry
+
+    def create(self, local_profile=None):
         """
          Uses a driver specified by the 'SELENIUM_DRIVER' environment variable,
          and run the test against the domain specified in 'SELENIUM_URL' system property or the environment variable.
-         If no variables exist, a local Selenium driver is created.
+         If no variables exist, a local Selenium driver is created, for the browser of the local profile (see
+         local_profiles).
         """
 
+        from selenium import selenium
+
         if 'SELENIUM_STARTING_URL' not in os.environ:
             starting_url = "http://saucelabs.com"
         else:
@@ -122,15 +344,17 @@ class SeleniumFactory:
             wrapper.dump_session_id()
             return wrapper
         else:
-            driver = selenium("localhost", 4444, "*firefox", starting_url)
+            from local_profiles import resolve_profile
+            driver = selenium("localhost", 4444, resolve_profile(local_profile).rc_browser, starting_url)
             driver.start()
             return driver
 
-    def create_web_driver(self, job_name=None, show_session_id=False):
+    def create_web_driver(self, job_name=None, show_session_id=False, priority=0, local_profile=None):
         """
          Uses a driver specified by the 'SELENIUM_DRIVER' system property or the environment variable,
          and run the test against the domain specified in 'SELENIUM_STARTING_URL' system property or the environment variable.
-         If no variables exist, a local Selenium web driver is created.
+         If no variables exist, a local Selenium web driver is created with the local profile, a name or a
+         LocalProfile, by default the one chosen by the environment (see local_profiles).
         """
 
         if 'SELENIUM_STARTING_URL' not in os.environ:
@@ -140,137 +364,153 @@ class SeleniumFactory:
 
         if 'SELENIUM_DRIVER' in os.environ:
             parse = ParseSauceURL(os.environ["SELENIUM_DRIVER"])
-
-            SELENIUM_HOST = os.environ.get('SELENIUM_HOST', 'ondemand.saucelabs.com')
-            SELENIUM_PORT = os.environ.get('SELENIUM_PORT', '80')
-
-            desired_capabilities = {}
-            if parse.get_browser() == 'android':
-                desired_capabilities = webdriver.DesiredCapabilities.ANDROID
-            elif parse.get_browser() in ['googlechrome', 'chrome']:
-                desired_capabilities = webdriver.DesiredCapabilities.CHROME
-            elif parse.get_browser() == 'firefox':
-                desired_capabilities = webdriver.DesiredCapabilities.FIREFOX
-            elif parse.get_browser() == 'htmlunit':
-                desired_capabilities = webdriver.DesiredCapabilities.HTMLUNIT
-            elif parse.get_browser() in ['iexplore', 'internet explorer']:
-                desired_capabilities = webdriver.DesiredCapabilities.INTERNETEXPLORER
-            elif parse.get_browser() == 'iphone':
-                desired_capabilities = webdriver.DesiredCapabilities.IPHONE
-            elif parse.get_browser() == 'iPad':
-                desired_capabilities = webdriver.DesiredCapabilities.IPAD
-            elif parse.get_browser() == 'opera':
-                desired_capabilities = webdriver.DesiredCapabilities.OPERA
-            elif parse.get_browser() == 'safari':
-                desired_capabilities = webdriver.DesiredCapabilities.SAFARI
-            elif parse.get_browser() == 'htmlunitjs':
-                desired_capabilities = webdriver.DesiredCapabilities.HTMLUNITWITHJS
-            elif parse.get_browser() == 'phantomjs':
-                desired_capabilities = webdriver.DesiredCapabilities.PHANTOMJS
-            else:
-                desired_capabilities = webdriver.DesiredCapabilities.FIREFOX
-
-            desired_capabilities['version'] = parse.get_browser_version()
-
-            if parse.get_platform() is not "":
-                desired_capabilities['platform'] = parse.get_platform()
-            else:
-                if os.getenv('SELENIUM_PLATFORM', None) is not None:
-                    desired_capabilities['platform'] = os.environ['SELENIUM_PLATFORM']
-                else:
-                    #work around for name issues in Selenium 2
-                    if 'Windows 2003' in parse.get_os():
-                        desired_capabilities['platform'] = 'XP'
-                    elif 'Windows 2008' in parse.get_os():
-                        desired_capabilities['platform'] = 'VISTA'
-                    elif 'Linux' in parse.get_os():
-                        desired_capabilities['platform'] = 'LINUX'
-                    else:
-                        desired_capabilities['platform'] = parse.get_os()
-            if job_name is not None:
-                desired_capabilities['name'] = job_name
-            else:
-                desired_capabilities['name'] = parse.get_job_name()
-
-            #make sure the test doesn't run forever if if the test crashes
-
-            desired_capabilities['max-duration'] = os.environ.get('SELENIUM_MAX_DURATION', 300)
-            if parse.get_max_duration() != 0:
-                desired_capabilities['max-duration'] = parse.get_max_duration()
-
-            desired_capabilities['command-timeout'] = desired_capabilities['max-duration']
-
-            if 'SELENIUM_SCREEN_RESOLUTION' in os.environ:
-                desired_capabilities['screen-resolution'] = os.environ['SELENIUM_SCREEN_RESOLUTION']
-            elif parse.get_screen_resolution() != '1024x768':
-                desired_capabilities['screen-resolution'] = parse.get_screen_resolution()
-
-            desired_capabilities['idle-timeout'] = os.environ.get('SELENIUM_IDLE_TIMEOUT', 30)
-            if parse.get_idle_timeout() != 0:
-                desired_capabilities['idle-timeout'] = parse.get_idle_timeout()
-
-            if 'SELENIUM_DISABLE_POPUP_HANDLER' in os.environ:
-                disable_popup_handler_flag = os.environ['SELENIUM_DISABLE_POPUP_HANDLER']
-                if disable_popup_handler_flag.lower() == 'true' or\
-                                disable_popup_handler_flag == '1':
-                    desired_capabilities["disable-popup-handler"] = True
-
-            # additional flags
-            # https://docs.saucelabs.com/reference/test-configuration/
-            # record video option
-            if 'SELENIUM_RECORD_VIDEO' in os.environ:
-                desired_capabilities['record-video'] = os.environ['SELENIUM_RECORD_VIDEO']
-
-            # skip uploading video on passing tests
-            if 'SELENIUM_VIDEO_UPLOAD_ON_PASS' in os.environ:
-                desired_capabilities['video-upload-on-pass'] =\
-                    os.environ['SELENIUM_VIDEO_UPLOAD_ON_PASS']
-            else:
-                desired_capabilities['video-upload-on-pass'] = False
-
-            # capture html source
-            if 'SELENIUM_CAPTURE_HTML' in os.environ:
-                desired_capabilities['capture-html'] = os.environ['SELENIUM_CAPTURE_HTML']
-            else:
-                desired_capabilities['capture-html'] = False
-
-            # pass test through a specific tunnel
-            if 'SAUCE_TUNNEL_ID' in os.environ:
-                desired_capabilities['tunnel-identifier'] = os.environ['SAUCE_TUNNEL_ID']
-            else:
-                desired_capabilities['tunnel-identifier'] = None
-
-            # pass test through a specific tunnel
-            if 'SELENIUM_RECORD_SCREENSHOTS' in os.environ:
-                desired_capabilities['record-screenshots'] = os.environ['SELENIUM_RECORD_SCREENSHOTS']
-            else:
-                desired_capabilities['record-screenshots'] = True
-
-            # support timezone
-            if parse.get_timezone() is not "":
-                desired_capabilities['time-zone'] = parse.get_timezone()
-            else:
-                if os.getenv('SELENIUM_TIMEZONE', None) is not None:
-                    desired_capabilities['time-zone'] = os.environ['SELENIUM_TIMEZONE']
-                else:
-                    desired_capabilities['time-zone'] = 'Pacific'
-
-            if 'SELENIUM_NO_NATIVE_EVENTS' in os.environ:
-                desired_capabilities['nativeEvents'] = False
-
-            command_executor = "http://%s:%s@%s:%s/wd/hub" % (parse.get_user_name(),
-                                                              parse.get_access_key(),
-                                                              SELENIUM_HOST,
-                                                              SELENIUM_PORT)
-
-            driver = webdriver.Remote(desired_capabilities=desired_capabilities,
-                                      command_executor=command_executor)
-
-            wrapper = Wrapper(selenium=driver, parse=parse, job_name=job_name)
-
-            if show_session_id:
-                wrapper.dump_session_id()
-            wrapper.get(starting_url)
+            wrapper = self.start_remote_web_driver(parse, job_name=job_name, priority=priority)
+            try:
+                if show_session_id:
+                    wrapper.dump_session_id()
+                wrapper.get(starting_url)
+            except Exception:
+                # quitting gives the session's slot back to the scheduler
+                _quit_quietly(wrapper)
+                raise
             return wrapper
         else:
-            return webdriver.Firefox()
+            from local_profiles import start_local_web_driver
+            return start_local_web_driver(local_profile)
+
+    def create_web_drivers(self, count, job_name=None, show_session_id=False, max_workers=8):
+        """
+         Starts 'count' web driver sessions concurrently on at most 'max_workers' threads, and yields a SessionResult
+         for each of them as soon as it is ready.  A session that fails to start is reported in its SessionResult
+         without affecting the others.
+        """
+        from multiprocessing.pool import ThreadPool
+
+        def create(index):
+            try:
+                return SessionResult(index, driver=self.create_web_driver(job_name=job_name,
+                                                                          show_session_id=show_session_id))
+            except Exception, e:
+                return SessionResult(index, error=e)
+
+        pool = ThreadPool(max(1, min(count, max_workers)))
+        results = pool.imap_unordered(create, range(count))
+        pool.close()
+        consumed = 0
+        try:
+            for result in results:
+                consumed += 1
+                yield result
+        finally:
+            # the caller stopped early, don't leak the sessions it will never see
+            if consumed < count:
+                for result in results:
+                    if result.ok:
+                        try:
+                            result.driver.quit()
+                        except Exception:
+                            pass
+            pool.join()
+
+    create_many = create_web_drivers
+
+    def create_session_pool(self, size=2, job_name=None, **kwargs):
+        """
+         Creates a SessionPool that keeps 'size' pre-started remote web driver sessions per
+         'SELENIUM_DRIVER' url, so tests can skip the Sauce session startup.
+        """
+        from session_pool import SessionPool
+        return SessionPool(self, size=size, job_name=job_name, **kwargs)
+
+    def start_remote_web_driver(self, parse, job_name=None, priority=0):
+        """
+         Starts a new remote web driver session for the given ParseSauceURL and returns it wrapped,
+         without loading the starting url.  With a scheduler, the session waits for a free slot with the given
+         priority (lower goes first).
+        """
+
+        SELENIUM_HOST = os.environ.get('SELENIUM_HOST', 'ondemand.saucelabs.com')
+        SELENIUM_PORT = os.environ.get('SELENIUM_PORT', '80')
+
+        profile = compile_capabilities(parse.url)
+        if job_name is not None:
+            desired_capabilities = profile.capabilities(name=job_name)
+        else:
+            desired_capabilities = profile.capabilities()
+
+        hub_url = "http://%s:%s@%s:%s/wd/hub" % (parse.get_user_name(),
+                                                 parse.get_access_key(),
+                                                 SELENIUM_HOST,
+                                                 SELENIUM_PORT)
+        command_executor = self._command_executor(hub_url)
+
+        from selenium import webdriver
+
+        def start():
+            return webdriver.Remote(desired_capabilities=desired_capabilities,
+                                    command_executor=command_executor)
+
+        instrumented = instrumentation.enabled
+        if instrumented:
+            # 'start' times each session start, 'create' includes waiting for the scheduler and retries
+            start = instrumentation.timed(instrumentation.SESSION, 'start', start)
+            created = time.time()
+
+        if self.scheduler is not None:
+            from sauce_rest import SauceRest
+            sauce_rest = SauceRest(parse.get_user_name(), parse.get_access_key())
+            driver = self.scheduler.run(start, priority=priority, sauce_rest=sauce_rest)
+        else:
+            driver = start()
+
+        if instrumented:
+            instrumentation.observe(instrumentation.SESSION, 'create', created)
+
+        try:
+            from durations import note_job
+            note_job(driver.session_id)
+
+            lease = None
+            if self.registry is not None:
+                lease = self.registry.register(driver.session_id, parse.url, hub_url, driver.capabilities,
+                                               desired_capabilities)
+        except Exception:
+            # without a Wrapper nobody can quit the session or give its slot back
+            _quit_quietly(driver)
+            if self.scheduler is not None:
+                self.scheduler.release()
+            raise
+        return Wrapper(selenium=driver, parse=parse, job_name=job_name,
+                       requested_capabilities=desired_capabilities, scheduler=self.scheduler, lease=lease)
+
+    def attach(self, session_id, job_name=None):
+        """
+         Takes over a running remote session recorded in the session registry, typically by another process that
+         detached from it, and returns it wrapped without starting a new session.  Raises
+         session_registry.SessionUnavailable if the session is unknown, expired or still leased by another process.
+        """
+        from session_registry import get_session_registry
+        from command_executor import AttachedRemote
+
+        registry = self.registry if self.registry is not None else get_session_registry()
+        record, lease = registry.acquire(session_id)
+        try:
+            driver = AttachedRemote(self._command_executor(record.command_executor), session_id,
+                                    record.capabilities)
+        except Exception:
+            lease.release()
+            raise
+        wrapper = Wrapper(selenium=driver, parse=ParseSauceURL(record.driver_url), job_name=job_name,
+                          requested_capabilities=record.requested_capabilities, lease=lease)
+        wrapper.__dict__['last_used'] = record.last_used
+
+        from durations import note_job
+        note_job(session_id)
+        return wrapper
+
+    def _command_executor(self, hub_url):
+        from command_executor import PooledRemoteConnection
+
+        # keep-alive connections shared by every session of the process
+        socket_timeout = os.environ.get('SELENIUM_SOCKET_TIMEOUT')
+        return PooledRemoteConnection(hub_url, timeout=float(socket_timeout) if socket_timeout else None)
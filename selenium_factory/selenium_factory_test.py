@@ -0,0 +1,188 @@
+import time
+import threading
+import unittest
+
+from selenium.common.exceptions import TimeoutException
+
+from dom_batch import Query, BATCH_SCRIPT
+from dom_waits import WAIT_SCRIPT
+from parse_sauce_URL import ParseSauceURL
+from selenium_factory import SeleniumFactory, Wrapper
+
+
+class FakeDriver(object):
+    def __init__(self, index):
+        self.index = index
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeFactory(SeleniumFactory):
+    def __init__(self, delay=0.2, failing=()):
+        SeleniumFactory.__init__(self)
+        self.delay = delay
+        self.failing = failing
+        self.started = []
+        self.lock = threading.Lock()
+
+    def create_web_driver(self, job_name=None, show_session_id=False):
+        with self.lock:
+            index = len(self.started)
+            driver = FakeDriver(index)
+            self.started.append(driver)
+        time.sleep(self.delay)
+        if index in self.failing:
+            raise RuntimeError("session %d failed" % index)
+        return driver
+
+
+class TestCreateWebDrivers(unittest.TestCase):
+    def test_sessions_start_concurrently(self):
+        factory = FakeFactory(delay=0.2)
+        start = time.time()
+        results = list(factory.create_web_drivers(8, max_workers=8))
+        self.assertLess(time.time() - start, 1.0)
+        self.assertEqual(range(8), sorted(result.index for result in results))
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_failures_are_reported_per_session(self):
+        factory = FakeFactory(delay=0, failing=(1,))
+        results = list(factory.create_web_drivers(4, max_workers=1))
+        failed = [result for result in results if not result.ok]
+        self.assertEqual(1, len(failed))
+        self.assertTrue(isinstance(failed[0].error, RuntimeError))
+        self.assertEqual(3, len([result for result in results if result.driver is not None]))
+        self.assertFalse(any(driver.quit_called for driver in factory.started))
+
+    def test_abandoned_sessions_are_quit(self):
+        factory = FakeFactory(delay=0)
+        results = factory.create_web_drivers(4, max_workers=2)
+        first = next(results)
+        results.close()
+        self.assertFalse(first.driver.quit_called)
+        self.assertEqual(3, len([driver for driver in factory.started if driver.quit_called]))
+
+
+class TestAdmissionSlots(unittest.TestCase):
+    """
+    A session that fails after the scheduler admitted it gives its slot back.
+    """
+
+    def setUp(self):
+        from scheduler import AdmissionScheduler
+        from stub_server import StubServer
+
+        self.scheduler = AdmissionScheduler(limit=1)
+        self.server = StubServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_failed_navigation(self):
+        from selenium.common.exceptions import WebDriverException
+
+        class Factory(SeleniumFactory):
+            def start_remote_web_driver(self, parse, job_name=None, priority=0):
+                wrapper = SeleniumFactory.start_remote_web_driver(self, parse, job_name, priority)
+
+                def get(url):
+                    raise WebDriverException("page did not load")
+                wrapper.selenium.get = get
+                return wrapper
+
+        with self.server.installed():
+            self.assertRaises(WebDriverException, Factory(scheduler=self.scheduler).create_web_driver)
+            self.assertEqual(0, self.scheduler.active)
+            self.assertEqual({}, self.server.sessions)
+            SeleniumFactory(scheduler=self.scheduler).create_web_driver().quit()
+
+    def test_failed_registration(self):
+        class Registry:
+            def register(self, *args):
+                raise IOError("database is locked")
+
+        with self.server.installed():
+            factory = SeleniumFactory(scheduler=self.scheduler, registry=Registry())
+            self.assertRaises(IOError, factory.create_web_driver)
+            self.assertEqual(0, self.scheduler.active)
+            self.assertEqual({}, self.server.sessions)
+
+
+class ScriptDriver(object):
+    session_id = 'session-1'
+
+    def __init__(self, wait_result=('ok', 'element-1')):
+        self.scripts = []
+        self.script_timeouts = []
+        self.wait_result = wait_result
+
+    def execute_script(self, script, *args):
+        self.scripts.append((script, args))
+        return ['12.99', 3]
+
+    def execute_async_script(self, script, *args):
+        self.scripts.append((script, args))
+        return list(self.wait_result)
+
+    def set_script_timeout(self, time_to_wait):
+        self.script_timeouts.append(time_to_wait)
+
+
+class TestWrapperBatch(unittest.TestCase):
+    def test_batch_is_one_round_trip(self):
+        driver = ScriptDriver()
+        wrapper = Wrapper(driver, ParseSauceURL("sauce-ondemand:?username=foo&access-key=bar"))
+        results = wrapper.batch([('css selector', '#price', 'text'),
+                                 Query('class name', 'item', 'count')])
+        self.assertEqual(['12.99', 3], results)
+        self.assertEqual(1, len(driver.scripts))
+        script, args = driver.scripts[0]
+        self.assertEqual(BATCH_SCRIPT, script)
+        self.assertEqual([{'by': 'css selector', 'value': '#price', 'read': 'text', 'all': False},
+                          {'by': 'class name', 'value': 'item', 'read': 'count', 'all': False}], args[0])
+
+    def test_query_reads(self):
+        self.assertEqual('property:value', Query('id', 'qty', 'value').read)
+        self.assertEqual('attribute:href', Query('link text', 'Cart', 'attribute:href').read)
+        self.assertRaises(ValueError, Query, 'id', 'qty', 'colour')
+
+
+class TestWrapperWaits(unittest.TestCase):
+    def wrapper(self, driver, command_timeout=300):
+        return Wrapper(driver, ParseSauceURL("sauce-ondemand:?username=foo&access-key=bar"),
+                       requested_capabilities={'command-timeout': command_timeout})
+
+    def test_wait_for_element(self):
+        driver = ScriptDriver()
+        wrapper = self.wrapper(driver)
+        self.assertEqual('element-1', wrapper.wait_for_element('css selector', '#cart', timeout=10))
+        self.assertEqual('element-1', wrapper.wait_for_element('css selector', '#cart', timeout=10))
+        script, args = driver.scripts[0]
+        self.assertEqual(WAIT_SCRIPT, script)
+        self.assertEqual('element', args[0]['kind'])
+        self.assertEqual(10000, args[0]['timeout'])
+        # and the session's timeout is put back after every wait
+        self.assertEqual([15, 0, 15, 0], driver.script_timeouts)
+
+    def test_wait_keeps_the_tests_script_timeout(self):
+        driver = ScriptDriver(wait_result=('timeout', None))
+        wrapper = self.wrapper(driver)
+        wrapper.set_script_timeout(7)
+        self.assertRaises(TimeoutException, wrapper.wait_for_element, 'css selector', '#cart', timeout=10)
+        self.assertEqual([7, 15, 7], driver.script_timeouts)
+
+    def test_timeout_is_bounded_by_command_timeout(self):
+        driver = ScriptDriver()
+        self.wrapper(driver, command_timeout=60).wait_for_ready_state()
+        self.assertEqual(55000, driver.scripts[0][1][0]['timeout'])
+        self.assertEqual([60, 0], driver.script_timeouts)
+
+    def test_wait_timeout_raises(self):
+        wrapper = self.wrapper(ScriptDriver(wait_result=('timeout', None)))
+        self.assertRaises(TimeoutException, wrapper.wait_for_condition, "return false", 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
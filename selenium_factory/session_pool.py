@@ -0,0 +1,254 @@
+"""
+This class keeps a number of pre-started remote web driver sessions per capability set (i.e. per 'SELENIUM_DRIVER'
+url) and hands them out to tests, so a test never has to wait for a Sauce session to start.
+
+Sessions are reset when they are released (cookies and storage are cleared and the starting url is loaded again),
+evicted when they failed, stopped answering or are close to their 'max-duration'/'idle-timeout', and replenished
+from background threads.
+
+Note that a pooled session is a single Sauce job shared by every test that used it.
+"""
+
+import os
+import time
+import threading
+import collections
+from contextlib import contextmanager
+
+from parse_sauce_URL import ParseSauceURL
+
+RESET_STORAGE_SCRIPT = """
+try { window.localStorage && window.localStorage.clear(); } catch (e) {}
+try { window.sessionStorage && window.sessionStorage.clear(); } catch (e) {}
+"""
+
+
+class SessionPool:
+    def __init__(self, factory, size=2, job_name=None, starting_url=None, expiry_margin=30, interval=5,
+                 show_session_id=False):
+        self.factory = factory
+        self.size = size
+        self.job_name = job_name
+        self.starting_url = starting_url or os.environ.get('SELENIUM_STARTING_URL', "http://saucelabs.com")
+        self.expiry_margin = expiry_margin
+        self.interval = interval
+        self.show_session_id = show_session_id
+
+        self._idle = {}
+        self._starting = {}
+        self._errors = {}
+        self._condition = threading.Condition()
+        self._housekeeper = None
+        self._closed = False
+
+    def warm(self, driver_url=None):
+        """
+        Starts sessions in the background until the pool holds 'size' idle sessions for the driver url.
+        """
+        driver_url = self._driver_url(driver_url)
+        with self._condition:
+            self._replenish(driver_url)
+
+    def acquire(self, driver_url=None, job_name=None, timeout=None):
+        """
+        Hands out an idle session for the driver url (defaults to 'SELENIUM_DRIVER'), waiting up to 'timeout'
+        seconds for one to be started if the pool is empty.
+        """
+        driver_url = self._driver_url(driver_url)
+        deadline = time.time() + timeout if timeout is not None else None
+        expired = []
+
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SessionPool is closed")
+                idle = self._idle.setdefault(driver_url, collections.deque())
+                wrapper = None
+                while idle and wrapper is None:
+                    wrapper = idle.popleft()
+                    if self._expiring(wrapper):
+                        expired.append(wrapper)
+                        wrapper = None
+                if wrapper is None and not self._starting.get(driver_url) and driver_url in self._errors:
+                    raise self._errors.pop(driver_url)
+                self._replenish(driver_url)
+                if wrapper is not None:
+                    break
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError("Timed out waiting for a session from the SessionPool")
+                self._condition.wait(remaining)
+
+        for stale in expired:
+            self._discard(stale)
+
+        wrapper.__dict__['last_used'] = time.time()
+        if job_name is not None and job_name != wrapper.jobName:
+            wrapper.set_job_name(job_name)
+        return wrapper
+
+    def release(self, wrapper, failed=False):
+        """
+        Returns a session to the pool.  The session is reset in the background, and evicted instead when 'failed'
+        is set or it is close to expiring.
+        """
+        wrapper.__dict__['last_used'] = time.time()
+        thread = threading.Thread(target=self._recycle, args=(wrapper, failed))
+        thread.daemon = True
+        thread.start()
+
+    @contextmanager
+    def session(self, driver_url=None, job_name=None, timeout=None):
+        wrapper = self.acquire(driver_url, job_name=job_name, timeout=timeout)
+        try:
+            yield wrapper
+        finally:
+            self.release(wrapper)
+
+    def close(self):
+        """
+        Quits every idle session.  Sessions still being started or reset are quit as soon as they are done.
+        """
+        with self._condition:
+            self._closed = True
+            idle = [wrapper for sessions in self._idle.values() for wrapper in sessions]
+            self._idle.clear()
+            self._condition.notify_all()
+        for wrapper in idle:
+            self._discard(wrapper)
+
+    def _driver_url(self, driver_url):
+        if driver_url is None:
+            driver_url = os.environ.get('SELENIUM_DRIVER')
+        if not driver_url:
+            raise ValueError("SessionPool needs a 'SELENIUM_DRIVER' url")
+        return driver_url
+
+    def _expiring(self, wrapper, now=None):
+        now = now if now is not None else time.time()
+        capabilities = wrapper.requested_capabilities
+        for limit, since in ((capabilities.get('max-duration'), wrapper.created_at),
+                             (capabilities.get('idle-timeout'), wrapper.last_used)):
+            limit = int(limit or 0)
+            if limit and now - since >= limit - min(self.expiry_margin, limit / 4.0):
+                return True
+        return False
+
+    def _keepalive_after(self, wrapper):
+        idle_timeout = int(wrapper.requested_capabilities.get('idle-timeout') or 0)
+        return idle_timeout / 2.0 if idle_timeout else 60
+
+    def _replenish(self, driver_url):
+        # must be called with self._condition held
+        idle = self._idle.setdefault(driver_url, collections.deque())
+        starting = self._starting.setdefault(driver_url, 0)
+        for _ in range(self.size - len(idle) - starting):
+            self._starting[driver_url] += 1
+            thread = threading.Thread(target=self._start_session, args=(driver_url,))
+            thread.daemon = True
+            thread.start()
+        if self._housekeeper is None:
+            self._housekeeper = threading.Thread(target=self._housekeep)
+            self._housekeeper.daemon = True
+            self._housekeeper.start()
+
+    def _start_session(self, driver_url):
+        wrapper = None
+        try:
+            wrapper = self.factory.start_remote_web_driver(ParseSauceURL(driver_url), job_name=self.job_name)
+            if self.show_session_id:
+                wrapper.dump_session_id()
+            wrapper.get(self.starting_url)
+        except Exception, e:
+            if wrapper is not None:
+                # quitting gives the session's slot back to the scheduler
+                self._discard(wrapper)
+            with self._condition:
+                self._starting[driver_url] -= 1
+                self._errors[driver_url] = e
+                self._condition.notify_all()
+            return
+
+        wrapper.__dict__['last_used'] = time.time()
+        with self._condition:
+            self._starting[driver_url] -= 1
+            self._errors.pop(driver_url, None)
+            if not self._closed:
+                self._idle[driver_url].append(wrapper)
+                self._condition.notify_all()
+                return
+        self._discard(wrapper)
+
+    def _recycle(self, wrapper, failed):
+        if not failed and not self._expiring(wrapper):
+            try:
+                wrapper.delete_all_cookies()
+                wrapper.execute_script(RESET_STORAGE_SCRIPT)
+                wrapper.get(self.starting_url)
+            except Exception:
+                failed = True
+            else:
+                wrapper.__dict__['last_used'] = time.time()
+                driver_url = wrapper.parse.url
+                with self._condition:
+                    idle = self._idle.setdefault(driver_url, collections.deque())
+                    if not self._closed and len(idle) < self.size:
+                        idle.append(wrapper)
+                        self._condition.notify_all()
+                        return
+        self._discard(wrapper)
+        with self._condition:
+            if not self._closed:
+                self._replenish(wrapper.parse.url)
+
+    def _housekeep(self):
+        """
+        Evicts idle sessions that are about to expire, and keeps the others alive with a cheap command before Sauce
+        considers them idle.
+        """
+        while True:
+            time.sleep(self.interval)
+            now = time.time()
+            with self._condition:
+                if self._closed:
+                    return
+                expired, stale = [], []
+                for driver_url, idle in self._idle.items():
+                    for wrapper in list(idle):
+                        if self._expiring(wrapper, now + self.interval):
+                            expired.append(wrapper)
+                        elif now - wrapper.last_used >= self._keepalive_after(wrapper):
+                            stale.append(wrapper)
+                        else:
+                            continue
+                        idle.remove(wrapper)
+
+            for wrapper in expired:
+                self._discard(wrapper)
+            for wrapper in stale:
+                try:
+                    wrapper.current_url
+                except Exception:
+                    self._discard(wrapper)
+                    continue
+                self._recycle_idle(wrapper)
+
+            with self._condition:
+                for driver_url in self._idle.keys():
+                    if not self._closed:
+                        self._replenish(driver_url)
+
+    def _recycle_idle(self, wrapper):
+        wrapper.__dict__['last_used'] = time.time()
+        with self._condition:
+            if not self._closed:
+                self._idle[wrapper.parse.url].append(wrapper)
+                self._condition.notify_all()
+                return
+        self._discard(wrapper)
+
+    def _discard(self, wrapper):
+        try:
+            wrapper.quit()
+        except Exception:
+            pass
@@ -0,0 +1,114 @@
+import time
+import unittest
+
+from parse_sauce_URL import ParseSauceURL
+from selenium_factory import Wrapper
+from session_pool import SessionPool
+
+DRIVER_URL = "sauce-ondemand:?username=foobar&access-key=1234&job-name=pool test&os=Linux&browser=firefox" \
+             "&browser-version=7&idle-timeout=90"
+
+
+class FakeDriver(object):
+    count = 0
+
+    def __init__(self):
+        FakeDriver.count += 1
+        self.session_id = "session-%d" % FakeDriver.count
+        self.commands = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.commands.append(('get', url))
+
+    def delete_all_cookies(self):
+        self.commands.append(('delete_all_cookies',))
+
+    def execute_script(self, script, *args):
+        self.commands.append(('execute_script',))
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeFactory:
+    def __init__(self, fail=False, max_duration=300, fail_get=False):
+        self.fail = fail
+        self.max_duration = max_duration
+        self.fail_get = fail_get
+        self.started = []
+
+    def start_remote_web_driver(self, parse, job_name=None):
+        if self.fail:
+            raise RuntimeError("no capacity")
+        driver = FakeDriver()
+        if self.fail_get:
+            def get(url):
+                raise RuntimeError("page did not load")
+            driver.get = get
+        wrapper = Wrapper(driver, parse, job_name=job_name,
+                          requested_capabilities={'max-duration': self.max_duration, 'idle-timeout': 90})
+        self.started.append(wrapper)
+        return wrapper
+
+
+def wait_for(predicate, timeout=2):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+class TestSessionPool(unittest.TestCase):
+    def test_warm_and_acquire(self):
+        factory = FakeFactory()
+        pool = SessionPool(factory, size=2, starting_url="http://example.com")
+        pool.warm(DRIVER_URL)
+        self.assertTrue(wait_for(lambda: len(pool._idle[DRIVER_URL]) == 2))
+
+        wrapper = pool.acquire(DRIVER_URL)
+        self.assertEqual(('get', "http://example.com"), wrapper.selenium.commands[-1])
+        # the pool is topped up again behind the session we took
+        self.assertTrue(wait_for(lambda: len(factory.started) == 3))
+        pool.close()
+
+    def test_release_resets_session(self):
+        factory = FakeFactory()
+        pool = SessionPool(factory, size=1, starting_url="http://example.com")
+        wrapper = pool.acquire(DRIVER_URL, timeout=2)
+        pool.release(wrapper)
+        self.assertTrue(wait_for(lambda: ('delete_all_cookies',) in wrapper.selenium.commands))
+        self.assertTrue(wait_for(lambda: wrapper.selenium.commands[-1] == ('get', "http://example.com")))
+        pool.close()
+        self.assertTrue(wait_for(lambda: wrapper.selenium.quit_called))
+
+    def test_failed_session_is_evicted(self):
+        pool = SessionPool(FakeFactory(), size=1)
+        wrapper = pool.acquire(DRIVER_URL, timeout=2)
+        pool.release(wrapper, failed=True)
+        self.assertTrue(wait_for(lambda: wrapper.selenium.quit_called))
+        pool.close()
+
+    def test_expiring_session_is_evicted(self):
+        factory = FakeFactory(max_duration=300)
+        pool = SessionPool(factory, size=1, expiry_margin=30)
+        wrapper = factory.start_remote_web_driver(ParseSauceURL(DRIVER_URL))
+        self.assertFalse(pool._expiring(wrapper))
+        wrapper.__dict__['created_at'] -= 280
+        self.assertTrue(pool._expiring(wrapper))
+
+    def test_start_failure_is_raised(self):
+        pool = SessionPool(FakeFactory(fail=True), size=1)
+        self.assertRaises(RuntimeError, pool.acquire, DRIVER_URL, timeout=2)
+        pool.close()
+
+    def test_session_that_fails_to_load_is_quit(self):
+        factory = FakeFactory(fail_get=True)
+        pool = SessionPool(factory, size=1, starting_url="http://example.com")
+        self.assertRaises(RuntimeError, pool.acquire, DRIVER_URL, timeout=2)
+        self.assertTrue(wait_for(lambda: factory.started and factory.started[0].selenium.quit_called))
+        pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
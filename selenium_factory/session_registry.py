@@ -0,0 +1,246 @@
+"""
+A registry of running remote sessions, kept in an SQLite database shared by every process on the machine, so that a
+forked or re-spawned worker can attach to a session another process started (see SeleniumFactory.attach) instead of
+paying the Sauce session startup again.
+
+A session is driven by one process at a time: its owner holds a lease that a heartbeat thread renews, and the
+session can only be attached to once the lease is released (Wrapper.detach) or has run out because the owner died.
+Sessions past their max-duration or idle-timeout are never handed out.  The database holds the Sauce credentials of
+the sessions, so it is created readable by its owner only.
+"""
+
+import os
+import time
+import logging
+import tempfile
+import contextlib
+import threading
+import collections
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(tempfile.gettempdir(), 'selenium_factory_sessions.db')
+
+# seconds a lease lasts without a heartbeat; heartbeats come every third of it
+LEASE_DURATION = 30
+
+# Sauce defaults for sessions that don't ask for their own limits
+DEFAULT_MAX_DURATION = 1800
+DEFAULT_IDLE_TIMEOUT = 90
+
+# seconds before its max-duration or idle-timeout from which a session is no longer handed out
+EXPIRY_MARGIN = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    driver_url TEXT NOT NULL,
+    command_executor TEXT NOT NULL,
+    capabilities TEXT NOT NULL,
+    requested_capabilities TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    idle_timeout REAL NOT NULL,
+    last_used REAL NOT NULL,
+    owner TEXT,
+    lease_expires_at REAL NOT NULL DEFAULT 0
+)
+"""
+
+COLUMNS = ('session_id', 'driver_url', 'command_executor', 'capabilities', 'requested_capabilities', 'expires_at',
+           'idle_timeout', 'last_used', 'owner', 'lease_expires_at')
+
+# usable: neither past its max-duration nor idle for longer than its idle-timeout (or, for both, almost)
+ALIVE = "expires_at > :now AND (idle_timeout = 0 OR last_used + idle_timeout > :now)"
+
+# free to lease: not leased, or the lease ran out
+FREE = "(owner IS NULL OR lease_expires_at < :now)"
+
+SessionRecord = collections.namedtuple('SessionRecord', COLUMNS)
+
+
+class SessionUnavailable(Exception):
+    pass
+
+
+def current_owner():
+    """
+    Identifies the calling process; computed on each call so that forked children get their own identity.
+    """
+    import socket
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+class Lease:
+    """
+    A process's claim on a registered session, renewed by a daemon thread until it is released or stopped.  'lost'
+    is set when a renewal finds that another process took the session over; see Wrapper.
+    """
+
+    def __init__(self, registry, session_id, owner, duration=LEASE_DURATION):
+        self.registry = registry
+        self.session_id = session_id
+        self.owner = owner
+        self.duration = duration
+        self.lost = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._beat)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _beat(self):
+        while not self._stopped.wait(self.duration / 3.0):
+            try:
+                renewed = self.registry.heartbeat(self.session_id, self.owner, self.duration)
+            except Exception:
+                LOGGER.exception("Could not renew the lease on session %s", self.session_id)
+                continue
+            if not renewed:
+                self.lost = True
+                LOGGER.warning("Lost the lease on session %s", self.session_id)
+                return
+
+    def stop(self):
+        self._stopped.set()
+
+    def release(self, last_used=None):
+        """
+        Stops the heartbeats and makes the session available to other processes.
+        """
+        self.stop()
+        self.registry.release(self.session_id, self.owner, last_used=last_used)
+
+
+class SessionRegistry:
+    def __init__(self, path=DEFAULT_PATH, lease_duration=LEASE_DURATION):
+        self.path = path
+        self.lease_duration = lease_duration
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0600))
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self, immediate=False):
+        """
+        A new connection per transaction, so that the registry can be used from any thread; 'immediate' takes the
+        write lock up front for read-modify-write sequences.
+        """
+        import sqlite3
+
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def register(self, session_id, driver_url, command_executor, capabilities, requested_capabilities,
+                 created_at=None, last_used=None):
+        """
+        Records a session the calling process just started, leased to it, and returns the Lease.
+        """
+        import json
+
+        now = time.time()
+        created_at = created_at if created_at is not None else now
+        max_duration = int(requested_capabilities.get('max-duration') or DEFAULT_MAX_DURATION)
+        idle_timeout = int(requested_capabilities.get('idle-timeout') or DEFAULT_IDLE_TIMEOUT)
+        owner = current_owner()
+        with self._transaction(immediate=True) as db:
+            # a leased session is the owner's business until it is released: its last_used is only written then
+            db.execute("DELETE FROM sessions WHERE NOT (%s) AND %s" % (ALIVE, FREE), {'now': now})
+            db.execute("INSERT OR REPLACE INTO sessions (%s) VALUES (%s)" % (', '.join(COLUMNS),
+                                                                           ', '.join('?' * len(COLUMNS))),
+                       (session_id, driver_url, command_executor, json.dumps(capabilities),
+                        json.dumps(requested_capabilities), created_at + max_duration - EXPIRY_MARGIN,
+                        max(idle_timeout - EXPIRY_MARGIN, 1), last_used if last_used is not None else now,
+                        owner, now + self.lease_duration))
+        return Lease(self, session_id, owner, self.lease_duration)
+
+    def acquire(self, session_id):
+        """
+        Leases a session to the calling process and returns its SessionRecord and Lease.  Raises SessionUnavailable
+        when the session is unknown, expired or leased by another process.
+        """
+        now = time.time()
+        owner = current_owner()
+        with self._transaction(immediate=True) as db:
+            updated = db.execute("UPDATE sessions SET owner = :owner, lease_expires_at = :lease "
+                                 "WHERE session_id = :session_id AND %s AND (%s OR owner = :owner)" % (ALIVE, FREE),
+                                 {'now': now, 'owner': owner, 'lease': now + self.lease_duration,
+                                  'session_id': session_id}).rowcount
+            row = db.execute("SELECT %s FROM sessions WHERE session_id = ?" % ', '.join(COLUMNS),
+                             (session_id,)).fetchone()
+        if not updated:
+            if row is None:
+                raise SessionUnavailable("Session %s is not registered" % session_id)
+            record = self._record(row)
+            if record.owner and record.lease_expires_at >= now:
+                raise SessionUnavailable("Session %s is leased by %s" % (session_id, record.owner))
+            raise SessionUnavailable("Session %s has expired" % session_id)
+        return self._record(row), Lease(self, session_id, owner, self.lease_duration)
+
+    def heartbeat(self, session_id, owner, duration=LEASE_DURATION):
+        """
+        Extends the lease of 'owner' on the session; returns False if it no longer holds it.
+        """
+        with self._transaction() as db:
+            return db.execute("UPDATE sessions SET lease_expires_at = ? WHERE session_id = ? AND owner = ?",
+                              (time.time() + duration, session_id, owner)).rowcount > 0
+
+    def release(self, session_id, owner, last_used=None):
+        with self._transaction() as db:
+            if last_used is not None:
+                db.execute("UPDATE sessions SET owner = NULL, lease_expires_at = 0, last_used = ? "
+                           "WHERE session_id = ? AND owner = ?", (last_used, session_id, owner))
+            else:
+                db.execute("UPDATE sessions SET owner = NULL, lease_expires_at = 0 "
+                           "WHERE session_id = ? AND owner = ?", (session_id, owner))
+
+    def remove(self, session_id):
+        with self._transaction() as db:
+            db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def available(self, driver_url=None):
+        """
+        Returns the SessionRecords of the live sessions no process holds a lease on, optionally only those started
+        for 'driver_url', least recently used first.
+        """
+        query = "SELECT %s FROM sessions WHERE %s AND %s" % (', '.join(COLUMNS), ALIVE, FREE)
+        params = {'now': time.time()}
+        if driver_url is not None:
+            query += " AND driver_url = :driver_url"
+            params['driver_url'] = driver_url
+        with self._transaction() as db:
+            rows = db.execute(query + " ORDER BY last_used", params).fetchall()
+        return [self._record(row) for row in rows]
+
+    def _record(self, row):
+        import json
+
+        values = dict(zip(COLUMNS, row))
+        values['capabilities'] = json.loads(values['capabilities'])
+        values['requested_capabilities'] = json.loads(values['requested_capabilities'])
+        return SessionRecord(**values)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_session_registry(path=None):
+    """
+    Returns the process wide SessionRegistry for the database at 'path', by default the one named by the
+    'SELENIUM_SESSION_REGISTRY' environment variable, or DEFAULT_PATH.
+    """
+    path = path or os.environ.get('SELENIUM_SESSION_REGISTRY') or DEFAULT_PATH
+    with _registries_lock:
+        registry = _registries.get(path)
+        if registry is None:
+            registry = _registries[path] = SessionRegistry(path)
+        return registry
@@ -13,16 +13,34 @@ class TestParseSauceURL(unittest.TestCase):
 
     def test_parse(self):
         parse = ParseSauceURL(self.url)
-        self.assertEqual("foobar", parse.getUserName())
-        self.assertEqual("1234-5678-9102-3456", parse.getAccessKey())
-        self.assertEqual("simple test", parse.getJobName())
-        self.assertEqual("Linux", parse.getOS())
-        self.assertEqual("firefox", parse.getBrowser())
-        self.assertEqual("7", parse.getBrowserVersion())
-        self.assertEqual("", parse.getFirefoxProfileURL())
-        self.assertEqual(300, parse.getMaxDuration())
-        self.assertEqual(90, parse.getIdleTimeout())
-        self.assertEqual("", parse.getUserExtensionsURL())
+        self.assertEqual("foobar", parse.get_user_name())
+        self.assertEqual("1234-5678-9102-3456", parse.get_access_key())
+        self.assertEqual("simple test", parse.get_job_name())
+        self.assertEqual("Linux", parse.get_os())
+        self.assertEqual("firefox", parse.get_browser())
+        self.assertEqual("7", parse.get_browser_version())
+        self.assertEqual("", parse.get_firefox_profile_url())
+        self.assertEqual(300, parse.get_max_duration())
+        self.assertEqual(90, parse.get_idle_timeout())
+        self.assertEqual("", parse.get_user_extensions_url())
+
+    def test_parse_encoded_values(self):
+        parse = ParseSauceURL("sauce-ondemand:?username=foo&access-key=a%3Db&job-name=checkout%20%26%20pay"
+                              "&firefox-profile-url=http://example.com/profile?id=1&screen-resolution=1280x1024")
+        self.assertEqual("a=b", parse.get_access_key())
+        self.assertEqual("checkout & pay", parse.get_job_name())
+        self.assertEqual("http://example.com/profile?id=1", parse.get_firefox_profile_url())
+        self.assertEqual("1280x1024", parse.get_screen_resolution())
+
+    def test_parse_defaults(self):
+        parse = ParseSauceURL("sauce-ondemand:?username=foo&max-duration=forever&screen-resolution=big")
+        self.assertEqual(0, parse.get_max_duration())
+        self.assertEqual(0, parse.get_idle_timeout())
+        self.assertEqual("1024x768", parse.get_screen_resolution())
+        self.assertEqual("", parse.get_os())
+
+    def test_parse_is_interned(self):
+        self.assertTrue(ParseSauceURL(self.url) is ParseSauceURL(self.url))
 
 
 class TestSelenium2(unittest.TestCase):
@@ -0,0 +1,285 @@
+"""
+A local stand-in for a Sauce OnDemand hub: just enough of the WebDriver JSON wire protocol to start sessions, load
+pages, find elements and quit, and of the Sauce REST API to update and read jobs and the account concurrency, with a
+configurable delay before every response to mimic the network and Sauce itself.  It keeps everything in memory and
+is meant for offline tests and for benchmarks (see benchmarks).
+
+    python -m selenium_factory.stub_server --port 4444 --latency 0.05 --session-latency 2
+
+prints the environment variables that point SeleniumFactory and SauceRest at it.
+"""
+
+import os
+import json
+import time
+import itertools
+import threading
+import contextlib
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+DRIVER_URL = 'sauce-ondemand:?username=stub&access-key=stub-key&os=Linux&browser=firefox&browser-version=30'
+
+# a 1x1 PNG, the answer to every screenshot
+SCREENSHOT = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+
+# WebDriver wire protocol status codes
+SUCCESS = 0
+NO_SUCH_SESSION = 6
+NO_SUCH_ELEMENT = 7
+
+JOB_ATTRIBUTES = ('name', 'build', 'tags', 'custom-data', 'passed', 'public')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # one write per response, flushed by BaseHTTPRequestHandler: small writes would wait for delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        length = int(self.headers.getheader('content-length') or 0)
+        body = self.rfile.read(length) if length else ''
+        path, _, query = self.path.partition('?')
+        parts = [part for part in path.split('/') if part]
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        if parts[:2] == ['wd', 'hub']:
+            new_session = method == 'POST' and parts[2:] == ['session']
+            server.delay(server.session_latency if new_session else server.latency)
+            status, response = server.webdriver(method, parts[2:], json.loads(body) if body else {})
+        elif parts[:1] == ['rest']:
+            server.delay(server.latency)
+            if not self.headers.getheader('authorization'):
+                status, response = 401, {'error': 'Not authorized'}
+            else:
+                status, response = server.rest(method, parts[1:], body, query)
+        else:
+            status, response = 404, {'error': 'Not found: %s' % path}
+        self.respond(status, json.dumps(response))
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """
+    Serves on 127.0.0.1 ('port' 0 picks a free one) once started.  Every response waits 'latency' seconds, plus or
+    minus up to 'jitter', and new sessions 'session_latency' seconds instead.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, latency=0.0, session_latency=None, jitter=0.0, concurrency=100):
+        HTTPServer.__init__(self, ('127.0.0.1', port), StubHandler)
+        self.port = self.server_address[1]
+        self.url = 'http://127.0.0.1:%d' % self.port
+        self.latency = latency
+        self.session_latency = latency if session_latency is None else session_latency
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.lock = threading.Lock()
+        self.requests = 0
+        # session id -> {'capabilities', 'url', 'job'}
+        self.sessions = {}
+        # job id (the session id) -> Sauce job
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='stub-server')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        from connection_pool import close_pools
+
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        # the keep-alive connections to the server are of no use any more
+        close_pools('127.0.0.1', self.port)
+
+    def environment(self):
+        """
+        The environment variables that point SeleniumFactory and SauceRest at this server.
+        """
+        return {'SELENIUM_DRIVER': DRIVER_URL,
+                'SELENIUM_HOST': '127.0.0.1',
+                'SELENIUM_PORT': str(self.port),
+                'SELENIUM_STARTING_URL': self.url + '/start',
+                'SAUCE_REST_URL': self.url + '/rest'}
+
+    @contextlib.contextmanager
+    def installed(self):
+        """
+        Points this process at the server for the duration of the block: sets environment() and the urls of
+        sauce_rest, which read 'SAUCE_REST_URL' only on import.
+        """
+        import sauce_rest
+
+        environment = self.environment()
+        saved = dict((name, os.environ.get(name)) for name in environment)
+        saved_urls = sauce_rest.url, sauce_rest.users_url
+        os.environ.update(environment)
+        sauce_rest.url = environment['SAUCE_REST_URL'] + '/%s/%s/%s'
+        sauce_rest.users_url = environment['SAUCE_REST_URL'] + '/%s/users/%s/%s'
+        try:
+            yield self
+        finally:
+            sauce_rest.url, sauce_rest.users_url = saved_urls
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def delay(self, seconds):
+        if self.jitter:
+            import random
+            seconds += random.uniform(-self.jitter, self.jitter)
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def webdriver(self, method, parts, params):
+        """
+        Answers a wire protocol command, the path below /wd/hub split in 'parts'; returns (HTTP status, response).
+        """
+        if parts == ['session'] and method == 'POST':
+            capabilities = dict(params.get('desiredCapabilities') or {})
+            capabilities.setdefault('browserName', 'firefox')
+            with self.lock:
+                session_id = '%032x' % next(self._ids)
+                self.sessions[session_id] = {'capabilities': capabilities, 'url': 'about:blank', 'elements': 0}
+                self.jobs[session_id] = {'id': session_id, 'name': capabilities.get('name'),
+                                         'build': capabilities.get('build'), 'tags': capabilities.get('tags', []),
+                                         'custom-data': capabilities.get('custom-data'), 'passed': None,
+                                         'public': False, 'status': 'in progress', 'error': None,
+                                         'browser': capabilities['browserName'],
+                                         'creation_time': int(time.time()), 'end_time': None}
+            return self._success(session_id, capabilities)
+
+        if parts[:1] != ['session'] or len(parts) < 2:
+            return 404, {'status': 9, 'value': {'message': 'Unknown command: /%s' % '/'.join(parts)}}
+        session_id, command = parts[1], parts[2:]
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is not None and method == 'DELETE' and not command:
+                del self.sessions[session_id]
+                self.jobs[session_id].update(status='complete', end_time=int(time.time()))
+        if session is None:
+            return 500, {'status': NO_SUCH_SESSION, 'sessionId': session_id,
+                         'value': {'message': 'Session %s does not exist' % session_id}}
+
+        value = None
+        if method == 'GET' and not command:
+            value = session['capabilities']
+        elif command == ['url']:
+            if method == 'POST':
+                session['url'] = params['url']
+            else:
+                value = session['url']
+        elif command == ['title']:
+            value = 'Stub page %s' % session['url']
+        elif command[-1:] in (['element'], ['elements']):
+            if params.get('value') == 'missing':
+                if command[-1] == 'elements':
+                    return self._success(session_id, [])
+                return 500, {'status': NO_SUCH_ELEMENT, 'sessionId': session_id,
+                             'value': {'message': 'Unable to locate element: %s' % params.get('value')}}
+            with self.lock:
+                session['elements'] += 1
+                element = {'ELEMENT': str(session['elements'])}
+            value = [element] if command[-1] == 'elements' else element
+        elif command[:1] == ['element'] and command[2:] == ['text']:
+            value = 'Text of element %s' % command[1]
+        elif command == ['screenshot']:
+            value = SCREENSHOT
+        return self._success(session_id, value)
+
+    def _success(self, session_id, value):
+        return 200, {'status': SUCCESS, 'sessionId': session_id, 'value': value}
+
+    def rest(self, method, parts, body, query):
+        """
+        Answers a Sauce REST call, the path below /rest split in 'parts'; returns (HTTP status, response).
+        """
+        import urlparse
+
+        if len(parts) == 4 and parts[0] == 'v1.1' and parts[1] == 'users' and parts[3] == 'concurrency':
+            with self.lock:
+                running = len(self.sessions)
+            return 200, {'concurrency': {parts[2]: {'current': {'overall': running},
+                                                    'remaining': {'overall': max(0, self.concurrency - running)}}}}
+
+        if len(parts) == 3 and parts[0] == 'v1' and parts[2] == 'jobs' and method == 'GET':
+            options = urlparse.parse_qs(query)
+            limit = int(options.get('limit', ['100'])[0])
+            with self.lock:
+                jobs = sorted(self.jobs.values(), key=lambda job: job['id'], reverse=True)[:limit]
+                if options.get('full', [''])[0] != 'true':
+                    jobs = [{'id': job['id']} for job in jobs]
+                return 200, jobs
+
+        if len(parts) == 4 and parts[0] == 'v1' and parts[2] == 'jobs':
+            with self.lock:
+                job = self.jobs.get(parts[3])
+                if job is None:
+                    return 404, {'error': 'Job not found'}
+                if method == 'PUT':
+                    attributes = json.loads(body or '{}')
+                    job.update((name, value) for name, value in attributes.items() if name in JOB_ATTRIBUTES)
+                return 200, dict(job)
+
+        return 404, {'error': 'Not found: /rest/%s' % '/'.join(parts)}
+
+
+def main(argv=None):
+    import sys
+    from optparse import OptionParser
+
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option('--port', type='int', default=4444)
+    parser.add_option('--latency', type='float', default=0.0, help="seconds before every response")
+    parser.add_option('--session-latency', type='float', help="seconds before new sessions, default --latency")
+    parser.add_option('--jitter', type='float', default=0.0)
+    options, _ = parser.parse_args(argv)
+
+    server = StubServer(options.port, options.latency, options.session_latency, options.jitter)
+    for name, value in sorted(server.environment().items()):
+        print "export %s='%s'" % (name, value)
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()